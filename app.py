@@ -1,9 +1,13 @@
+import multiprocessing
 import os
 os.environ['APP_DIR'] = os.path.abspath(os.path.dirname(__file__))
 import sys
-from autolink_modules.main_window import AutoLoginWindow
-from PyQt5.QtWidgets import QApplication
 if __name__ == "__main__":
+    # 打包后的 exe 中，PDF 进程池的子进程在这里执行任务后退出，不会再打开主窗口
+    multiprocessing.freeze_support()
+    # 界面模块在这里导入：spawn 的子进程会重新导入本文件，不应加载 Qt 和 QtWebEngine
+    from autolink_modules.main_window import AutoLoginWindow
+    from PyQt5.QtWidgets import QApplication
     # Disable SSL key logging by setting the environment variable to a null device
     # This prevents the "Failed opening SSL key log file" error.
     app = QApplication(sys.argv)
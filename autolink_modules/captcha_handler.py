@@ -1,14 +1,14 @@
-"""Captcha handler with ONNX model support."""
+"""Captcha handler with ONNX model support.
+
+onnxruntime, OpenCV (via preprocess_helper) and requests are imported lazily
+so that importing this module stays cheap during GUI startup.
+"""
 import io
-import requests
 import numpy as np
 from PIL import Image, ImageSequence
 from pathlib import Path
-import onnxruntime as ort
-import cv2
 import sys
 import os
-from .preprocess_helper import analyze_and_enhance_colors, rgb_to_binary_smart
 
 
 def get_resource_path(relative_path):
@@ -27,6 +27,8 @@ class CaptchaHandler:
     def __init__(self, digit_model_path="models/best_model_digits.onnx", 
                  operator_model_path="models/best_model_operators.onnx"):
         """Initialize captcha handler with ONNX models."""
+        import onnxruntime as ort
+
         self.char_width = 30
         self.char_height = 50
         
@@ -59,6 +61,8 @@ class CaptchaHandler:
         if not captcha_url:
             return False, None, "No captcha URL provided"
         
+        import requests
+
         try:
             response = requests.get(captcha_url, timeout=timeout)
             response.raise_for_status()
@@ -110,6 +114,8 @@ class CaptchaHandler:
     
     def predict_char_onnx(self, char_img, position):
         """Predict single character using ONNX model."""
+        from .preprocess_helper import rgb_to_binary_smart
+
         # Convert to numpy array
         img_array = np.array(char_img)
         
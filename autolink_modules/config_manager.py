@@ -3,36 +3,42 @@ from __future__ import annotations
 
 import json
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Optional
 
+from PyQt5.QtCore import QFileSystemWatcher, QObject, QTimer, pyqtSignal
 
-@dataclass
+from autolink_modules.persistence import default_writer
+
+
+@dataclass(frozen=True)
 class AppConfig:
-    """应用配置数据类"""
+    """应用配置（不可变，由 ConfigService 缓存共享）"""
     username: str
-    server_url: list[str]
+    server_url: tuple[str, ...]
     retry_interval_secs: int = 5
     max_retries: int = 0  # 0 表示无限重试
-    vpn_password: str = ""  # VPN密码（如果与主密码不同）
-    local_password: str = ""  # 内网认证密码（如果与主密码不同）
+    vpn_password: str = field(default="", repr=False)  # VPN密码（如果与主密码不同）
+    local_password: str = field(default="", repr=False)  # 内网认证密码（如果与主密码不同）
 
 
-def _read_json_config(path: Path) -> dict:
-    """读取JSON配置文件"""
+def _read_json_config(path: Path, strict: bool = False) -> dict:
+    """读取JSON配置文件（strict 为 True 时坏的 JSON 抛出 ValueError）"""
     if not path.exists():
         return {}
     try:
         with path.open("r", encoding="utf-8") as f:
             return json.load(f)
     except Exception:
+        if strict:
+            raise ValueError(f"{path.name} 不是有效的 JSON")
         # 容忍坏的 json，返回空
         return {}
 
 
-def load_config(base_dir: Optional[Path] = None) -> AppConfig:
-    """加载配置，优先级：环境变量 > config.json > 默认值。
+def parse_app_config(json_cfg: dict) -> AppConfig:
+    """从 config.json 内容构造配置，优先级：环境变量 > config.json > 默认值。
 
     环境变量：
     - TYUT_USERNAME
@@ -44,16 +50,6 @@ def load_config(base_dir: Optional[Path] = None) -> AppConfig:
     - TYUT_MAX_RETRIES
     """
 
-    # 强制设置 base_dir 为 scripts 文件夹
-    base_dir = Path.cwd() / "scripts"
-    print(f"强制更新后的 base_dir: {base_dir}")
-
-    json_cfg = _read_json_config(base_dir / "config.json")
-
-    # 添加调试信息以打印加载路径和内容
-    print(f"加载配置文件路径: {base_dir / 'config.json'}")
-    print(f"配置文件内容: {json_cfg}")
-
     def getenv_str(name: str, default: str) -> str:
         val = os.getenv(name)
         return val if val not in (None, "") else default
@@ -99,7 +95,7 @@ def load_config(base_dir: Optional[Path] = None) -> AppConfig:
 
     return AppConfig(
         username=username,
-        server_url=server_url,
+        server_url=tuple(server_url),
         retry_interval_secs=retry_interval_secs,
         max_retries=max_retries,
         vpn_password=vpn_password,
@@ -107,16 +103,114 @@ def load_config(base_dir: Optional[Path] = None) -> AppConfig:
     )
 
 
-def save_config(config: dict, base_dir: Path = Path(__file__).parent / "scripts"):
-    """直接覆盖保存配置到指定位置"""
-    config_path = base_dir / "config.json"
+def load_config(base_dir: Optional[Path] = None) -> AppConfig:
+    """读取 base_dir/config.json（默认 scripts 文件夹）并构造配置。
+
+    每次调用都会读盘；长期运行的界面应使用 app_config_service() 的缓存。
+    """
+    base_dir = Path(base_dir) if base_dir else Path.cwd() / "scripts"
+    return parse_app_config(_read_json_config(base_dir / "config.json"))
+
+
+class ConfigService(QObject):
+    """配置服务：解析一次并缓存，文件变化时才重新加载并通知订阅者。
+
+    变化检测有两条路径：QFileSystemWatcher（有事件循环时即时生效，事件经短暂防抖合并），
+    以及访问 value 时的 stat 检查（只比较修改时间和大小，不读文件）。
+    新内容解析失败（写了一半、缺字段）时保留上一份配置并发出 load_failed。
+    """
+
+    changed = pyqtSignal(object)  # 新配置
+    load_failed = pyqtSignal(str)
+
+    def __init__(self, path, parse, debounce_ms=200, parent=None):
+        super().__init__(parent)
+        self.path = Path(path)
+        self.parse = parse
+        self.error = ""
+        self._value = None
+        self._stamp = None
+        self._debounce = QTimer(self)
+        self._debounce.setSingleShot(True)
+        self._debounce.setInterval(debounce_ms)
+        self._debounce.timeout.connect(self.check)
+        # 编辑器常用"写临时文件再改名"保存，原文件的监视会失效，所以同时监视目录
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.fileChanged.connect(self._on_fs_event)
+        self._watcher.directoryChanged.connect(self._on_fs_event)
+        self._watch()
+        self.check()
+
+    def _watch(self):
+        paths = [str(p) for p in (self.path, self.path.parent) if p.exists()]
+        missing = [p for p in paths if p not in self._watcher.files() + self._watcher.directories()]
+        if missing:
+            self._watcher.addPaths(missing)
+
+    def _on_fs_event(self, _path):
+        self._debounce.start()
+
+    def _current_stamp(self):
+        try:
+            stat = self.path.stat()
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    @property
+    def value(self):
+        """当前配置（未成功加载过时为 None，原因见 error）"""
+        self.check()
+        return self._value
+
+    def check(self):
+        """文件有变化时重新加载，配置内容变化时通知订阅者并返回 True"""
+        self._watch()
+        stamp = self._current_stamp()
+        if stamp == self._stamp and (self._value is not None or self.error):
+            return False
+        self._stamp = stamp
+        try:
+            data = _read_json_config(self.path, strict=True)
+            value = self.parse(data)
+        except (ValueError, TypeError) as e:
+            self.error = str(e)
+            self.load_failed.emit(self.error)
+            return False
+        self.error = ""
+        if value == self._value:
+            return False
+        self._value = value
+        self.changed.emit(value)
+        return True
+
+    def subscribe(self, callback, call_now=True):
+        """订阅配置变化；call_now 时立即以当前配置调用一次"""
+        self.changed.connect(callback)
+        if call_now and self._value is not None:
+            callback(self._value)
+
+
+_services: dict = {}
+
+
+def app_config_service(base_dir: Optional[Path] = None) -> ConfigService:
+    """应用配置（scripts/config.json）的共享配置服务"""
+    path = (Path(base_dir) if base_dir else Path.cwd() / "scripts") / "config.json"
+    key = str(path.resolve())
+    if key not in _services:
+        _services[key] = ConfigService(path, parse_app_config)
+    return _services[key]
+
+
+def save_config(config: dict, base_dir: Optional[Path] = None):
+    """保存配置到 base_dir/config.json（默认 scripts 文件夹），后台原子写入"""
+    base_dir = Path(base_dir) if base_dir else Path.cwd() / "scripts"
     try:
-        base_dir.mkdir(parents=True, exist_ok=True)  # 确保目录存在
         # 合并默认配置和当前配置，确保字段完整
         full_config = example_config()
         full_config.update(config)
-        with config_path.open("w", encoding="utf-8") as f:
-            json.dump(full_config, f, indent=4, ensure_ascii=False)
+        default_writer().save(base_dir / "config.json", full_config)
     except Exception as e:
         print(f"保存配置失败: {e}")
 
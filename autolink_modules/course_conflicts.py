@@ -0,0 +1,112 @@
+"""
+课表冲突索引 - 抢课失败/成功后常数时间选出下一个可选目标
+
+课程通过 time_slots 描述上课时间，通过 alt_group 组成候选组（同组课程互为
+替代，按 priority 排列，只需抢到其中一门）。开抢前一次性预计算：
+- 每门课程的时间位掩码
+- 课程之间的冲突关系
+- 每个候选组的有序候选列表和当前游标
+
+抢课过程中只做位运算和游标移动，不再重新扫描课程列表。
+课程以 course_key 区分：同名课程由不同教师开设时正是候选组的典型情况。
+"""
+import threading
+
+PERIODS_PER_DAY = 16  # 每天节次上限（位掩码中每天占用的位数）
+
+
+def course_key(course):
+    """课程的唯一标识：有课程ID时为课程ID，否则为“课程名|教师名”"""
+    if course.course_id:
+        return str(course.course_id)
+    return f"{course.course_name}|{course.teacher_name or ''}"
+
+
+def slot_mask(time_slots):
+    """把 [[星期, 开始节, 结束节], ...] 转为位掩码（星期 1-7，节次从 1 开始）"""
+    mask = 0
+    for weekday, start, end in time_slots or []:
+        for period in range(int(start), int(end) + 1):
+            mask |= 1 << ((int(weekday) - 1) * PERIODS_PER_DAY + (period - 1))
+    return mask
+
+
+class ConflictIndex:
+    """候选组与冲突索引（线程安全）"""
+
+    def __init__(self, courses):
+        self._lock = threading.Lock()
+        self.occupied = 0  # 已抢到课程占用的时间
+        self.masks = {}
+        self.groups = {}  # 组名 -> 按优先级排序的课程列表
+        self.group_of = {}
+        for course in sorted(courses, key=lambda c: c.priority):
+            key = course_key(course)
+            group = course.alt_group or key
+            self.masks[key] = slot_mask(course.time_slots)
+            self.groups.setdefault(group, []).append(course)
+            self.group_of[key] = group
+        self._cursor = {group: 0 for group in self.groups}
+        self.won = {}  # 组名 -> 抢到的课程
+
+        # 预计算冲突关系：课程键 -> 与其时间冲突的其他组
+        self._conflicting_groups = {}
+        for key, mask in self.masks.items():
+            own_group = self.group_of[key]
+            self._conflicting_groups[key] = {
+                self.group_of[other] for other, other_mask in self.masks.items()
+                if mask & other_mask and self.group_of[other] != own_group
+            }
+
+        for group in self.groups:
+            self._skip_blocked(group)
+
+    def _skip_blocked(self, group):
+        """把组游标移到第一门与已占用时间不冲突的课程（均摊 O(1)）"""
+        candidates = self.groups[group]
+        cursor = self._cursor[group]
+        while cursor < len(candidates) and self.masks[course_key(candidates[cursor])] & self.occupied:
+            cursor += 1
+        self._cursor[group] = cursor
+
+    def current(self, group):
+        """组当前的抢课目标，已抢到或无可选课程时返回 None"""
+        with self._lock:
+            if group in self.won:
+                return None
+            cursor = self._cursor[group]
+            candidates = self.groups[group]
+            return candidates[cursor] if cursor < len(candidates) else None
+
+    def has_alternative(self, group):
+        """当前目标之后是否还有候选课程"""
+        with self._lock:
+            return self._cursor[group] + 1 < len(self.groups[group])
+
+    def on_failure(self, course):
+        """课程已满/失败：切换到同组下一门不冲突的课程并返回，没有则返回 None"""
+        group = self.group_of[course_key(course)]
+        with self._lock:
+            candidates = self.groups[group]
+            if self._cursor[group] < len(candidates) and candidates[self._cursor[group]] is course:
+                self._cursor[group] += 1
+                self._skip_blocked(group)
+            cursor = self._cursor[group]
+            return candidates[cursor] if cursor < len(candidates) else None
+
+    def on_success(self, course):
+        """课程抢到：占用其时间，受影响的组跳过冲突课程，返回目标被改变的组"""
+        key = course_key(course)
+        group = self.group_of[key]
+        with self._lock:
+            self.won[group] = course
+            self.occupied |= self.masks[key]
+            changed = []
+            for other in self._conflicting_groups[key]:
+                if other in self.won:
+                    continue
+                before = self._cursor[other]
+                self._skip_blocked(other)
+                if self._cursor[other] != before:
+                    changed.append(other)
+            return changed
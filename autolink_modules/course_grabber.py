@@ -6,24 +6,52 @@
 - 多课程并发抢课
 - 抢课成功/失败通知
 - 课程配置管理
+- 每次运行的指标（尝试次数、耗时直方图、结果分布）导出为 JSON / Prometheus 文本
 """
-from PyQt5.QtCore import QTimer, QThread, pyqtSignal
+from PyQt5.QtCore import QObject, QThread, pyqtSignal
+from concurrent.futures import wait as wait_futures
 from datetime import datetime
 import json
+import threading
+import time
+import uuid
 from pathlib import Path
+from types import MappingProxyType
+
+from autolink_modules.config_manager import ConfigService
+from autolink_modules.course_conflicts import course_key
+from autolink_modules.course_monitor import CourseMonitor
+from autolink_modules.dom_bridge import DomBridge
+from autolink_modules.grab_engine import (
+    DEFAULT_ENGINE_SETTINGS, GrabEngine, SelectResult, build_session, connection_limit
+)
+from autolink_modules.grab_metrics import GrabMetrics
+from autolink_modules.grab_scheduler import (
+    ClockSync, estimate_server_offset, origin_of, prewarm_connections, wait_until
+)
+from autolink_modules.grab_store import GrabStore
+from autolink_modules.js_scripts import get_discard_select_token_js, get_select_course_js
+from autolink_modules.persistence import default_writer
 
 
 class CourseConfig:
     """课程配置类"""
     def __init__(self, course_id=None, course_name="", teacher_name="", 
-                 priority=1, start_time=None, notes=""):
+                 priority=1, start_time=None, notes="", time_slots=None, alt_group=""):
         self.course_id = course_id
         self.course_name = course_name
         self.teacher_name = teacher_name
         self.priority = priority  # 优先级 1-10，数字越小优先级越高
         self.start_time = start_time  # 开始抢课的时间
         self.notes = notes
+        self.time_slots = time_slots or []  # 上课时间 [[星期, 开始节, 结束节], ...]
+        self.alt_group = alt_group  # 候选组名，同组课程互为替代，只需抢到一门
         self.status = "pending"  # pending, success, failed
+
+    @property
+    def key(self):
+        """唯一标识（课程ID，或“课程名|教师名”），同名不同教师的课程互不覆盖"""
+        return course_key(self)
         
     def to_dict(self):
         return {
@@ -33,6 +61,8 @@ class CourseConfig:
             "priority": self.priority,
             "start_time": self.start_time.isoformat() if self.start_time else None,
             "notes": self.notes,
+            "time_slots": self.time_slots,
+            "alt_group": self.alt_group,
             "status": self.status
         }
     
@@ -43,7 +73,9 @@ class CourseConfig:
             course_name=data.get("course_name", ""),
             teacher_name=data.get("teacher_name", ""),
             priority=data.get("priority", 1),
-            notes=data.get("notes", "")
+            notes=data.get("notes", ""),
+            time_slots=data.get("time_slots") or [],
+            alt_group=data.get("alt_group") or ""
         )
         start_time_str = data.get("start_time")
         if start_time_str:
@@ -52,149 +84,423 @@ class CourseConfig:
         return config
 
 
+class WebviewCookieCollector(QObject):
+    """收集 webview Cookie，用于创建已登录的 HTTP 会话（需在 GUI 线程创建）"""
+
+    def __init__(self, webview):
+        super().__init__()
+        profile = webview.page().profile()
+        self.user_agent = profile.httpUserAgent()
+        self._cookies = {}
+        store = profile.cookieStore()
+        store.cookieAdded.connect(self._on_cookie_added)
+        store.cookieRemoved.connect(self._on_cookie_removed)
+        store.loadAllCookies()
+
+    @staticmethod
+    def _key(cookie):
+        return (bytes(cookie.name()).decode(), cookie.domain(), cookie.path())
+
+    def _on_cookie_added(self, cookie):
+        self._cookies[self._key(cookie)] = bytes(cookie.value()).decode()
+
+    def _on_cookie_removed(self, cookie):
+        self._cookies.pop(self._key(cookie), None)
+
+    def cookies(self):
+        """返回 (name, value, domain, path) 列表"""
+        return [(name, value, domain, path) for (name, domain, path), value in self._cookies.items()]
+
+
 class CourseGrabber(QThread):
-    """抢课工作线程"""
+    """抢课工作线程
+
+    线程内只做网络 I/O 和解析，不直接访问 webview。未配置 submit_url 时
+    通过 DomBridge 把页面脚本排队到 GUI 线程执行，各课程的页面点击串行进行。
+    """
     
     # 信号定义
     course_selected = pyqtSignal(str, str)  # (course_name, status)
     log_message = pyqtSignal(str)  # 日志消息
     progress_update = pyqtSignal(int, int)  # (current, total)
+    metrics_ready = pyqtSignal(dict)  # 运行结束后的指标快照（GrabMetrics.snapshot）
     
-    def __init__(self, webview, courses: list[CourseConfig], config: dict):
+    def __init__(self, courses: list[CourseConfig], config: dict, session=None,
+                 start_at=None, dom_bridge=None, store=None):
         super().__init__()
-        self.webview = webview
+        self.dom_bridge = dom_bridge
+        self.store = store  # GrabStore，记录状态和每次尝试结果
+        self.run_id = None
         self.courses = courses
         self.config = config
         self.running = False
+        self.start_at = start_at  # 定时开始时间（服务器时间），None 表示立即开始
+        self.clock = None
+        self.metrics = None
+        self.engine = GrabEngine(
+            session or build_session(), config,
+            on_log=self.log_message.emit, on_attempt=self._on_attempt,
+            on_first_request=self._on_first_request,
+            submit_fn=None if config.get("submit_url") or dom_bridge is None else self._submit_via_page
+        )
+        self._finished_count = 0
+        self._finished_lock = threading.Lock()
+        # 页面选课从点击到收到响应期间独占页面：确认弹窗是全局查找的，并发点击时
+        # 一门课的确认可能点到另一门课的弹窗，结果会记到错误的课程上
+        self._page_lock = threading.Lock()
+
+    def _on_attempt(self, course, outcome, latency):
+        """每次提交后回调（在引擎工作线程中执行，信号会排队到 GUI 线程）"""
+        self.metrics.record(course.course_name, outcome, latency)
+        if self.store:
+            self.store.record_attempt(self.run_id, course.course_name, outcome, latency)
+            if outcome in ("success", "already_selected"):
+                # 立即落盘，崩溃重启后不会重复抢已成功的课程
+                self.store.update_status(course.key, "success")
+        if outcome in ("success", "already_selected", "not_logged_in"):
+            with self._finished_lock:
+                self._finished_count += 1
+                finished = self._finished_count
+            self.course_selected.emit(course.course_name, outcome)
+            self.progress_update.emit(finished, len(self.courses))
+
+    def _submit_via_page(self, course):
+        """在页面中点击选课按钮，由拦截到的选课响应得出结果（在引擎工作线程中调用）"""
+        pattern = self.config.get("page_submit_pattern", "")
+        if not pattern:
+            # 没有接口正则就收不到响应，不点击也不等待
+            return SelectResult("error", message="未配置 page_submit_pattern，无法确认页面选课结果")
+        timeout = float(self.config.get("request_timeout", 5))
+        if not self._acquire_page():
+            return SelectResult("error", message="已停止抢课")
+        try:
+            return self._click_and_wait(course, pattern, timeout)
+        finally:
+            self._page_lock.release()
+
+    def _acquire_page(self, step=0.1):
+        """等待轮到本次页面选课，停止抢课时返回 False"""
+        while not self._page_lock.acquire(timeout=step):
+            if self.engine.stop_event.is_set():
+                return False
+        return True
+
+    def _click_and_wait(self, course, pattern, timeout):
+        """点击选课按钮并等待该 token 的响应（调用方持有 _page_lock）"""
+        token = uuid.uuid4().hex
+        # 先登记再执行脚本，响应推送不会早于登记
+        response = self.dom_bridge.expect(token)
+        try:
+            status = self._wait_page(self.dom_bridge.run_js(get_select_course_js(
+                course.course_id, course.course_name, course.teacher_name,
+                token=token, submit_pattern=pattern, token_ttl=timeout
+            )), timeout)
+            if status != "select_clicked":
+                self.dom_bridge.discard(token)
+                return SelectResult("course_full" if status == "course_full" else "error", message=status or "")
+            data = self._wait_page(response, timeout)
+        except Exception as e:
+            # 两端都作废 token，避免之后的响应被算到这门课上
+            self.dom_bridge.discard(token)
+            self.dom_bridge.run_js(get_discard_select_token_js(token))
+            return SelectResult("error", message=f"页面选课未收到响应: {e}")
+        return SelectResult.from_response(data.get("status", 0), data.get("text", ""))
+
+    def _wait_page(self, future, timeout, step=0.1):
+        """分段等待页面返回的 Future，停止抢课后立即放弃（不拖住停止）"""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"{timeout:g} 秒内无结果")
+            if wait_futures([future], timeout=min(step, remaining)).done:
+                return future.result()
+            if self.engine.stop_event.is_set():
+                raise RuntimeError("已停止抢课")
+
+    def _on_first_request(self, ts):
+        """记录第一个请求相对目标时间的偏差"""
+        if self.start_at and self.clock:
+            deviation_ms = (ts + self.clock.offset - self.start_at.timestamp()) * 1000
+            accuracy = (f"时钟误差 ±{self.clock.uncertainty * 1000:.0f} ms" if self.clock.synced
+                        else "未与服务器校时，按本地时钟")
+            self.log_message.emit(f"🎯 首个请求距目标时间 {deviation_ms:+.1f} ms（{accuracy}）")
+
+    def _sync_clock(self, sync_url):
+        """估计服务器时钟偏移，失败时退回本地时钟"""
+        try:
+            clock = estimate_server_offset(
+                self.engine.session, sync_url,
+                samples=int(self.config.get("clock_sync_samples", 8)),
+                stop_event=self.engine.stop_event
+            )
+            self.log_message.emit(
+                f"🕒 服务器时钟偏移 {clock.offset * 1000:+.0f} ms"
+                f"（±{clock.uncertainty * 1000:.0f} ms，RTT {clock.rtt * 1000:.0f} ms）"
+            )
+            return clock
+        except Exception as e:
+            self.log_message.emit(f"⚠️ 服务器校时失败，使用本地时钟: {e}")
+            return ClockSync.unsynced()
+
+    def _wait_for_start(self):
+        """与服务器校时后精确等待到开始时间，返回是否应继续抢课"""
+        sync_url = self.config.get("clock_sync_url") or origin_of(self.config.get("submit_url", ""))
+        target_ts = self.start_at.timestamp()
+        stop_event = self.engine.stop_event
+
+        # 离开始较远时先睡眠，临近时再校时，减少时钟漂移的影响
+        sync_lead = float(self.config.get("clock_sync_lead", 30))
+        if target_ts - time.time() > sync_lead and stop_event.wait(target_ts - time.time() - sync_lead):
+            return False
+
+        self.clock = self._sync_clock(sync_url)
+        pool_count = connection_limit(self.courses, self.config)
+        fired = wait_until(
+            self.clock.to_local(target_ts), stop_event,
+            prewarm=lambda: prewarm_connections(self.engine.session, sync_url, pool_count),
+            prewarm_lead=float(self.config.get("prewarm_lead", 2.0))
+        )
+        return fired is not None
         
     def run(self):
         """执行抢课"""
         self.running = True
+        if self.engine.submit_fn is not None and not self.config.get("page_submit_pattern"):
+            self.log_message.emit("❌ 未配置 submit_url 和 page_submit_pattern，无法确认页面选课结果")
+            self.running = False
+            return
+        if self.start_at and not self._wait_for_start():
+            self.running = False
+            return
         self.log_message.emit("🚀 开始自动抢课...")
-        
-        # 按优先级排序
-        sorted_courses = sorted(self.courses, key=lambda x: x.priority)
-        total = len(sorted_courses)
-        
-        for idx, course in enumerate(sorted_courses):
-            if not self.running:
-                break
-                
-            self.progress_update.emit(idx + 1, total)
-            self.log_message.emit(f"正在抢课: {course.course_name} ({course.teacher_name})")
-            
-            # TODO: 实际的抢课逻辑
-            # 1. 搜索课程
-            # 2. 点击选课
-            # 3. 确认选课
-            # 4. 检查结果
-            
-            # 这里暂时只是框架，等选课页面开放后填入实际代码
-            self.msleep(self.config.get("attempt_interval", 100))
-        
-        self.log_message.emit("✅ 抢课任务完成！")
+        self._finished_count = 0
+        skipped = [c.course_name for c in self.courses if c.status == "success"]
+        if skipped:
+            self.log_message.emit(f"⏭ 跳过已成功的课程: {', '.join(skipped)}")
+        if self.store:
+            self.run_id = self.store.start_run()
+        self.metrics = GrabMetrics(float(self.config.get("attempt_interval", 100)))
+
+        try:
+            self.metrics.start()
+            self.engine.run(self.courses)
+            self.log_message.emit("✅ 抢课任务完成！")
+        except Exception as e:
+            self.log_message.emit(f"❌ 抢课失败: {e}")
+        finally:
+            self.metrics.finish()
+            self.metrics.workers = self.engine.workers or 1
+            if self.store:
+                for course in self.courses:
+                    self.store.update_status(course.key, course.status)
+                self.store.finish_run(self.run_id)
+            self._export_metrics()
         self.running = False
+
+    def _export_metrics(self):
+        """输出指标摘要并写入 metrics_dir"""
+        self.log_message.emit(f"📈 {self.metrics.summary()}")
+        metrics_dir = self.config.get("metrics_dir") or Path.cwd() / "logs" / "grab_metrics"
+        name = f"run_{self.run_id}" if self.run_id else datetime.now().strftime("run_%Y%m%d_%H%M%S")
+        try:
+            json_path, _ = self.metrics.export(
+                metrics_dir, name, run_id=self.run_id, finished=datetime.now().isoformat()
+            )
+            self.log_message.emit(f"📈 指标已导出: {json_path}")
+        except OSError as e:
+            self.log_message.emit(f"⚠️ 导出抢课指标失败: {e}")
+        self.metrics_ready.emit(self.metrics.snapshot())
     
     def stop(self):
         """停止抢课"""
         self.running = False
+        self.engine.stop()
         self.log_message.emit("⏸ 已停止抢课")
 
 
+def _parse_grabber_settings(data):
+    """course_grabber_config.json 中的设置部分（课程以数据库为准，不在这里热更新）"""
+    settings = data.get("settings", {})
+    if not isinstance(settings, dict):
+        raise ValueError("settings 必须是对象")
+    return MappingProxyType(dict(settings))
+
+
 class CourseGrabberManager:
     """抢课管理器 - 主控制器"""
     
-    def __init__(self, webview):
+    def __init__(self, webview, log_sink=None):
         self.webview = webview
+        self.log_sink = log_sink  # 日志管道（如主窗口的 LogPipeline.sink）
         self.courses: list[CourseConfig] = []
         self.config = {
+            **DEFAULT_ENGINE_SETTINGS,
             "enabled": False,
             "auto_refresh_interval": 1,  # 秒
             "max_attempts": 1000,
             "attempt_interval": 100,  # 毫秒
             "notify_on_success": True,
-            "notify_on_failure": True
+            "notify_on_failure": True,
+            "clock_sync_url": "",  # 为空时使用 submit_url 所在站点
+            "clock_sync_samples": 8,
+            "clock_sync_lead": 30,  # 提前多少秒校时
+            "prewarm_lead": 2.0,  # 提前多少秒预热连接
+            # 页面选课（未配置 submit_url）时识别选课请求的 URL 路径正则，按实际选课接口调整
+            "page_submit_pattern": "/(?:select|submit|selectCourse|xkOper)$",
+            "metrics_dir": ""  # 抢课指标导出目录，为空时使用 logs/grab_metrics
         }
         self.config_file = Path.cwd() / "scripts" / "course_grabber_config.json"
+        # 课程目标和抢课结果保存在 SQLite 中，按条目更新
+        self.store = GrabStore(self.config_file.with_suffix(".db"))
+        # 设置文件变化时更新 self.config（运行中的抢课线程和引擎共享这个字典，每次提交时读取的
+        # request_timeout、submit_params 等立即生效；并发数、尝试次数、校时等启动时确定的设置下次开抢生效）
+        self.settings_service = ConfigService(self.config_file, _parse_grabber_settings)
+        self.settings_service.subscribe(self._on_settings_changed, call_now=False)
         self.grabber_thread = None
-        
-        # 定时器（用于定时开始抢课）
-        self.start_timer = QTimer()
-        self.start_timer.timeout.connect(self.on_timer_start)
+        # 收集登录后的 Cookie，抢课时直接发 HTTP 请求
+        self.cookie_collector = WebviewCookieCollector(webview)
+        self.monitor = None  # 课程余量监控（start_monitoring 时创建）
+        # 工作线程通过它把页面脚本排队到 GUI 线程
+        self.dom_bridge = DomBridge(webview)
         
     def load_config(self):
-        """加载抢课配置"""
+        """加载抢课配置（设置来自 JSON，课程及其状态来自数据库）"""
         try:
+            settings = self.settings_service.value
+            if settings is not None:
+                self.config.update(settings)
+            courses_data = []
             if self.config_file.exists():
                 with open(self.config_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.config.update(data.get("settings", {}))
-                    courses_data = data.get("courses", [])
-                    self.courses = [CourseConfig.from_dict(c) for c in courses_data]
-                return True
+                    courses_data = json.load(f).get("courses", [])
+            # 首次使用数据库时导入 JSON 中的课程，之后课程以数据库为准
+            if self.store.is_empty():
+                for c in courses_data:
+                    self.store.upsert_course(CourseConfig.from_dict(c))
+                courses_data = []
+            self.courses = [CourseConfig.from_dict(c) for c in self.store.load_courses()]
+            if courses_data and self._differs_from_store(courses_data):
+                self._warn(f"⚠️ {self.config_file.name} 中的课程与数据库 {self.store.db_path.name} 不一致，"
+                           f"已忽略（课程以数据库为准，请通过界面增删课程）")
+            return True
         except Exception as e:
             print(f"加载抢课配置失败: {e}")
         return False
     
+    def _differs_from_store(self, courses_data):
+        """JSON 中的课程是否与数据库中的不同（忽略抢课状态）"""
+        def strip(course):
+            data = course.to_dict()
+            data.pop("status")
+            return data
+        in_file = {c.key: strip(c) for c in map(CourseConfig.from_dict, courses_data)}
+        return in_file != {c.key: strip(c) for c in self.courses}
+
+    def _warn(self, msg):
+        if self.log_sink:
+            self.log_sink(msg)
+        else:
+            print(msg)
+
+    def _on_settings_changed(self, settings):
+        changed = sorted(k for k, v in settings.items() if self.config.get(k) != v)
+        if not changed:
+            return
+        self.config.update(settings)
+        if self.log_sink:
+            self.log_sink(f"🔄 抢课设置已更新: {', '.join(changed)}")
+
     def save_config(self):
-        """保存抢课配置"""
+        """保存抢课设置（课程只保存在数据库中，不再写入 JSON）"""
         try:
-            self.config_file.parent.mkdir(parents=True, exist_ok=True)
-            data = {
-                "settings": self.config,
-                "courses": [c.to_dict() for c in self.courses]
-            }
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=4)
+            default_writer().save(self.config_file, {"settings": self.config})
             return True
         except Exception as e:
             print(f"保存抢课配置失败: {e}")
         return False
     
     def add_course(self, course_config):
-        """添加课程到抢课列表"""
+        """添加课程到抢课列表（同一课程ID或同名同教师的课程会被替换）"""
+        self.courses = [c for c in self.courses if c.key != course_config.key]
         self.courses.append(course_config)
-        self.save_config()
+        self.store.upsert_course(course_config)
     
-    def remove_course(self, course_name):
-        """移除课程"""
-        self.courses = [c for c in self.courses if c.course_name != course_name]
-        self.save_config()
+    def remove_course(self, key):
+        """移除课程（key 为 CourseConfig.key）"""
+        self.courses = [c for c in self.courses if c.key != key]
+        self.store.delete_course(key)
+
+    def reset_course_status(self):
+        """把所有课程重置为待抢状态（开始新一轮抢课前使用）"""
+        for course in self.courses:
+            course.status = "pending"
+            self.store.update_status(course.key, "pending")
     
-    def start_grabbing(self, callback=None):
-        """开始抢课"""
+    def start_grabbing(self, callback=None, start_at=None):
+        """开始抢课（指定 start_at 时线程会先与服务器校时并等待到该时间）"""
         if not self.config.get("enabled"):
             return False, "抢课功能未启用"
         
         if not self.courses:
             return False, "没有配置要抢的课程"
+
+        if self.grabber_thread and self.grabber_thread.isRunning():
+            return False, "上一次抢课尚未结束（停止后请等待线程退出）"
         
+        # 用 webview 当前的登录 Cookie 创建连接池会话
+        session = build_session(
+            self.cookie_collector.cookies(),
+            user_agent=self.cookie_collector.user_agent,
+            pool_size=connection_limit(self.courses, self.config),
+        )
+
         # 创建并启动抢课线程
-        self.grabber_thread = CourseGrabber(self.webview, self.courses, self.config)
+        self.grabber_thread = CourseGrabber(
+            self.courses, self.config, session, start_at,
+            dom_bridge=self.dom_bridge, store=self.store
+        )
         
+        if self.log_sink:
+            self.grabber_thread.log_message.connect(self.log_sink)
         if callback:
             self.grabber_thread.log_message.connect(callback)
         
         self.grabber_thread.start()
         return True, "已启动抢课"
     
+    def start_monitoring(self, scheduled_start=None):
+        """监控关注课程的余量，变为可选时发出 monitor.course_available"""
+        if self.monitor is None:
+            self.monitor = CourseMonitor(
+                self.webview,
+                slow_interval=int(float(self.config.get("auto_refresh_interval", 1)) * 1000)
+            )
+            if self.log_sink:
+                self.monitor.log_message.connect(self.log_sink)
+        self.monitor.watch(self.courses)
+        self.monitor.start(scheduled_start)
+        return self.monitor
+
+    def stop_monitoring(self):
+        """停止余量监控"""
+        if self.monitor:
+            self.monitor.stop()
+
     def stop_grabbing(self):
-        """停止抢课"""
-        if self.grabber_thread and self.grabber_thread.running:
-            self.grabber_thread.stop()
-            self.grabber_thread.wait()
+        """停止抢课（不在 GUI 线程等待线程退出：页面选课的结果要经 GUI 线程送回）"""
+        thread = self.grabber_thread
+        if thread and thread.running:
+            thread.finished.connect(lambda: self._warn("⏹ 抢课线程已退出"))
+            thread.stop()
     
-    def schedule_start(self, start_datetime):
-        """定时开始抢课"""
+    def schedule_start(self, start_datetime, callback=None):
+        """定时开始抢课（与服务器时钟同步后精确启动）"""
         now = datetime.now()
         if start_datetime <= now:
             return False, "开始时间必须在未来"
         
-        delay_ms = int((start_datetime - now).total_seconds() * 1000)
-        self.start_timer.start(delay_ms)
-        return True, f"已设置定时抢课，将在 {start_datetime.strftime('%Y-%m-%d %H:%M:%S')} 开始"
-    
-    def on_timer_start(self):
-        """定时器触发，开始抢课"""
-        self.start_timer.stop()
-        self.start_grabbing()
+        ok, msg = self.start_grabbing(callback, start_at=start_datetime)
+        if not ok:
+            return ok, msg
+        return True, f"已设置定时抢课，将在 {start_datetime.strftime('%Y-%m-%d %H:%M:%S')} 开始（按服务器时间）"
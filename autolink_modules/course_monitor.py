@@ -0,0 +1,143 @@
+"""
+课程余量监控 - 增量跟踪选课页面上的课程状态
+
+功能：
+- Python 端维护课程索引（课程名、教师、状态、是否可选）
+- 每次轮询只应用页面返回的增量
+- 临近开抢时间或出现余量时自动加快轮询
+- 关注的课程变为可选时立即发出信号
+"""
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from datetime import datetime
+import json
+import time
+
+from autolink_modules.js_scripts import get_course_delta_js
+
+
+def _norm(text):
+    return "".join((text or "").split()).lower()
+
+
+class CourseMonitor(QObject):
+    """课程余量监控器（运行在 GUI 线程，通过 runJavaScript 轮询）"""
+
+    course_available = pyqtSignal(str, str)  # (course_name, teacher_name)
+    courses_changed = pyqtSignal(int)  # 本次变化的课程数
+    log_message = pyqtSignal(str)
+
+    def __init__(self, webview, slow_interval=1000, fast_interval=150,
+                 fast_window=60, hot_duration=10):
+        super().__init__()
+        self.webview = webview
+        self.slow_interval = slow_interval  # 毫秒
+        self.fast_interval = fast_interval  # 毫秒
+        self.fast_window = fast_window  # 距开抢多少秒内加速
+        self.hot_duration = hot_duration  # 出现余量后保持加速的秒数
+        self.courses = {}  # 课程键 -> {id, name, teacher, status, available}
+        self.scheduled_start = None
+        self._watched = []  # [(course_id, 规范化课程名, 规范化教师名, 原课程名, 原教师名)]
+        self._last_seats_at = 0.0
+        self._pending = False
+        self._active = False
+        self._reset_next = True
+        self.last_payload_size = 0
+        self.last_poll_ms = 0.0
+
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setSingleShot(True)
+        self.poll_timer.timeout.connect(self.poll)
+        # 页面重新加载后页面端状态丢失，下次轮询要求完整同步
+        self.webview.loadFinished.connect(self._on_load_finished)
+
+    def watch(self, courses):
+        """设置关注的课程（CourseConfig 列表）"""
+        self._watched = [
+            (str(c.course_id or ""), _norm(c.course_name), _norm(c.teacher_name),
+             c.course_name, c.teacher_name)
+            for c in courses
+        ]
+
+    def start(self, scheduled_start: datetime = None):
+        """开始监控，scheduled_start 为开抢时间（用于调整轮询频率）"""
+        self.scheduled_start = scheduled_start
+        self._active = True
+        self._reset_next = True
+        self.poll_timer.start(0)
+        self.log_message.emit("👀 已开始监控课程余量")
+
+    def stop(self):
+        self._active = False
+        self.poll_timer.stop()
+        self.log_message.emit("⏹ 已停止监控课程余量")
+
+    def next_interval(self):
+        """根据开抢时间和余量变化计算下一次轮询间隔（毫秒）"""
+        now = time.time()
+        if now - self._last_seats_at < self.hot_duration:
+            return self.fast_interval
+        if self.scheduled_start is not None:
+            remaining = self.scheduled_start.timestamp() - now
+            if -self.fast_window < remaining < self.fast_window:
+                return self.fast_interval
+            if 0 < remaining < self.fast_window * 5:
+                # 线性过渡：越接近开抢越快
+                ratio = (remaining - self.fast_window) / (self.fast_window * 4)
+                return int(self.fast_interval + (self.slow_interval - self.fast_interval) * ratio)
+        return self.slow_interval
+
+    def _on_load_finished(self, ok):
+        self._reset_next = True
+
+    def poll(self):
+        page = self.webview.page()
+        if page is None or self._pending:
+            self.poll_timer.start(self.next_interval())
+            return
+        self._pending = True
+        self._poll_started = time.perf_counter()
+        page.runJavaScript(get_course_delta_js(self._reset_next), self._on_delta)
+        self._reset_next = False
+
+    def _on_delta(self, payload):
+        self._pending = False
+        self.last_poll_ms = (time.perf_counter() - self._poll_started) * 1000
+        self.last_payload_size = len(payload or "")
+        if not self._active:
+            return
+        if payload:
+            try:
+                self.apply_delta(json.loads(payload))
+            except Exception as e:
+                self.log_message.emit(f"❌ 解析课程增量失败: {e}")
+        self.poll_timer.start(self.next_interval())
+
+    def apply_delta(self, delta):
+        """把页面返回的增量应用到课程索引"""
+        if delta.get("reset"):
+            self.courses.clear()
+        for key in delta.get("r", []):
+            self.courses.pop(key, None)
+
+        changed = delta.get("u", [])
+        for info in changed:
+            key = info.pop("key")
+            previous = self.courses.get(key)
+            self.courses[key] = info
+            became_available = info["available"] and not (previous and previous["available"])
+            if became_available:
+                if previous is not None:
+                    self._last_seats_at = time.time()
+                self._notify_if_watched(info)
+
+        if changed or delta.get("r"):
+            self.courses_changed.emit(len(changed))
+
+    def _notify_if_watched(self, info):
+        name, teacher = _norm(info["name"]), _norm(info["teacher"])
+        for course_id, w_name, w_teacher, raw_name, raw_teacher in self._watched:
+            if (course_id and course_id == info.get("id")) or (
+                    w_name and w_name == name and (not w_teacher or w_teacher == teacher)):
+                self.log_message.emit(f"🔔 课程可选: {raw_name} ({raw_teacher or info['teacher']})")
+                self.course_available.emit(raw_name, raw_teacher or info["teacher"])
+                return
@@ -0,0 +1,272 @@
+"""
+模拟选课服务器 - 离线测试和调优抢课逻辑
+
+功能：
+- 根据 HTMLRecorder 保存的页面（或自动生成）提供课程表
+- 可配置名额、响应延迟、限流、开放时间
+- 返回"选课成功"/"人数已满"/"已选"等与真实系统类似的文本
+- 页面上带确认弹窗，可用于测试 get_select_course_js 等注入脚本
+
+完全离线运行，只依赖标准库。
+"""
+from dataclasses import dataclass, field
+from html import escape
+from html.parser import HTMLParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import json
+import random
+import threading
+import time
+
+from autolink_modules.snapshot_store import read_snapshot
+
+
+@dataclass
+class SimCourse:
+    """模拟课程"""
+    course_id: str
+    course_name: str
+    teacher_name: str
+    capacity: int = 30
+    enrolled: list = field(default_factory=list)  # 已选上的客户端
+
+    @property
+    def remaining(self):
+        return self.capacity - len(self.enrolled)
+
+
+class _CourseTableParser(HTMLParser):
+    """从保存的页面中提取课程行（课程名取第 2 列，教师取第 3 列，与注入脚本一致）"""
+
+    def __init__(self):
+        super().__init__()
+        self.rows = []  # [(course_id, [单元格文本])]
+        self._row = None
+        self._cell = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "tr":
+            self._row = (attrs.get("data-course-id") or "", [])
+        elif tag in ("td", "th") and self._row is not None:
+            self._cell = []
+        elif self._row is not None and attrs.get("data-course-id") and not self._row[0]:
+            self._row = (attrs["data-course-id"], self._row[1])
+
+    def handle_endtag(self, tag):
+        if tag in ("td", "th") and self._row is not None and self._cell is not None:
+            self._row[1].append("".join(self._cell).strip())
+            self._cell = None
+        elif tag == "tr" and self._row is not None:
+            self.rows.append(self._row)
+            self._row = None
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+
+def load_courses_from_snapshot(html_path, capacity=30):
+    """从 HTMLRecorder 保存的页面中构建模拟课程（HTML 文件路径或快照 ID）"""
+    parser = _CourseTableParser()
+    parser.feed(read_snapshot(html_path))
+    courses = []
+    for idx, (course_id, cells) in enumerate(parser.rows):
+        if len(cells) < 3 or not cells[1]:
+            continue
+        courses.append(SimCourse(course_id or f"SIM{idx:04d}", cells[1], cells[2], capacity))
+    return courses
+
+
+def generate_courses(count=200, capacity=30):
+    """生成模拟课程"""
+    return [SimCourse(f"SIM{i:04d}", f"课程{i:04d}", f"教师{i % 97}", capacity) for i in range(count)]
+
+
+class CourseSimServer:
+    """模拟选课服务器
+
+    latency: (最小, 最大) 响应延迟（毫秒）
+    rate_limit: 每个客户端每秒允许的选课请求数，0 表示不限
+    open_delay: 启动后多少秒开放选课，之前返回"选课未开始"
+    """
+
+    def __init__(self, courses, host="127.0.0.1", port=0, latency=(0, 0), rate_limit=0,
+                 open_delay=0.0, confirm_dialog=True):
+        self.courses = {c.course_id: c for c in courses}
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.open_at = time.time() + open_delay
+        self.confirm_dialog = confirm_dialog
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self._buckets = {}  # 客户端 -> (令牌数, 上次时间)
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    # ---------- 选课逻辑 ----------
+
+    def _allow(self, client):
+        """令牌桶限流"""
+        if not self.rate_limit:
+            return True
+        now = time.monotonic()
+        tokens, last = self._buckets.get(client, (self.rate_limit, now))
+        tokens = min(self.rate_limit, tokens + (now - last) * self.rate_limit)
+        if tokens < 1:
+            self._buckets[client] = (tokens, now)
+            return False
+        self._buckets[client] = (tokens - 1, now)
+        return True
+
+    def select(self, client, course_id):
+        """处理一次选课请求，返回 (HTTP 状态码, 响应文本)"""
+        with self.lock:
+            self.request_count += 1
+            if not self._allow(client):
+                return 429, "请求过于频繁，请稍后再试"
+            if time.time() < self.open_at:
+                return 200, "选课未开始"
+            course = self.courses.get(course_id)
+            if course is None:
+                return 200, "选课失败：课程不存在"
+            if client in course.enrolled:
+                return 200, "该课程已选"
+            if course.remaining <= 0:
+                return 200, "选课失败：人数已满"
+            course.enrolled.append(client)
+            return 200, "选课成功"
+
+    def render_table(self):
+        """生成课程表页面（结构与注入脚本的默认选择器一致）"""
+        rows = []
+        with self.lock:
+            for c in self.courses.values():
+                disabled = " disabled" if c.remaining <= 0 else ""
+                rows.append(
+                    f'<tr class="course-row" data-course-id="{escape(c.course_id)}">'
+                    f"<td>{escape(c.course_id)}</td>"
+                    f'<td class="course-name">{escape(c.course_name)}</td>'
+                    f'<td class="teacher-name">{escape(c.teacher_name)}</td>'
+                    f'<td class="course-status">余量 {c.remaining}/{c.capacity}</td>'
+                    f'<td><button class="select-btn"{disabled} '
+                    f"onclick=\"askSelect('{escape(c.course_id)}')\">选课</button></td></tr>"
+                )
+        return _PAGE_TEMPLATE.format(
+            rows="".join(rows), confirm="true" if self.confirm_dialog else "false"
+        )
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _client(self):
+                # 以 Cookie 中的 sim_client 区分不同"学生"，没有时用来源地址
+                for part in self.headers.get("Cookie", "").split(";"):
+                    name, _, value = part.strip().partition("=")
+                    if name == "sim_client" and value:
+                        return value
+                return "%s:%s" % self.client_address[:2]
+
+            def _delay(self):
+                low, high = server.latency
+                if high > 0:
+                    time.sleep(random.uniform(low, high) / 1000)
+
+            def _send(self, status, body, content_type="text/html; charset=utf-8"):
+                data = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(data)
+
+            def do_HEAD(self):
+                self._send(200, "")
+
+            def do_GET(self):
+                path = urlsplit(self.path)
+                self._delay()
+                if path.path == "/api/courses":
+                    with server.lock:
+                        data = [{"course_id": c.course_id, "course_name": c.course_name,
+                                 "teacher_name": c.teacher_name, "remaining": c.remaining}
+                                for c in server.courses.values()]
+                    self._send(200, json.dumps(data, ensure_ascii=False), "application/json")
+                elif path.path == "/select":
+                    course_id = parse_qs(path.query).get("course_id", [""])[0]
+                    self._send(*server.select(self._client(), course_id))
+                else:
+                    self._send(200, server.render_table())
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                form = parse_qs(self.rfile.read(length).decode("utf-8"))
+                self._delay()
+                if urlsplit(self.path).path == "/select":
+                    self._send(*server.select(self._client(), form.get("course_id", [""])[0]))
+                else:
+                    self._send(404, "Not Found")
+
+        return Handler
+
+
+_PAGE_TEMPLATE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>模拟选课系统</title></head>
+<body>
+<div class="select-course">
+<table id="courseTable" class="course-table">
+<thead><tr><th>课程号</th><th>课程名</th><th>教师</th><th>余量</th><th>操作</th></tr></thead>
+<tbody>{rows}</tbody>
+</table>
+</div>
+<div id="confirmDialog" style="display:none">
+  <p>确认选择该课程？</p>
+  <button class="confirm-select" onclick="doSelect()">确定</button>
+</div>
+<div id="result"></div>
+<script>
+var pendingCourse = null;
+function askSelect(courseId) {{
+    pendingCourse = courseId;
+    if ({confirm}) {{
+        document.getElementById('confirmDialog').style.display = 'block';
+    }} else {{
+        doSelect();
+    }}
+}}
+function doSelect() {{
+    document.getElementById('confirmDialog').style.display = 'none';
+    var body = new URLSearchParams({{course_id: pendingCourse}});
+    fetch('/select', {{method: 'POST', body: body}}).then(function(r) {{ return r.text(); }})
+        .then(function(text) {{
+            var box = document.getElementById('result');
+            box.className = text.indexOf('成功') !== -1 ? 'success-message' : 'error-message';
+            box.textContent = text;
+        }});
+}}
+</script>
+</body></html>
+"""
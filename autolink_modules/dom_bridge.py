@@ -0,0 +1,76 @@
+"""
+DOM 桥接 - 让工作线程安全地在 webview 中执行 JavaScript
+
+QWebEngineView 只能在 GUI 线程访问。工作线程通过排队信号把脚本交给
+GUI 线程执行，结果通过 concurrent.futures.Future 返回，工作线程自身
+只做网络 I/O 和解析。
+
+页面脚本也可以通过控制台主动推送数据：输出 "前缀 + JSON"（JSON 中带
+token 字段），等待同一 token 的 Future 即得到该 JSON 对象。需要页面类
+提供 console_message 信号（见 main_window.CustomWebEnginePage）。
+"""
+from PyQt5.QtCore import QObject, Qt, pyqtSignal
+from concurrent.futures import Future
+import json
+import threading
+
+from autolink_modules.js_scripts import PUSH_PREFIX
+
+
+class DomBridge(QObject):
+    """在 GUI 线程创建，run_js / expect 可在任意线程调用"""
+
+    _js_requested = pyqtSignal(str, object)  # (script, Future)
+
+    def __init__(self, webview):
+        super().__init__()
+        self.webview = webview
+        # 排队连接：槽函数总在 DomBridge 所在的 GUI 线程执行
+        self._js_requested.connect(self._run_js, Qt.QueuedConnection)
+        self._pending = {}  # token -> Future
+        self._pending_lock = threading.Lock()
+        page = webview.page()
+        self.push_supported = hasattr(page, "console_message")
+        if self.push_supported:
+            page.console_message.connect(self._on_console_message)
+
+    def run_js(self, script):
+        """提交脚本，返回 Future（不要在 GUI 线程中等待它，否则会死锁）"""
+        future = Future()
+        self._js_requested.emit(script, future)
+        return future
+
+    def _run_js(self, script, future):
+        if not future.set_running_or_notify_cancel():
+            return
+        page = self.webview.page()
+        if page is None:
+            future.set_exception(RuntimeError("页面不可用"))
+            return
+        page.runJavaScript(script, future.set_result)
+
+    # ---------- 页面主动推送 ----------
+
+    def expect(self, token):
+        """登记一个等待页面推送的 Future（应在执行会触发推送的脚本之前调用）"""
+        future = Future()
+        with self._pending_lock:
+            self._pending[token] = future
+        return future
+
+    def discard(self, token):
+        """放弃等待（超时后调用，避免残留）"""
+        with self._pending_lock:
+            self._pending.pop(token, None)
+
+    def _on_console_message(self, message):
+        if not message.startswith(PUSH_PREFIX):
+            return
+        try:
+            data = json.loads(message[len(PUSH_PREFIX):])
+        except ValueError:
+            return
+        with self._pending_lock:
+            future = self._pending.pop(data.get("token"), None)
+        if future is not None:
+            future.set_result(data)
@@ -0,0 +1,196 @@
+"""
+DOM 变更录制 - 一次基线快照 + MutationObserver 增量记录
+
+功能：
+- 开始录制时序列化一次整棵 DOM 作为基线，之后只记录变更
+- 页面内缓冲变更，定时批量取回追加到 recorded_sessions/dom/*.jsonl
+- 页面跳转后自动重新注入并记录新的基线；页面端缓冲溢出时也会重新记录基线
+- 录制文件可用 dom_timeline.DomTimeline 重建任意时刻的页面
+
+文件格式见 dom_timeline 模块。
+"""
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from datetime import datetime
+from pathlib import Path
+import json
+
+# 页面端录制器：节点通过 WeakMap 分配 id，同一批 MutationObserver 记录按目标合并，
+# 只记录目标的最终状态。
+DOM_RECORDER_JS = """
+(function() {
+    if (window.__domRecorder) return 'already_recording';
+    var MAX_RECORDS = %(max_records)d;
+    var ids = new WeakMap(), nextId = 1;
+    var buffer = [], baseAt = 0, t0 = 0, base = null, observer = null;
+
+    function idOf(node) {
+        var id = ids.get(node);
+        if (!id) {
+            id = nextId++;
+            ids.set(node, id);
+        }
+        return id;
+    }
+
+    function serialize(node) {
+        var id = idOf(node);
+        if (node.nodeType === 1) {
+            var attrs = {};
+            for (var i = 0; i < node.attributes.length; i++) {
+                attrs[node.attributes[i].name] = node.attributes[i].value;
+            }
+            var children = [];
+            for (var c = node.firstChild; c; c = c.nextSibling) {
+                if (c.nodeType === 1 || c.nodeType === 3 || c.nodeType === 8) children.push(serialize(c));
+            }
+            return [id, 1, node.tagName, attrs, children];
+        }
+        return [id, node.nodeType, node.data];
+    }
+
+    function childList(node, added) {
+        var list = [];
+        for (var c = node.firstChild; c; c = c.nextSibling) {
+            if (c.nodeType !== 1 && c.nodeType !== 3 && c.nodeType !== 8) continue;
+            list.push(added.has(c) || !ids.has(c) ? serialize(c) : ids.get(c));
+        }
+        return list;
+    }
+
+    function snapshot() {
+        baseAt = Date.now();
+        t0 = performance.now();
+        base = {k: 'base', at: baseAt, url: location.href, tree: serialize(document.documentElement)};
+        buffer = [];
+    }
+
+    function onMutations(records) {
+        var t = Math.round(performance.now() - t0);
+        var added = new Set(), targets = new Map(), attrs = new Map(), texts = new Set();
+        records.forEach(function(m) {
+            if (m.type === 'childList') {
+                m.addedNodes.forEach(function(n) { added.add(n); });
+                targets.set(m.target, true);
+            } else if (m.type === 'attributes') {
+                attrs.set(m.target, (attrs.get(m.target) || new Set()).add(m.attributeName));
+            } else {
+                texts.add(m.target);
+            }
+        });
+        targets.forEach(function(_, node) {
+            if (ids.has(node) && node.isConnected) buffer.push(['c', t, ids.get(node), childList(node, added)]);
+        });
+        attrs.forEach(function(names, node) {
+            if (!ids.has(node) || !node.isConnected) return;
+            names.forEach(function(name) {
+                buffer.push(['a', t, ids.get(node), name, node.getAttribute(name)]);
+            });
+        });
+        texts.forEach(function(node) {
+            if (ids.has(node) && node.isConnected) buffer.push(['t', t, ids.get(node), node.data]);
+        });
+        if (buffer.length > MAX_RECORDS) snapshot();  // 取回不及时：丢弃缓冲，改为重新记录基线
+    }
+
+    snapshot();
+    observer = new MutationObserver(onMutations);
+    observer.observe(document.documentElement, {
+        childList: true, subtree: true, attributes: true, characterData: true
+    });
+
+    window.__domRecorder = {
+        drain: function() {
+            var out = {base: base, at: baseAt, r: buffer};
+            base = null;
+            buffer = [];
+            return JSON.stringify(out);
+        },
+        stop: function() {
+            var out = window.__domRecorder.drain();
+            observer.disconnect();
+            delete window.__domRecorder;
+            return out;
+        }
+    };
+    return 'recording_started';
+})();
+"""
+
+_DRAIN_JS = "window.__domRecorder ? window.__domRecorder.drain() : null;"
+_STOP_JS = "window.__domRecorder ? window.__domRecorder.stop() : null;"
+
+
+class DomRecorder(QObject):
+    """DOM 变更录制器（在 GUI 线程使用）"""
+
+    log_message = pyqtSignal(str)
+
+    def __init__(self, webview, output_dir=None, drain_interval=1000, max_records=50000):
+        super().__init__()
+        self.webview = webview
+        self.output_dir = Path(output_dir) if output_dir else Path.cwd() / "recorded_sessions" / "dom"
+        self.max_records = max_records
+        self.path = None
+        self.recording = False
+        self.baselines = 0
+        self.changes = 0
+        self._timer = QTimer(self)
+        self._timer.setInterval(drain_interval)
+        self._timer.timeout.connect(self.drain)
+
+    def start(self):
+        """开始录制，返回录制文件路径"""
+        if self.recording:
+            return self.path
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.path = self.output_dir / f"dom_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]}.jsonl"
+        self.recording = True
+        self.baselines = self.changes = 0
+        self.webview.loadFinished.connect(self._on_load_finished)
+        self._install()
+        self._timer.start()
+        self.log_message.emit(f"🧬 已开始 DOM 变更录制: {self.path.name}")
+        return self.path
+
+    def stop(self):
+        """停止录制并取回剩余变更"""
+        if not self.recording:
+            return
+        self.recording = False
+        self._timer.stop()
+        self.webview.loadFinished.disconnect(self._on_load_finished)
+        self.webview.page().runJavaScript(_STOP_JS, self._on_drained)
+        self.log_message.emit(
+            f"⏹ DOM 变更录制已停止: {self.baselines} 个基线，{self.changes} 条变更"
+            f"（python -m autolink_modules.dom_timeline {self.path} --at 秒数）"
+        )
+
+    def _install(self):
+        self.webview.page().runJavaScript(DOM_RECORDER_JS % {"max_records": self.max_records})
+
+    def _on_load_finished(self, ok):
+        # 页面跳转后页面端录制器随旧页面消失，重新注入并记录新基线
+        if ok and self.recording:
+            self._install()
+
+    def drain(self):
+        self.webview.page().runJavaScript(_DRAIN_JS, self._on_drained)
+
+    def _on_drained(self, data):
+        if not data or self.path is None:
+            return
+        try:
+            batch = json.loads(data)
+            lines = []
+            if batch.get("base"):
+                lines.append(json.dumps(batch["base"], ensure_ascii=False, separators=(",", ":")))
+                self.baselines += 1
+            if batch["r"]:
+                lines.append(json.dumps({"k": "rec", "at": batch["at"], "r": batch["r"]},
+                                        ensure_ascii=False, separators=(",", ":")))
+                self.changes += len(batch["r"])
+            if lines:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write("\n".join(lines) + "\n")
+        except (ValueError, KeyError, OSError) as e:
+            self.log_message.emit(f"❌ 保存 DOM 变更失败: {e}")
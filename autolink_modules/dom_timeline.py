@@ -0,0 +1,170 @@
+"""
+DOM 时间线 - 根据基线快照和变更记录重建任意时刻的页面
+
+录制文件为 JSON Lines（由 DomRecorder 写入），每行一条：
+- {"k": "base", "at": 毫秒时间戳, "url": ..., "tree": 节点}  基线快照（页面跳转后会重新记录）
+- {"k": "rec", "at": 基线时间戳, "r": [变更, ...]}         一批变更
+
+节点：元素 [id, 1, 标签, {属性}, [子节点]]，文本 [id, 3, 文本]，注释 [id, 8, 文本]
+变更（t 为相对基线的毫秒数）：
+- ["c", t, 父节点id, [子节点]]  子节点列表的最终状态，已知节点只写 id，新节点写完整结构
+- ["a", t, 节点id, 属性名, 值或 null]
+- ["t", t, 节点id, 文本]
+
+本模块不依赖 Qt。命令行：
+    python -m autolink_modules.dom_timeline <录制文件> [--at 秒] [-o 输出.html]
+"""
+from html import escape
+from pathlib import Path
+import argparse
+import json
+
+VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta",
+    "param", "source", "track", "wbr",
+}
+RAW_TEXT_TAGS = {"script", "style"}
+
+
+class DomState:
+    """一个基线快照上叠加变更后的 DOM 状态"""
+
+    def __init__(self, tree, url=""):
+        self.url = url
+        self.nodes = {}  # id -> [类型, 标签或文本, 属性, 子节点id列表]
+        self.root = self._register(tree)
+
+    def _register(self, node):
+        """登记节点（及其子树），返回 id；node 为 int 时表示已知节点"""
+        if isinstance(node, int):
+            return node
+        node_id, node_type = node[0], node[1]
+        if node_type == 1:
+            children = [self._register(child) for child in node[4]]
+            self.nodes[node_id] = [1, node[2], dict(node[3]), children]
+        else:
+            self.nodes[node_id] = [node_type, node[2], None, None]
+        return node_id
+
+    def apply(self, record):
+        """应用一条变更，目标节点未知时忽略（其最终状态已包含在新节点结构中）"""
+        kind, node_id = record[0], record[2]
+        node = self.nodes.get(node_id)
+        if node is None:
+            return
+        if kind == "c" and node[0] == 1:
+            node[3] = [self._register(child) for child in record[3]]
+        elif kind == "a" and node[0] == 1:
+            if record[4] is None:
+                node[2].pop(record[3], None)
+            else:
+                node[2][record[3]] = record[4]
+        elif kind == "t" and node[0] != 1:
+            node[1] = record[3]
+
+    def to_html(self):
+        parts = ["<!DOCTYPE html>\n"]
+        self._write(self.root, parts, raw=False)
+        return "".join(parts)
+
+    def _write(self, node_id, parts, raw):
+        node = self.nodes.get(node_id)
+        if node is None:
+            return
+        node_type, value, attrs, children = node
+        if node_type == 3:
+            parts.append(value if raw else escape(value, quote=False))
+        elif node_type == 8:
+            parts.append(f"<!--{value}-->")
+        else:
+            tag = value.lower()
+            attr_text = "".join(f' {name}="{escape(str(v))}"' for name, v in attrs.items())
+            parts.append(f"<{tag}{attr_text}>")
+            if tag in VOID_TAGS:
+                return
+            for child in children:
+                self._write(child, parts, raw=tag in RAW_TEXT_TAGS)
+            parts.append(f"</{tag}>")
+
+
+class DomTimeline:
+    """读取录制文件，按时间重建页面"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.segments = []  # [(基线行, [(绝对毫秒, 变更), ...])]
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    continue  # 录制中断时最后一行可能不完整
+                if item.get("k") == "base":
+                    self.segments.append((item, []))
+                elif item.get("k") == "rec" and self.segments:
+                    base = self.segments[-1][0]
+                    if item.get("at") != base["at"]:
+                        continue  # 属于已被替换的基线
+                    self.segments[-1][1].extend((base["at"] + r[1], r) for r in item["r"])
+
+    @property
+    def start(self):
+        """录制开始时间（毫秒时间戳）"""
+        return self.segments[0][0]["at"] if self.segments else 0
+
+    @property
+    def end(self):
+        if not self.segments:
+            return 0
+        base, records = self.segments[-1]
+        return records[-1][0] if records else base["at"]
+
+    def state_at(self, ts_ms=None):
+        """重建指定时间（毫秒时间戳，None 表示最后）的 DOM 状态"""
+        if not self.segments:
+            raise ValueError("录制文件中没有基线快照")
+        if ts_ms is None:
+            ts_ms = self.end
+        base, records = self.segments[0]
+        for segment in self.segments:
+            if segment[0]["at"] > ts_ms:
+                break
+            base, records = segment
+        state = DomState(base["tree"], base.get("url", ""))
+        for at, record in records:
+            if at > ts_ms:
+                break
+            state.apply(record)
+        return state
+
+    def html_at(self, ts_ms=None):
+        return self.state_at(ts_ms).to_html()
+
+    def change_times(self):
+        """所有变更的时间（毫秒时间戳），用于逐步回放"""
+        return [at for _, records in self.segments for at, _ in records]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="根据 DOM 变更录制重建页面")
+    parser.add_argument("recording", help="DomRecorder 写入的 .jsonl 文件")
+    parser.add_argument("--at", type=float, help="相对录制开始的秒数，默认为最后状态")
+    parser.add_argument("-o", "--output", help="输出 HTML 文件，默认输出到终端")
+    args = parser.parse_args()
+
+    timeline = DomTimeline(args.recording)
+    ts = None if args.at is None else timeline.start + args.at * 1000
+    html = timeline.html_at(ts)
+    if args.output:
+        Path(args.output).write_text(html, encoding="utf-8")
+        print(f"已写入 {args.output}（共 {len(timeline.segments)} 个基线，"
+              f"{len(timeline.change_times())} 条变更）")
+    else:
+        print(html)
+
+
+if __name__ == "__main__":
+    main()
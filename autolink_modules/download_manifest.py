@@ -0,0 +1,164 @@
+"""
+下载清单 - SQLite 记录已完成的本子、章节、图片和 PDF
+
+功能：
+- 每张图片下载完成即记录（路径、大小、SHA-256），中断后从缺少的图片继续
+- 章节完成时记录图片数，PDF 由 pdf_stage 生成后补记
+- 本子全部完成后标记，重复下载请求直接由清单回答，不再访问网络或遍历目录
+- 清单中的文件被手动删除时（抽查一个文件不存在）自动作废对应记录
+
+数据库默认在 resources/downloads/manifest.db，可在多个下载线程中共用。
+"""
+from pathlib import Path
+import hashlib
+import sqlite3
+import threading
+import time
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS albums (
+    album_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL DEFAULT '',
+    photo_count INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'partial',
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS photos (
+    photo_id TEXT PRIMARY KEY,
+    album_id TEXT NOT NULL,
+    idx INTEGER NOT NULL DEFAULT 0,
+    title TEXT NOT NULL DEFAULT '',
+    image_count INTEGER NOT NULL DEFAULT 0,
+    pdf_path TEXT,
+    completed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_photos_album ON photos(album_id);
+CREATE TABLE IF NOT EXISTS images (
+    photo_id TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    album_id TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    PRIMARY KEY (photo_id, filename)
+);
+CREATE INDEX IF NOT EXISTS idx_images_album ON images(album_id);
+"""
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DownloadManifest:
+    """下载清单（线程安全）"""
+
+    def __init__(self, db_path=None):
+        self.db_path = Path(db_path) if db_path else \
+            Path(__file__).resolve().parent.parent / "resources" / "downloads" / "manifest.db"
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")  # WAL 模式下仍保证崩溃一致性
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _write(self, sql, params=()):
+        with self._lock, self._conn:
+            self._conn.execute(sql, params)
+
+    # ---------- 查询 ----------
+
+    def album_complete(self, album_id):
+        """本子是否已完整下载（抽查一张图片仍在磁盘上）"""
+        rows = self._query("SELECT status FROM albums WHERE album_id = ?", (str(album_id),))
+        if not rows or rows[0][0] != "done":
+            return False
+        sample = self._query("SELECT path FROM images WHERE album_id = ? LIMIT 1", (str(album_id),))
+        if sample and not Path(sample[0][0]).exists():
+            self.forget_album(album_id)
+            return False
+        return True
+
+    def album_summary(self, album_id):
+        album_id = str(album_id)
+        row = self._query(
+            "SELECT name, photo_count, status FROM albums WHERE album_id = ?", (album_id,))
+        photos, pdfs = self._query(
+            "SELECT COUNT(*), COUNT(pdf_path) FROM photos WHERE album_id = ?", (album_id,))[0]
+        images, size = self._query(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM images WHERE album_id = ?", (album_id,))[0]
+        name, photo_count, status = row[0] if row else ("", 0, "")
+        return {"album_id": album_id, "name": name, "status": status, "photo_count": photo_count,
+                "photos_done": photos, "images": images, "bytes": size, "pdfs": pdfs}
+
+    def photo_complete(self, photo_id):
+        return bool(self._query("SELECT 1 FROM photos WHERE photo_id = ?", (str(photo_id),)))
+
+    def done_images(self, photo_id):
+        """章节中已下载且文件仍存在的图片文件名"""
+        rows = self._query("SELECT filename, path FROM images WHERE photo_id = ?", (str(photo_id),))
+        return {filename for filename, path in rows if Path(path).exists()}
+
+    def photos_without_pdf(self, album_id):
+        """已完成但还没有 PDF 的章节：[(photo_id, title, 图片目录)]"""
+        rows = self._query(
+            "SELECT p.photo_id, p.title, MIN(i.path) FROM photos p JOIN images i ON i.photo_id = p.photo_id "
+            "WHERE p.album_id = ? AND p.pdf_path IS NULL GROUP BY p.photo_id ORDER BY p.idx",
+            (str(album_id),)
+        )
+        return [(photo_id, title, Path(path).parent) for photo_id, title, path in rows]
+
+    # ---------- 记录 ----------
+
+    def start_album(self, album_id, name, photo_count):
+        self._write(
+            "INSERT INTO albums (album_id, name, photo_count, status, updated_at) VALUES (?, ?, ?, 'partial', ?) "
+            "ON CONFLICT(album_id) DO UPDATE SET name = excluded.name, photo_count = excluded.photo_count, "
+            "status = 'partial', updated_at = excluded.updated_at",
+            (str(album_id), name or "", photo_count, time.time())
+        )
+
+    def record_image(self, album_id, photo_id, filename, path):
+        """图片写入磁盘后调用（在下载线程中计算哈希）"""
+        path = Path(path)
+        size = path.stat().st_size
+        self._write(
+            "INSERT OR REPLACE INTO images (photo_id, filename, album_id, path, size, sha256) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (str(photo_id), filename, str(album_id), str(path.resolve()), size, _sha256(path))
+        )
+
+    def finish_photo(self, album_id, photo_id, index, title, image_count, pdf_path=None):
+        self._write(
+            "INSERT OR REPLACE INTO photos (photo_id, album_id, idx, title, image_count, pdf_path, completed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (str(photo_id), str(album_id), index or 0, title or "", image_count,
+             str(pdf_path) if pdf_path else None, time.time())
+        )
+
+    def record_pdf(self, photo_id, pdf_path):
+        self._write("UPDATE photos SET pdf_path = ? WHERE photo_id = ?", (str(pdf_path), str(photo_id)))
+
+    def finish_album(self, album_id):
+        self._write("UPDATE albums SET status = 'done', updated_at = ? WHERE album_id = ?",
+                    (time.time(), str(album_id)))
+
+    def forget_album(self, album_id):
+        """作废本子的全部记录（文件被删除、需要重新下载时）"""
+        album_id = str(album_id)
+        with self._lock, self._conn:
+            for table in ("images", "photos", "albums"):
+                self._conn.execute(f"DELETE FROM {table} WHERE album_id = ?", (album_id,))
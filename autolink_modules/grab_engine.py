@@ -0,0 +1,278 @@
+"""
+抢课引擎 - 直接向选课系统发送提交请求
+
+功能：
+- 复用已登录 webview 的 Cookie，建立带连接池的 HTTP 会话
+- 所有课程（候选组）同时开抢，每门课程的尝试次数受 max_attempts 限制
+- max_concurrency 只限制同时进行中的请求数（与会话连接池大小一致），不限制同时开抢的课程数
+- 根据响应内容判断选课结果（SelectResult，HTTP 提交和页面拦截共用同一套判断）
+- 统计每秒尝试次数
+
+本模块不依赖 Qt，可以直接对本地模拟选课服务器进行测试。
+"""
+from collections import ChainMap
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import json
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from autolink_modules.course_conflicts import ConflictIndex
+
+
+# 默认的提交请求配置（需根据实际选课系统在 course_grabber_config.json 中调整）
+DEFAULT_ENGINE_SETTINGS = {
+    "submit_url": "",  # 例如 http://192.168.200.100/xk/submit
+    "submit_method": "POST",
+    "submit_params": {"course_id": "{course_id}"},  # 支持 {course_id} {course_name} {teacher_name}
+    "submit_headers": {},
+    "max_attempts": 1000,
+    "attempt_interval": 100,  # 毫秒
+    "max_concurrency": 8,  # 同时进行中的请求数上限
+    "request_timeout": 5,  # 秒
+}
+
+# 这些结果出现后该课程不再继续尝试
+FINAL_OUTCOMES = ("success", "already_selected", "not_logged_in")
+
+
+def connection_limit(courses, settings):
+    """同时进行中的请求数（也是会话连接池和预热连接的大小）"""
+    return max(1, min(len(courses), int(settings.get("max_concurrency", DEFAULT_ENGINE_SETTINGS["max_concurrency"]))))
+
+
+def build_session(cookies=(), user_agent=None, pool_size=16, headers=None):
+    """创建带连接池的 HTTP 会话
+
+    cookies: (name, value, domain, path) 元组序列，通常来自 webview 的 Cookie 存储
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    for name, value, domain, path in cookies:
+        session.cookies.set(name, value, domain=domain or "", path=path or "/")
+    if user_agent:
+        session.headers["User-Agent"] = user_agent
+    session.headers["X-Requested-With"] = "XMLHttpRequest"
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+def classify_response(status_code, text):
+    """根据 HTTP 状态码和响应内容判断选课结果"""
+    if status_code in (401, 403) or 300 <= status_code < 400:
+        return "not_logged_in"
+    if status_code == 429:
+        return "rate_limited"
+    if status_code >= 500:
+        return "error"
+    if "已选" in text:
+        return "already_selected"
+    if "已满" in text or "人数已满" in text or "余量不足" in text:
+        return "course_full"
+    if "冲突" in text:
+        return "conflict"
+    if "成功" in text:
+        return "success"
+    if "失败" in text or "错误" in text:
+        return "error"
+    return "unknown"
+
+
+@dataclass
+class SelectResult:
+    """一次选课提交的结果"""
+    outcome: str  # success / already_selected / course_full / conflict / not_logged_in / ...
+    status_code: int = 0  # 0 表示没有拿到 HTTP 响应
+    message: str = ""  # 服务器返回的提示文字
+
+    @classmethod
+    def from_response(cls, status_code, text):
+        """解析选课接口的响应，JSON 响应取其中的提示字段"""
+        message = (text or "").strip()
+        if message.startswith("{"):
+            try:
+                data = json.loads(message)
+                message = str(next((data[k] for k in ("msg", "message", "info") if data.get(k)), message))
+            except (ValueError, AttributeError):
+                pass
+        return cls(classify_response(status_code, message), status_code, message[:200])
+
+
+class GrabEngine:
+    """抢课引擎 - 每个候选组（单门课程自成一组）一个工作线程并发提交"""
+
+    def __init__(self, session, settings, on_log=None, on_attempt=None, on_first_request=None,
+                 submit_fn=None):
+        self.session = session
+        # 自定义提交函数 submit_fn(course) -> SelectResult，未提供时直接发送 HTTP 请求
+        self.submit_fn = submit_fn
+        # 直接读传入的字典（不复制），运行中热更新的 request_timeout、submit_params 等按次生效
+        self.settings = ChainMap(settings, DEFAULT_ENGINE_SETTINGS)
+        self.on_log = on_log or (lambda msg: None)
+        self.on_attempt = on_attempt or (lambda course, outcome, latency: None)
+        self.on_first_request = on_first_request or (lambda ts: None)
+        self.first_request_at = None  # 第一个请求发出时的本地时间戳
+        self.stop_event = threading.Event()
+        self.index = None  # ConflictIndex，run 时建立
+        self.workers = 0  # 本次运行的并发工作线程数（每个候选组一个）
+        self._request_slots = None  # 限制同时进行中的请求数，run 时创建
+        self.total_attempts = 0
+        self.elapsed = 0.0
+        self._count_lock = threading.Lock()
+
+    @property
+    def attempts_per_second(self):
+        return self.total_attempts / self.elapsed if self.elapsed > 0 else 0.0
+
+    def stop(self):
+        self.stop_event.set()
+
+    def submit(self, course):
+        """发送一次选课请求，返回 (SelectResult, 耗时秒)"""
+        if self.first_request_at is None:
+            with self._count_lock:
+                first = self.first_request_at is None
+                if first:
+                    self.first_request_at = time.time()
+            if first:
+                self.on_first_request(self.first_request_at)
+
+        slots = self._request_slots
+        if slots is not None:
+            slots.acquire()
+        try:
+            start = time.perf_counter()
+            result = self.submit_fn(course) if self.submit_fn else self._submit_http(course)
+        finally:
+            if slots is not None:
+                slots.release()
+        if isinstance(result, str):
+            result = SelectResult(result)
+        return result, time.perf_counter() - start
+
+    def _submit_http(self, course):
+        """直接向 submit_url 发送选课请求"""
+        fields = {
+            "course_id": course.course_id or "",
+            "course_name": course.course_name,
+            "teacher_name": course.teacher_name,
+        }
+        url = self.settings["submit_url"].format(**fields)
+        params = {k: str(v).format(**fields) for k, v in self.settings["submit_params"].items()}
+        method = self.settings["submit_method"].upper()
+
+        try:
+            response = self.session.request(
+                method, url,
+                params=params if method == "GET" else None,
+                data=params if method != "GET" else None,
+                headers=self.settings["submit_headers"] or None,
+                timeout=self.settings["request_timeout"],
+                allow_redirects=False,
+            )
+            return SelectResult.from_response(response.status_code, response.text)
+        except requests.RequestException as e:
+            return SelectResult("error", message=str(e))
+
+    def _finish_course(self, course, outcome, attempts, message=""):
+        """记录单门课程的最终结果"""
+        if outcome in ("success", "already_selected"):
+            course.status = "success"
+        elif not self.stop_event.is_set():
+            course.status = "failed"  # 手动停止时保持原状态，便于下次继续
+        self.on_log(f"{'✅' if course.status == 'success' else '❌'} {course.course_name}: {outcome}"
+                    f" (共 {attempts} 次)" + (f" - {message}" if message else ""))
+
+    def _switch_target(self, group, course, reason):
+        """按冲突索引切换到组内下一门候选课程"""
+        start = time.perf_counter()
+        course = self.index.on_failure(course)
+        elapsed_us = (time.perf_counter() - start) * 1e6
+        if course is not None:
+            self.on_log(f"↪ {reason}，切换到候选课程 {course.course_name}（决策 {elapsed_us:.1f} µs）")
+        return course
+
+    def _grab_group(self, group):
+        """一个候选组的抢课循环：抢到其中一门即结束，已满时切换到下一门不冲突的候选"""
+        max_attempts = int(self.settings["max_attempts"])
+        interval = self.settings["attempt_interval"] / 1000
+        results = {}
+        course = self.index.current(group)
+        attempt = 0
+
+        while not self.stop_event.is_set():
+            # 其他组抢到的课程可能与当前目标时间冲突，提交前先确认目标
+            current = self.index.current(group)
+            if current is not course:
+                self._finish_course(course, "conflict", attempt)
+                results[course.course_name] = "conflict"
+                if current is not None:
+                    self.on_log(f"↪ {course.course_name} 与已抢到课程冲突，切换到 {current.course_name}")
+                course, attempt = current, 0
+            if course is None:
+                break
+
+            result, latency = self.submit(course)
+            outcome = result.outcome
+            attempt += 1
+            with self._count_lock:
+                self.total_attempts += 1
+            self.on_attempt(course, outcome, latency)
+
+            if outcome in FINAL_OUTCOMES:
+                if outcome != "not_logged_in":
+                    changed = self.index.on_success(course)
+                    if changed:
+                        self.on_log(f"🗓 {course.course_name} 占用的时间使 {len(changed)} 个候选组切换了目标")
+                self._finish_course(course, outcome, attempt, result.message)
+                results[course.course_name] = outcome
+                break
+
+            switch = outcome in ("course_full", "conflict") and self.index.has_alternative(group)
+            if switch or attempt >= max_attempts:
+                if not switch:
+                    self.on_log(f"⚠️ {course.course_name} 已达到最大尝试次数 ({max_attempts})")
+                self._finish_course(course, outcome, attempt, result.message)
+                results[course.course_name] = outcome
+                course = self._switch_target(group, course, f"{course.course_name} {outcome}")
+                attempt = 0
+                continue
+
+            # 被限流时退避，避免被封
+            self.stop_event.wait(interval * 5 if outcome == "rate_limited" else interval)
+
+        return results
+
+    def run(self, courses):
+        """按候选组并发抢课，返回 {课程名: 最终结果}"""
+        if not self.settings["submit_url"] and not self.submit_fn:
+            raise ValueError("未配置 submit_url，无法直接提交选课请求")
+
+        self.total_attempts = 0
+        self.first_request_at = None
+        # 开抢前一次性建立冲突索引，已成功的课程（恢复运行时）先占用时间
+        self.index = ConflictIndex(courses)
+        for course in courses:
+            if course.status == "success":
+                self.index.on_success(course)
+        groups = [g for g in self.index.groups if self.index.current(g) is not None]
+        # 每个候选组一个线程同时开抢；max_concurrency 只限制同时进行中的请求数
+        self.workers = max(1, len(groups))
+        self._request_slots = threading.BoundedSemaphore(connection_limit(courses, self.settings))
+
+        start = time.perf_counter()
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="grab") as pool:
+            for group_results in pool.map(self._grab_group, groups):
+                results.update(group_results)
+        self.elapsed = time.perf_counter() - start
+
+        self.on_log(f"📊 共尝试 {self.total_attempts} 次，用时 {self.elapsed:.2f}s，"
+                    f"{self.attempts_per_second:.1f} 次/秒")
+        return results
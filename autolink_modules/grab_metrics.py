@@ -0,0 +1,220 @@
+"""
+抢课运行指标 - 用数据调优并发数和尝试间隔
+
+功能：
+- 每门课程的尝试次数和结果分布
+- 请求耗时直方图（全局和按课程）
+- 首次成功耗时、实际每秒尝试次数与按 attempt_interval 计算的目标速率对比
+- 导出为 JSON 或 Prometheus 文本格式
+
+本模块不依赖 Qt，可在抢课引擎的工作线程中直接记录。
+"""
+from pathlib import Path
+import bisect
+import json
+import threading
+import time
+
+# 耗时直方图桶上限（毫秒），最后一个桶为 +Inf
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class _Histogram:
+    """累计直方图"""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value_ms):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, value_ms)] += 1
+        self.total += value_ms
+        self.count += 1
+
+    def quantile(self, q):
+        """按桶估计分位数（取桶上限）"""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, n in zip(LATENCY_BUCKETS_MS, self.counts):
+            seen += n
+            if seen >= rank:
+                return float(bound)
+        return float("inf")
+
+    def to_dict(self):
+        return {
+            "buckets": dict(zip([str(b) for b in LATENCY_BUCKETS_MS] + ["+Inf"], self.counts)),
+            "count": self.count,
+            "sum_ms": round(self.total, 3),
+            "avg_ms": round(self.total / self.count, 3) if self.count else 0.0,
+            "p50_ms": self.quantile(0.5),
+            "p90_ms": self.quantile(0.9),
+            "p99_ms": self.quantile(0.99),
+        }
+
+
+class _CourseStats:
+    def __init__(self):
+        self.outcomes = {}
+        self.latency = _Histogram()
+        self.first_at = None
+        self.last_at = None
+
+
+class GrabMetrics:
+    """一次抢课运行的指标（线程安全）"""
+
+    def __init__(self, attempt_interval_ms=100, workers=1):
+        self.attempt_interval_ms = attempt_interval_ms
+        self.workers = workers  # 并发工作线程数（候选组数）
+        self._lock = threading.Lock()
+        self._courses = {}
+        self.latency = _Histogram()
+        self.outcomes = {}
+        self.started_at = None
+        self.finished_at = None
+        self.first_success_at = None
+
+    def start(self, workers=None):
+        """记录开始时间（开抢时调用，不含定时等待）"""
+        with self._lock:
+            if workers is not None:
+                self.workers = workers
+            self.started_at = time.perf_counter()
+
+    def finish(self):
+        with self._lock:
+            self.finished_at = time.perf_counter()
+
+    def record(self, course_name, outcome, latency):
+        """记录一次尝试（latency 单位为秒）"""
+        now = time.perf_counter()
+        latency_ms = latency * 1000
+        with self._lock:
+            if self.started_at is None:
+                self.started_at = now - latency
+            stats = self._courses.get(course_name)
+            if stats is None:
+                stats = self._courses[course_name] = _CourseStats()
+                stats.first_at = now - latency
+            stats.last_at = now
+            stats.outcomes[outcome] = stats.outcomes.get(outcome, 0) + 1
+            stats.latency.observe(latency_ms)
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+            self.latency.observe(latency_ms)
+            if outcome in ("success", "already_selected") and self.first_success_at is None:
+                self.first_success_at = now
+
+    # ---------- 导出 ----------
+
+    def snapshot(self):
+        """返回可 JSON 序列化的指标字典"""
+        with self._lock:
+            end = self.finished_at or time.perf_counter()
+            elapsed = end - self.started_at if self.started_at is not None else 0.0
+            attempts = self.latency.count
+            target_rate = self.workers * 1000 / self.attempt_interval_ms if self.attempt_interval_ms > 0 else 0.0
+            achieved_rate = attempts / elapsed if elapsed > 0 else 0.0
+            courses = {}
+            for name, stats in self._courses.items():
+                active = stats.last_at - stats.first_at
+                count = stats.latency.count
+                courses[name] = {
+                    "attempts": count,
+                    "outcomes": dict(stats.outcomes),
+                    "attempts_per_second": round(count / active, 3) if active > 0 else 0.0,
+                    "latency": stats.latency.to_dict(),
+                }
+            return {
+                "elapsed_s": round(elapsed, 3),
+                "attempts": attempts,
+                "outcomes": dict(self.outcomes),
+                "time_to_first_success_ms": (
+                    round((self.first_success_at - self.started_at) * 1000, 1)
+                    if self.first_success_at is not None else None
+                ),
+                "attempt_interval_ms": self.attempt_interval_ms,
+                "workers": self.workers,
+                "target_attempts_per_second": round(target_rate, 3),
+                "achieved_attempts_per_second": round(achieved_rate, 3),
+                "rate_ratio": round(achieved_rate / target_rate, 3) if target_rate else None,
+                "latency": self.latency.to_dict(),
+                "courses": courses,
+            }
+
+    def to_json(self, **extra):
+        return json.dumps({**extra, **self.snapshot()}, ensure_ascii=False, indent=2)
+
+    def to_prometheus(self, prefix="autolink_grab", labels=None):
+        """导出为 Prometheus 文本格式（可写入 node_exporter 的 textfile 目录）"""
+        data = self.snapshot()
+        base = dict(labels or {})
+        lines = []
+
+        def fmt_labels(extra=None):
+            merged = {**base, **(extra or {})}
+            if not merged:
+                return ""
+            body = ",".join(
+                '%s="%s"' % (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+                for k, v in merged.items()
+            )
+            return "{" + body + "}"
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for suffix, extra, value in samples:
+                lines.append(f"{prefix}_{name}{suffix}{fmt_labels(extra)} {value}")
+
+        metric("attempts_total", "counter", "Selection attempts by course and outcome", [
+            ("", {"course": name, "outcome": outcome}, count)
+            for name, stats in data["courses"].items()
+            for outcome, count in stats["outcomes"].items()
+        ])
+
+        # Prometheus 直方图以秒为单位，桶计数为累计值
+        bounds = [str(b / 1000) for b in LATENCY_BUCKETS_MS] + ["+Inf"]
+        samples = []
+        for name, stats in data["courses"].items():
+            hist = stats["latency"]
+            cumulative = 0
+            for bound, count in zip(bounds, hist["buckets"].values()):
+                cumulative += count
+                samples.append(("_bucket", {"course": name, "le": bound}, cumulative))
+            samples.append(("_sum", {"course": name}, round(hist["sum_ms"] / 1000, 6)))
+            samples.append(("_count", {"course": name}, hist["count"]))
+        metric("request_latency_seconds", "histogram", "Selection request latency", samples)
+
+        metric("elapsed_seconds", "gauge", "Duration of the grab run", [("", None, data["elapsed_s"])])
+        metric("attempts_per_second", "gauge", "Achieved attempt rate",
+               [("", None, data["achieved_attempts_per_second"])])
+        metric("target_attempts_per_second", "gauge", "Attempt rate implied by attempt_interval",
+               [("", None, data["target_attempts_per_second"])])
+        if data["time_to_first_success_ms"] is not None:
+            metric("time_to_first_success_seconds", "gauge", "Time from start to first success",
+                   [("", None, data["time_to_first_success_ms"] / 1000)])
+        return "\n".join(lines) + "\n"
+
+    def export(self, directory, name, **extra):
+        """把 JSON 和 Prometheus 文本写到目录，返回两个文件路径"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        json_path = directory / f"{name}.json"
+        prom_path = directory / f"{name}.prom"
+        json_path.write_text(self.to_json(**extra), encoding="utf-8")
+        prom_path.write_text(self.to_prometheus(), encoding="utf-8")
+        return json_path, prom_path
+
+    def summary(self):
+        """一行摘要，用于日志"""
+        data = self.snapshot()
+        ttfs = data["time_to_first_success_ms"]
+        return (
+            f"尝试 {data['attempts']} 次，实际 {data['achieved_attempts_per_second']:.1f} 次/秒"
+            f"（目标 {data['target_attempts_per_second']:.1f}），"
+            f"耗时 p50/p90 {data['latency']['p50_ms']:.0f}/{data['latency']['p90_ms']:.0f} ms，"
+            f"首次成功 {f'{ttfs:.0f} ms' if ttfs is not None else '无'}，结果 {data['outcomes']}"
+        )
@@ -0,0 +1,135 @@
+"""
+定时抢课调度 - 与选课服务器时钟同步的精确启动
+
+功能：
+- 多次读取 HTTP Date 头并结合往返时延 (RTT) 估计服务器时钟偏移
+- 先粗略睡眠，最后几十毫秒忙等，避免 QTimer 长延时的误差
+- 触发前预热连接池，第一批请求无需再建立 TCP/TLS 连接
+"""
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+import math
+import time
+
+import requests
+
+
+@dataclass
+class ClockSync:
+    """服务器时钟同步结果（秒）"""
+    offset: float  # 服务器时间 - 本地时间
+    uncertainty: float  # 偏移估计的误差范围（±），未校时为 inf
+    rtt: float  # 最小往返时延
+    samples: int
+
+    @classmethod
+    def unsynced(cls):
+        """校时失败时使用本地时钟"""
+        return cls(offset=0.0, uncertainty=math.inf, rtt=0.0, samples=0)
+
+    @property
+    def synced(self):
+        return math.isfinite(self.uncertainty)
+
+    def to_local(self, server_ts):
+        """把服务器时间戳换算为本地时间戳"""
+        return server_ts - self.offset
+
+
+def origin_of(url):
+    """返回 URL 的 scheme://host[:port]/"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}/"
+
+
+def estimate_server_offset(session, url, samples=8, timeout=3, stop_event=None):
+    """用 Date 头估计服务器时钟偏移
+
+    Date 头只精确到秒：若请求在本地 [t0, t1] 内完成且服务器返回 D，
+    则偏移一定落在 [D - t1, D + 1 - t0]。对多次采样取交集，并把后续采样
+    安排在预测的整秒边界附近，使区间快速收窄到约 RTT/2。
+    """
+    lower, upper = -math.inf, math.inf
+    min_rtt = math.inf
+    count = 0
+
+    for i in range(samples):
+        if stop_event is not None and stop_event.is_set():
+            break
+        t0 = time.time()
+        try:
+            response = session.head(url, timeout=timeout, allow_redirects=False)
+        except requests.RequestException:
+            continue
+        t1 = time.time()
+        date_header = response.headers.get("Date")
+        if not date_header:
+            continue
+
+        server_ts = parsedate_to_datetime(date_header).timestamp()
+        lower = max(lower, server_ts - t1)
+        upper = min(upper, server_ts + 1 - t0)
+        min_rtt = min(min_rtt, t1 - t0)
+        count += 1
+
+        if lower > upper:
+            # 服务器时间在采样过程中跳变，重新开始
+            lower, upper = server_ts - t1, server_ts + 1 - t0
+
+        if i == samples - 1:
+            break
+        # 让下一次请求的中点落在按当前估计预测的服务器整秒边界上
+        offset = (lower + upper) / 2
+        now = time.time()
+        next_boundary = math.ceil(now + offset) - offset
+        delay = next_boundary - now - min_rtt / 2
+        if delay < 0:
+            delay += 1
+        if stop_event is None:
+            time.sleep(delay)
+        elif stop_event.wait(delay):
+            break
+
+    if count == 0:
+        raise RuntimeError(f"无法从 {url} 获取服务器时间")
+    return ClockSync(offset=(lower + upper) / 2, uncertainty=(upper - lower) / 2,
+                     rtt=min_rtt, samples=count)
+
+
+def prewarm_connections(session, url, count=4, timeout=3):
+    """并发发送 HEAD 请求，让连接池中保持 count 条已建立的连接"""
+    def touch(_):
+        try:
+            session.head(url, timeout=timeout, allow_redirects=False)
+        except requests.RequestException:
+            pass
+
+    with ThreadPoolExecutor(max_workers=count) as pool:
+        list(pool.map(touch, range(count)))
+
+
+def wait_until(target_local_ts, stop_event, prewarm=None, prewarm_lead=2.0, spin_window=0.02):
+    """等待到本地时间 target_local_ts
+
+    粗等待使用 Event.wait（可被 stop_event 打断），距目标 prewarm_lead 秒时
+    调用 prewarm（开始等待时已不足 prewarm_lead 秒则立即预热），最后
+    spin_window 秒忙等以获得毫秒级精度。
+    返回实际触发的本地时间，被取消时返回 None。
+    """
+    remaining = target_local_ts - time.time()
+    if prewarm is not None and remaining > prewarm_lead:
+        if stop_event.wait(remaining - prewarm_lead):
+            return None
+        prewarm()
+    elif prewarm is not None and remaining > 0:
+        prewarm()  # 定时较晚（如校时耗时较长），仍预热，避免第一批请求建立连接
+
+    remaining = target_local_ts - time.time()
+    if remaining > spin_window and stop_event.wait(remaining - spin_window):
+        return None
+
+    while time.time() < target_local_ts:
+        pass
+    return time.time()
@@ -0,0 +1,228 @@
+"""
+抢课数据存储 - SQLite (WAL) 持久化课程目标和每次尝试结果
+
+功能：
+- 课程按条目增删改，不再整体重写配置文件
+- 课程以 course_key 区分（有课程ID时为课程ID，否则为“课程名|教师名”），同名不同教师的课程各占一行
+- 抢课过程中的状态和尝试结果由后台写线程批量提交，不阻塞抢课循环
+- 每批写入在一个事务中完成，崩溃后数据库保持一致，可据此恢复抢课进度
+
+数据库默认在 scripts/course_grabber_config.db（与设置文件 course_grabber_config.json 同名）。
+"""
+from pathlib import Path
+import json
+import queue
+import sqlite3
+import threading
+import time
+
+from autolink_modules.course_conflicts import course_key
+
+_COURSES_TABLE = """
+CREATE TABLE IF NOT EXISTS courses (
+    course_key TEXT PRIMARY KEY,
+    course_name TEXT NOT NULL,
+    course_id TEXT,
+    teacher_name TEXT NOT NULL DEFAULT '',
+    priority INTEGER NOT NULL DEFAULT 1,
+    start_time TEXT,
+    notes TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL DEFAULT 'pending',
+    time_slots TEXT NOT NULL DEFAULT '[]',
+    alt_group TEXT NOT NULL DEFAULT '',
+    position INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+"""
+
+_SCHEMA = _COURSES_TABLE + """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS attempts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id INTEGER,
+    course_name TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    latency_ms REAL NOT NULL,
+    ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_attempts_run ON attempts(run_id, course_name);
+"""
+
+_UPSERT_COURSE = """
+INSERT INTO courses (course_key, course_name, course_id, teacher_name, priority, start_time, notes,
+                     status, time_slots, alt_group, position, updated_at)
+VALUES (:course_key, :course_name, :course_id, :teacher_name, :priority, :start_time, :notes, :status,
+        :time_slots, :alt_group, COALESCE((SELECT position FROM courses WHERE course_key = :course_key),
+                 (SELECT COALESCE(MAX(position), 0) + 1 FROM courses)), :updated_at)
+ON CONFLICT(course_key) DO UPDATE SET
+    course_name = excluded.course_name, course_id = excluded.course_id, teacher_name = excluded.teacher_name,
+    priority = excluded.priority, start_time = excluded.start_time, notes = excluded.notes,
+    status = excluded.status, time_slots = excluded.time_slots, alt_group = excluded.alt_group,
+    updated_at = excluded.updated_at
+"""
+
+# 旧版本数据库缺少的列
+_MIGRATIONS = {
+    "time_slots": "ALTER TABLE courses ADD COLUMN time_slots TEXT NOT NULL DEFAULT '[]'",
+    "alt_group": "ALTER TABLE courses ADD COLUMN alt_group TEXT NOT NULL DEFAULT ''",
+}
+
+# 旧版本以课程名为主键，重建表并按 course_key 迁移（与 course_conflicts.course_key 一致）
+_MIGRATE_COURSE_KEY = """
+ALTER TABLE courses RENAME TO courses_old;
+""" + _COURSES_TABLE + """
+INSERT OR REPLACE INTO courses (course_key, course_name, course_id, teacher_name, priority, start_time,
+                                notes, status, time_slots, alt_group, position, updated_at)
+SELECT COALESCE(NULLIF(course_id, ''), course_name || '|' || teacher_name), course_name, course_id,
+       teacher_name, priority, start_time, notes, status, time_slots, alt_group, position, updated_at
+FROM courses_old ORDER BY position;
+DROP TABLE courses_old;
+"""
+
+
+def _connect(path):
+    conn = sqlite3.connect(str(path), check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")  # WAL 模式下仍保证崩溃一致性
+    return conn
+
+
+class GrabStore:
+    """抢课数据存储，写操作全部交给后台写线程"""
+
+    def __init__(self, db_path=None, batch_size=500):
+        self.db_path = Path(db_path) if db_path else Path.cwd() / "scripts" / "course_grabber_config.db"
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self._read_conn = _connect(self.db_path)
+        self._read_conn.executescript(_SCHEMA)
+        columns = {row[1] for row in self._read_conn.execute("PRAGMA table_info(courses)")}
+        for column, sql in _MIGRATIONS.items():
+            if column not in columns:
+                self._read_conn.execute(sql)
+        self._read_conn.commit()
+        if "course_key" not in columns:
+            self._read_conn.executescript(_MIGRATE_COURSE_KEY)
+        self._read_lock = threading.Lock()
+        self._queue = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._write_loop, name="grab-store", daemon=True)
+        self._writer.start()
+
+    # ---------- 后台写线程 ----------
+
+    def _write_loop(self):
+        conn = _connect(self.db_path)
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            # 把已排队的写操作合并到同一个事务
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            waiters, closing = [], False
+            with conn:
+                for entry in batch:
+                    if entry is None:
+                        closing = True
+                    elif isinstance(entry, threading.Event):
+                        waiters.append(entry)
+                    else:
+                        try:
+                            conn.execute(*entry)
+                        except sqlite3.Error as e:
+                            # 单条失败不影响同批次其他写入
+                            print(f"写入抢课数据失败: {e}")
+            for event in waiters:
+                event.set()
+            if closing:
+                conn.close()
+                return
+
+    def _submit(self, sql, params=()):
+        self._queue.put((sql, params))
+
+    def flush(self, timeout=None):
+        """等待此前提交的写操作全部落盘"""
+        event = threading.Event()
+        self._queue.put(event)
+        return event.wait(timeout)
+
+    def close(self):
+        self._queue.put(None)
+        self._writer.join()
+        self._read_conn.close()
+
+    # ---------- 课程 ----------
+
+    def upsert_course(self, course):
+        """新增或更新一门课程"""
+        data = course.to_dict()
+        data["course_key"] = course_key(course)
+        data["time_slots"] = json.dumps(data["time_slots"])
+        data["updated_at"] = time.time()
+        self._submit(_UPSERT_COURSE, data)
+
+    def delete_course(self, key):
+        self._submit("DELETE FROM courses WHERE course_key = ?", (key,))
+
+    def update_status(self, key, status):
+        """更新课程状态（key 为 course_key，抢课过程中调用，不阻塞）"""
+        self._submit("UPDATE courses SET status = ?, updated_at = ? WHERE course_key = ?",
+                     (status, time.time(), key))
+
+    def load_courses(self):
+        """按添加顺序读取所有课程，返回字典列表（格式同 CourseConfig.to_dict）"""
+        self.flush()
+        with self._read_lock:
+            cursor = self._read_conn.execute(
+                "SELECT course_id, course_name, teacher_name, priority, start_time, notes, status, "
+                "time_slots, alt_group FROM courses ORDER BY position"
+            )
+            columns = [c[0] for c in cursor.description]
+            courses = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        for course in courses:
+            course["time_slots"] = json.loads(course["time_slots"])
+        return courses
+
+    def is_empty(self):
+        with self._read_lock:
+            return self._read_conn.execute("SELECT COUNT(*) FROM courses").fetchone()[0] == 0
+
+    # ---------- 抢课记录 ----------
+
+    def start_run(self):
+        """记录一次抢课开始，返回 run_id（同步写入）"""
+        self.flush()
+        with self._read_lock, self._read_conn:
+            cursor = self._read_conn.execute("INSERT INTO runs (started_at) VALUES (?)", (time.time(),))
+            return cursor.lastrowid
+
+    def finish_run(self, run_id):
+        self._submit("UPDATE runs SET finished_at = ? WHERE id = ?", (time.time(), run_id))
+
+    def record_attempt(self, run_id, course_name, outcome, latency):
+        """记录一次尝试结果（latency 单位为秒，不阻塞）"""
+        self._submit(
+            "INSERT INTO attempts (run_id, course_name, outcome, latency_ms, ts) VALUES (?, ?, ?, ?, ?)",
+            (run_id, course_name, outcome, latency * 1000, time.time())
+        )
+
+    def attempt_summary(self, run_id):
+        """统计某次抢课每门课程的尝试次数和结果分布"""
+        self.flush()
+        with self._read_lock:
+            rows = self._read_conn.execute(
+                "SELECT course_name, outcome, COUNT(*) FROM attempts WHERE run_id = ? "
+                "GROUP BY course_name, outcome", (run_id,)
+            ).fetchall()
+        summary = {}
+        for course_name, outcome, count in rows:
+            summary.setdefault(course_name, {})[outcome] = count
+        return summary
@@ -1,259 +1,397 @@
 """
 HTML 录制器 - 用于录制选课操作和保存页面 HTML
+
+页面 HTML 存入 SnapshotStore（recorded_sessions/snapshots），按内容去重并压缩。
+录制操作时同时用 DomRecorder 记录页面 DOM 变更（recorded_sessions/dom）。
+用户操作在页面内有界缓冲，每秒取回一批追加到 actions_*.jsonl。
 """
-from PyQt5.QtCore import QObject, pyqtSignal, QDateTime
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal, QDateTime
+from dataclasses import asdict
 from pathlib import Path
 import json
+import threading
+
+from autolink_modules.dom_recorder import DomRecorder
+from autolink_modules.selector_engine import rank_actions, selectors_by_role
+from autolink_modules.session_index import SessionIndex
+from autolink_modules.snapshot_store import SnapshotStore
+
+
+# 页面端操作监听：有界缓冲（溢出时丢弃最早的操作并计数），元素的选择器和 XPath
+# 用 WeakMap 缓存；页面卸载前把未取回的操作暂存到 sessionStorage，跳转后继续。
+ACTION_MONITOR_JS = """
+(function() {
+    if (window.__actionRecorder) return 'already_recording';
+    var MAX_BUFFER = 2000;
+    var STORAGE_KEY = '__autolinkPendingActions';
+    var buffer = [], dropped = 0;
+    var memo = new WeakMap();  // 元素 -> {xpath, selector}
+
+    try {
+        var saved = JSON.parse(sessionStorage.getItem(STORAGE_KEY) || 'null');
+        if (saved) {
+            buffer = saved.actions || [];
+            dropped = saved.dropped || 0;
+        }
+        sessionStorage.removeItem(STORAGE_KEY);
+    } catch (e) {}
+
+    function push(action) {
+        var last = buffer[buffer.length - 1];
+        // 连续输入同一元素只保留最后一次
+        if (action.type === 'input' && last && last.type === 'input' && last.xpath === action.xpath) {
+            buffer[buffer.length - 1] = action;
+            return;
+        }
+        if (buffer.length >= MAX_BUFFER) {
+            buffer.shift();
+            dropped++;
+        }
+        buffer.push(action);
+    }
+
+    // 获取元素的 XPath
+    function getXPath(element) {
+        var parts = [];
+        for (var el = element; el && el.nodeType === 1; el = el.parentNode) {
+            if (el.id) {
+                parts.unshift('//*[@id="' + el.id + '"]');
+                return parts.join('/');
+            }
+            if (el === document.body) {
+                parts.unshift('/html/body');
+                return parts.join('/');
+            }
+            var ix = 1;
+            for (var s = el.previousElementSibling; s; s = s.previousElementSibling) {
+                if (s.tagName === el.tagName) ix++;
+            }
+            parts.unshift(el.tagName.toLowerCase() + '[' + ix + ']');
+        }
+        return '/' + parts.join('/');
+    }
+
+    // 获取唯一的 CSS 选择器
+    function getUniqueSelector(element) {
+        if (element.id) {
+            return '#' + element.id;
+        }
+        var path = [];
+        while (element && element.nodeType === Node.ELEMENT_NODE) {
+            var selector = element.nodeName.toLowerCase();
+            if (typeof element.className === 'string' && element.className.trim()) {
+                selector += '.' + element.className.trim().replace(/\\s+/g, '.');
+            }
+            path.unshift(selector);
+            element = element.parentNode;
+            if (path.length > 5) break;  // 限制深度
+        }
+        return path.join(' > ');
+    }
+
+    function locate(target) {
+        var loc = memo.get(target);
+        if (!loc) {
+            loc = {xpath: getXPath(target), selector: getUniqueSelector(target)};
+            memo.set(target, loc);
+        }
+        return loc;
+    }
+
+    function describe(type, target) {
+        var loc = locate(target);
+        return {
+            type: type,
+            timestamp: new Date().toISOString(),
+            url: location.href,
+            tagName: target.tagName,
+            className: typeof target.className === 'string' ? target.className : '',
+            id: target.id,
+            xpath: loc.xpath,
+            selector: loc.selector
+        };
+    }
+
+    function onClick(e) {
+        var action = describe('click', e.target);
+        action.innerText = e.target.innerText ? e.target.innerText.substring(0, 50) : '';
+        push(action);
+    }
+
+    function onInput(e) {
+        var action = describe('input', e.target);
+        action.name = e.target.name;
+        action.value = String(e.target.value || '').substring(0, 20) + '...';  // 不记录完整密码
+        push(action);
+    }
+
+    function onPageHide() {
+        try {
+            sessionStorage.setItem(STORAGE_KEY, JSON.stringify({actions: buffer, dropped: dropped}));
+        } catch (e) {}
+    }
+
+    document.addEventListener('click', onClick, true);
+    document.addEventListener('input', onInput, true);
+    window.addEventListener('pagehide', onPageHide);
+
+    window.__actionRecorder = {
+        drain: function() {
+            var out = JSON.stringify({actions: buffer, dropped: dropped});
+            buffer = [];
+            dropped = 0;
+            return out;
+        },
+        stop: function() {
+            document.removeEventListener('click', onClick, true);
+            document.removeEventListener('input', onInput, true);
+            window.removeEventListener('pagehide', onPageHide);
+            var out = window.__actionRecorder.drain();
+            delete window.__actionRecorder;
+            return out;
+        }
+    };
+    return 'recording_started';
+})();
+"""
+
+_DRAIN_ACTIONS_JS = "window.__actionRecorder ? window.__actionRecorder.drain() : null;"
+_STOP_ACTIONS_JS = "window.__actionRecorder ? window.__actionRecorder.stop() : null;"
 
 
 class HTMLRecorder(QObject):
     """HTML 录制器 - 保存页面 HTML 和用户操作"""
     
     log_message = pyqtSignal(str)
+    # 录制结束后识别出的选课脚本选择器 {角色: 选择器}，由界面确认后才写入配置
+    selectors_suggested = pyqtSignal(dict)
+    _snapshot_finished = pyqtSignal(object, bool, str)  # 回调, 是否成功, 快照 ID 或错误信息（后台线程发出）
     
     def __init__(self, webview):
         super().__init__()
         self.webview = webview
         self.recording = False
-        self.actions = []  # 记录用户操作
+        self.actions_file = None  # 本次录制的操作记录（JSON Lines，边录边写）
+        self.actions_timestamp = ""
+        self.action_count = 0
+        self.dropped_actions = 0
+        self._drain_timer = QTimer(self)
+        self._drain_timer.setInterval(1000)
+        self._drain_timer.timeout.connect(self._drain_actions)
         self.output_dir = Path.cwd() / "recorded_sessions"
         self.output_dir.mkdir(exist_ok=True)
+        self.snapshots = SnapshotStore(self.output_dir / "snapshots")
+        self._snapshot_finished.connect(self._on_snapshot_finished)
+        self.dom_recorder = DomRecorder(webview, self.output_dir / "dom")
+        self.dom_recorder.log_message.connect(self.log_message)
         
     def save_current_html(self, callback=None):
-        """保存当前页面的 HTML"""
-        def on_html_received(html):
-            timestamp = QDateTime.currentDateTime().toString("yyyyMMdd_HHmmss")
-            filename = self.output_dir / f"page_{timestamp}.html"
-            
+        """保存当前页面的 HTML（按内容去重压缩存入快照库，回调参数为快照 ID）
+
+        哈希和压缩在后台线程中进行，回调通过信号回到 GUI 线程调用。
+        """
+        url = self.webview.url().toString()
+        title = self.webview.title()
+
+        def store(html):
             try:
-                with open(filename, 'w', encoding='utf-8') as f:
-                    f.write(html)
-                
-                # 同时保存一份带注释的版本，方便分析
-                annotated_filename = self.output_dir / f"page_{timestamp}_annotated.html"
-                annotated_html = self._add_annotations(html)
-                with open(annotated_filename, 'w', encoding='utf-8') as f:
-                    f.write(annotated_html)
-                
-                self.log_message.emit(f"✅ 已保存页面 HTML: {filename.name}")
-                self.log_message.emit(f"📝 带注释版本: {annotated_filename.name}")
-                
-                if callback:
-                    callback(True, str(filename))
-                    
+                entry = self.snapshots.put(html, url=url, title=title)
+                if entry.stored_size:
+                    self.log_message.emit(
+                        f"✅ 已保存页面快照: {entry.id}（{entry.size / 1024:.0f} KB → "
+                        f"{entry.stored_size / 1024:.0f} KB）"
+                    )
+                else:
+                    self.log_message.emit(f"✅ 已保存页面快照: {entry.id}（内容与之前的快照相同，未重复存储）")
+                self.log_message.emit(f"📁 快照文件: {self.snapshots.object_path(entry)}")
+                self._snapshot_finished.emit(callback, True, entry.id)
+
             except Exception as e:
                 self.log_message.emit(f"❌ 保存 HTML 失败: {e}")
-                if callback:
-                    callback(False, str(e))
-        
+                self._snapshot_finished.emit(callback, False, str(e))
+
+        def on_html_received(html):
+            threading.Thread(target=store, args=(html,), daemon=True).start()
+
         self.webview.page().toHtml(on_html_received)
-    
-    def _add_annotations(self, html):
-        """添加注释标记常见的选课元素"""
-        annotations = """
-<!-- ============================================ -->
-<!-- 自动生成的注释 - 帮助识别选课关键元素 -->
-<!-- ============================================ -->
-<!--
-常见选择器模式：
-1. 课程列表容器: table, .course-list, #courseTable
-2. 课程行: tr, .course-row, .course-item
-3. 选课按钮: .btn-select, .select-btn, button[onclick*="select"]
-4. 确认按钮: .confirm, .btn-ok, #confirmBtn
-5. 课程ID: [data-course-id], .course-id
-6. 课程名称: .course-name, .title
-7. 教师名称: .teacher, .teacher-name
-8. 剩余名额: .remain, .quota
-
-请在下面的 HTML 中查找这些元素！
--->
-<!-- ============================================ -->
 
-"""
-        return annotations + html
-    
+    def _on_snapshot_finished(self, callback, ok, result):
+        if callback:
+            callback(ok, result)
+
     def start_recording_actions(self):
-        """开始录制用户操作"""
+        """开始录制用户操作（操作按批取回，实时追加到 actions_*.jsonl）"""
+        if self.recording:
+            return
         self.recording = True
-        self.actions = []
-        
-        # 注入监听脚本
-        monitor_js = """
-        (function() {
-            window.recordedActions = [];
-            
-            // 监听所有点击事件
-            document.addEventListener('click', function(e) {
-                const target = e.target;
-                const action = {
-                    type: 'click',
-                    timestamp: new Date().toISOString(),
-                    tagName: target.tagName,
-                    className: target.className,
-                    id: target.id,
-                    innerText: target.innerText ? target.innerText.substring(0, 50) : '',
-                    xpath: getXPath(target),
-                    selector: getUniqueSelector(target)
-                };
-                window.recordedActions.push(action);
-                console.log('🎬 录制点击:', action);
-            }, true);
-            
-            // 监听输入事件
-            document.addEventListener('input', function(e) {
-                const target = e.target;
-                const action = {
-                    type: 'input',
-                    timestamp: new Date().toISOString(),
-                    tagName: target.tagName,
-                    className: target.className,
-                    id: target.id,
-                    name: target.name,
-                    value: target.value.substring(0, 20) + '...',  // 不记录完整密码
-                    xpath: getXPath(target),
-                    selector: getUniqueSelector(target)
-                };
-                window.recordedActions.push(action);
-                console.log('⌨️ 录制输入:', action);
-            }, true);
-            
-            // 获取元素的 XPath
-            function getXPath(element) {
-                if (element.id) {
-                    return '//*[@id="' + element.id + '"]';
-                }
-                if (element === document.body) {
-                    return '/html/body';
-                }
-                let ix = 0;
-                const siblings = element.parentNode.childNodes;
-                for (let i = 0; i < siblings.length; i++) {
-                    const sibling = siblings[i];
-                    if (sibling === element) {
-                        return getXPath(element.parentNode) + '/' + element.tagName.toLowerCase() + '[' + (ix + 1) + ']';
-                    }
-                    if (sibling.nodeType === 1 && sibling.tagName === element.tagName) {
-                        ix++;
-                    }
-                }
-            }
-            
-            // 获取唯一的 CSS 选择器
-            function getUniqueSelector(element) {
-                if (element.id) {
-                    return '#' + element.id;
-                }
-                
-                let path = [];
-                while (element.nodeType === Node.ELEMENT_NODE) {
-                    let selector = element.nodeName.toLowerCase();
-                    if (element.className) {
-                        selector += '.' + element.className.trim().replace(/\\s+/g, '.');
-                    }
-                    path.unshift(selector);
-                    element = element.parentNode;
-                    if (path.length > 5) break;  // 限制深度
-                }
-                return path.join(' > ');
-            }
-            
-            console.log('🎬 操作录制已启动！');
-            return 'recording_started';
-        })();
-        """
-        
-        self.webview.page().runJavaScript(monitor_js)
+        self.action_count = 0
+        self.dropped_actions = 0
+        self.actions_timestamp = QDateTime.currentDateTime().toString("yyyyMMdd_HHmmss_zzz")
+        self.actions_file = self.output_dir / f"actions_{self.actions_timestamp}.jsonl"
+        # 页面跳转后重新注入，上一页未取回的操作由 sessionStorage 带过来
+        self.webview.loadFinished.connect(self._on_recording_page_loaded)
+        self.webview.page().runJavaScript(ACTION_MONITOR_JS)
+        self._drain_timer.start()
         self.log_message.emit("🎬 已启动操作录制（点击和输入将被记录）")
-    
+
+    def _on_recording_page_loaded(self, ok):
+        if ok and self.recording:
+            self.webview.page().runJavaScript(ACTION_MONITOR_JS)
+
+    def _drain_actions(self, final=False):
+        """取回页面中缓冲的操作；final 为 True 时同时卸载页面端监听"""
+        script = _STOP_ACTIONS_JS if final else _DRAIN_ACTIONS_JS
+
+        def on_drained(data):
+            self._append_actions(data)
+            if final:
+                self._finish_actions()
+
+        self.webview.page().runJavaScript(script, on_drained)
+
+    def _append_actions(self, data):
+        if not data:
+            return
+        try:
+            batch = json.loads(data)
+            actions = batch.get("actions", [])
+            self.dropped_actions += batch.get("dropped", 0)
+            if actions:
+                with open(self.actions_file, 'a', encoding='utf-8') as f:
+                    for action in actions:
+                        f.write(json.dumps(action, ensure_ascii=False) + "\n")
+                self.action_count += len(actions)
+        except (ValueError, OSError) as e:
+            self.log_message.emit(f"❌ 保存操作记录失败: {e}")
+
     def stop_recording_and_save(self):
-        """停止录制并保存操作记录"""
+        """停止录制，取回剩余操作并生成摘要"""
         if not self.recording:
             self.log_message.emit("⚠️ 未在录制中")
             return
         
         self.recording = False
-        
-        # 获取录制的操作
-        get_actions_js = "JSON.stringify(window.recordedActions || []);"
-        
-        def on_actions_received(actions_json):
+        self._drain_timer.stop()
+        self.webview.loadFinished.disconnect(self._on_recording_page_loaded)
+        self._drain_actions(final=True)
+
+    def _finish_actions(self):
+        """根据已写入的操作记录生成摘要和选择器建议"""
+        try:
+            actions = []
+            if self.actions_file.exists():
+                with open(self.actions_file, encoding='utf-8') as f:
+                    actions = [json.loads(line) for line in f if line.strip()]
+            timestamp = self.actions_timestamp
+
+            # 生成可读的操作摘要
+            summary_file = self.output_dir / f"actions_{timestamp}_summary.txt"
+            with open(summary_file, 'w', encoding='utf-8') as f:
+                f.write("=" * 60 + "\n")
+                f.write("操作录制摘要\n")
+                f.write("=" * 60 + "\n\n")
+
+                for idx, action in enumerate(actions, 1):
+                    f.write(f"[{idx}] {action['type'].upper()} - {action['timestamp']}\n")
+                    f.write(f"    元素: <{action['tagName']}> ")
+                    if action.get('id'):
+                        f.write(f"#{action['id']} ")
+                    if action.get('className'):
+                        f.write(f".{action['className']} ")
+                    f.write("\n")
+                    if action.get('innerText'):
+                        f.write(f"    文本: {action['innerText']}\n")
+                    f.write(f"    选择器: {action.get('selector', 'N/A')}\n")
+                    f.write(f"    XPath: {action.get('xpath', 'N/A')}\n")
+                    f.write("\n")
+
+            self.log_message.emit(f"✅ 已保存 {len(actions)} 个操作记录")
+            if self.dropped_actions:
+                self.log_message.emit(f"⚠️ 页面缓冲溢出，丢弃了 {self.dropped_actions} 个操作")
+            self.log_message.emit(f"📄 JSONL: {self.actions_file.name}")
+            self.log_message.emit(f"📝 摘要: {summary_file.name}")
+
+            # 生成建议的选择器
+            self._generate_selector_suggestions(actions, timestamp)
+            self._refresh_index()
+
+        except Exception as e:
+            self.log_message.emit(f"❌ 保存操作记录失败: {e}")
+    
+    def _refresh_index(self):
+        """后台增量更新录制索引（python -m autolink_modules.session_index search ...）"""
+        def update():
+            index = SessionIndex(self.output_dir)
             try:
-                actions = json.loads(actions_json)
-                
-                timestamp = QDateTime.currentDateTime().toString("yyyyMMdd_HHmmss")
-                actions_file = self.output_dir / f"actions_{timestamp}.json"
-                
-                # 保存操作记录
-                with open(actions_file, 'w', encoding='utf-8') as f:
-                    json.dump(actions, f, ensure_ascii=False, indent=2)
-                
-                # 生成可读的操作摘要
-                summary_file = self.output_dir / f"actions_{timestamp}_summary.txt"
-                with open(summary_file, 'w', encoding='utf-8') as f:
-                    f.write("=" * 60 + "\n")
-                    f.write("操作录制摘要\n")
-                    f.write("=" * 60 + "\n\n")
-                    
-                    for idx, action in enumerate(actions, 1):
-                        f.write(f"[{idx}] {action['type'].upper()} - {action['timestamp']}\n")
-                        f.write(f"    元素: <{action['tagName']}> ")
-                        if action.get('id'):
-                            f.write(f"#{action['id']} ")
-                        if action.get('className'):
-                            f.write(f".{action['className']} ")
-                        f.write("\n")
-                        if action.get('innerText'):
-                            f.write(f"    文本: {action['innerText']}\n")
-                        f.write(f"    选择器: {action.get('selector', 'N/A')}\n")
-                        f.write(f"    XPath: {action.get('xpath', 'N/A')}\n")
-                        f.write("\n")
-                
-                self.log_message.emit(f"✅ 已保存 {len(actions)} 个操作记录")
-                self.log_message.emit(f"📄 JSON: {actions_file.name}")
-                self.log_message.emit(f"📝 摘要: {summary_file.name}")
-                
-                # 生成建议的选择器
-                self._generate_selector_suggestions(actions, timestamp)
-                
+                index.update()
             except Exception as e:
-                self.log_message.emit(f"❌ 保存操作记录失败: {e}")
-        
-        self.webview.page().runJavaScript(get_actions_js, on_actions_received)
-    
+                self.log_message.emit(f"⚠️ 更新录制索引失败: {e}")
+            finally:
+                index.close()
+
+        threading.Thread(target=update, daemon=True).start()
+
     def _generate_selector_suggestions(self, actions, timestamp):
-        """根据录制的操作生成选择器建议"""
+        """根据录制的操作生成选择器建议（有快照时在最近的快照上排名候选选择器）"""
         suggestions_file = self.output_dir / f"selector_suggestions_{timestamp}.txt"
-        
+        # 只使用录制中操作过的页面的快照，其他页面的快照会让排名失真
+        pages = {a.get("url", "").split("#")[0] for a in actions}
+        entries = [e for e in self.snapshots.entries() if e.url.split("#")[0] in pages][-5:]
+        ranked = {}
+        if entries and actions:
+            try:
+                results = rank_actions(actions, [self.snapshots.read(e) for e in entries])
+                ranked = {r.action_index: r for r in results if r.type != "row"}
+                by_role = selectors_by_role(results)
+                ranking_file = self.output_dir / f"selector_ranking_{timestamp}.json"
+                with open(ranking_file, 'w', encoding='utf-8') as f:
+                    json.dump({"snapshots": [e.id for e in entries], "selectors": by_role,
+                               "elements": [asdict(r) for r in results]}, f, ensure_ascii=False, indent=2)
+                self.log_message.emit(f"💡 已在 {len(entries)} 个快照上排名选择器: {ranking_file.name}")
+                if by_role:
+                    self.log_message.emit(f"🧩 识别出选课脚本选择器: {by_role}")
+                    self.selectors_suggested.emit(by_role)
+            except Exception as e:
+                self.log_message.emit(f"⚠️ 选择器排名失败: {e}")
+
+        def best_of(index, action):
+            r = ranked.get(index)
+            if r and r.best:
+                top = r.candidates[0]
+                return f"{r.best}（稳定 {top.stability:.0%}，唯一 {top.unique_rate:.0%}，开销 {top.cost:.0f}）"
+            return action.get('selector', 'N/A')
+
         with open(suggestions_file, 'w', encoding='utf-8') as f:
             f.write("=" * 60 + "\n")
             f.write("自动生成的选择器建议\n")
             f.write("=" * 60 + "\n\n")
             
             # 分析点击的按钮
-            click_actions = [a for a in actions if a['type'] == 'click']
+            click_actions = [(i, a) for i, a in enumerate(actions, 1) if a['type'] == 'click']
             if click_actions:
                 f.write("## 点击操作的建议选择器：\n\n")
-                for idx, action in enumerate(click_actions, 1):
+                for idx, (index, action) in enumerate(click_actions, 1):
                     f.write(f"操作 {idx}: 点击 \"{action.get('innerText', 'N/A')[:30]}\"\n")
-                    f.write(f"  推荐选择器: {action.get('selector', 'N/A')}\n")
+                    f.write(f"  推荐选择器: {best_of(index, action)}\n")
                     if action.get('id'):
                         f.write(f"  或使用 ID: #{action['id']}\n")
                     f.write("\n")
             
             # 分析输入操作
-            input_actions = [a for a in actions if a['type'] == 'input']
+            input_actions = [(i, a) for i, a in enumerate(actions, 1) if a['type'] == 'input']
             if input_actions:
                 f.write("\n## 输入操作的建议选择器：\n\n")
-                for idx, action in enumerate(input_actions, 1):
+                for idx, (index, action) in enumerate(input_actions, 1):
                     f.write(f"输入 {idx}: {action.get('tagName')} ")
                     if action.get('name'):
                         f.write(f"name=\"{action['name']}\"")
                     f.write("\n")
-                    f.write(f"  推荐选择器: {action.get('selector', 'N/A')}\n")
+                    f.write(f"  推荐选择器: {best_of(index, action)}\n")
                     f.write("\n")
             
             f.write("\n" + "=" * 60 + "\n")
-            f.write("复制上述选择器到 js_scripts.py 中替换 TODO 标记！\n")
+            f.write("识别出的选课按钮/确认按钮/课程行选择器确认后写入 scripts/course_selectors.json，\n")
+            f.write("其余选择器可复制到 js_scripts.py 中替换 TODO 标记！\n")
             f.write("=" * 60 + "\n")
         
         self.log_message.emit(f"💡 已生成选择器建议: {suggestions_file.name}")
@@ -1,36 +1,162 @@
+import copy
 import os
+import re
+import threading
 import yaml
-from PyQt5.QtWidgets import QDialog, QVBoxLayout, QLineEdit, QPushButton, QLabel, QTextEdit, QFileDialog, QComboBox
-import requests
-# 使用 jmcomic 模块实现下载逻辑
-import jmcomic
+from PyQt5.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QLineEdit, QPushButton, QLabel, QTextEdit, QFileDialog, QComboBox, QSpinBox
+)
+
+from autolink_modules.jmcomic_queue import JMComicDownloadQueue
+from autolink_modules.persistence import default_writer
 
 option_path = os.path.join(os.path.dirname(__file__), '../resources/jmcomic/option.yml')
-option = jmcomic.create_option_by_file(option_path)
 
-def load_jmcomic_options():
-    """加载 JMComic 的配置文件"""
-    option_path = os.path.join(os.path.dirname(__file__), '../resources/jmcomic/option.yml')
-    with open(option_path, 'r', encoding='utf-8') as f:
-        return yaml.safe_load(f)
+PDF_PLUGIN = {
+    'plugin': 'img2pdf',
+    'kwargs': {
+        'pdf_dir': '${APP_DIR}/resources/downloads/pdf',
+        'filename_rule': 'Pid'
+    }
+}
+
+
+class JMComicOptions:
+    """option.yml 的内存模型
+
+    首次访问时读取一次文件，之后直接修改内存中的数据并在后台延迟保存；
+    jmcomic 的 option 对象在首次下载时才创建，配置修改后下一次下载前重建
+    （进行中的下载继续使用开始时的 option）。程序运行期间以内存中的数据为准。
+    img2pdf 插件只作为“生成 PDF”的配置保留在文件中，创建 option 时去掉，
+    PDF 改由 pdf_stage 在进程池中生成。
+    """
+
+    def __init__(self, path=option_path):
+        self.path = path
+        self._data = None
+        self._version = 0
+        self._option = None
+        self._option_version = -1
+        # 下载队列的工作线程在锁内复制配置创建 option，界面线程在锁内修改配置，
+        # 首次读取文件也在锁内进行
+        self._lock = threading.Lock()
+
+    def _load(self):
+        """内存中的配置（首次调用时读取文件），调用方需持有 _lock"""
+        if self._data is None:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._data = yaml.safe_load(f) or {}
+        return self._data
+
+    @property
+    def data(self):
+        """当前配置的副本（修改请使用 set_* 方法）"""
+        with self._lock:
+            return copy.deepcopy(self._load())
+
+    def _changed(self):
+        """配置已修改（调用方持有 _lock）：更新版本并保存
+
+        保存时立即序列化，写线程拿到的是锁内的快照，之后的修改不会影响它。
+        """
+        self._version += 1
+        default_writer().save(self.path, self._data)
+
+    @staticmethod
+    def _format_of(data):
+        plugins = data.get('plugins', {}).get('after_photo', [])
+        return "both" if any(p.get('plugin') == 'img2pdf' for p in plugins) else "webp"
+
+    @property
+    def download_format(self):
+        """webp：只保存图片；both：同时生成 PDF（after_photo 中有 img2pdf 插件）"""
+        with self._lock:
+            return self._format_of(self._load())
+
+    def set_download_format(self, download_format):
+        """切换下载格式，返回是否有变化"""
+        with self._lock:
+            data = self._load()
+            if download_format == self._format_of(data):
+                return False
+            plugins = data.setdefault('plugins', {})
+            if download_format == "webp":
+                # 移除 img2pdf 插件配置
+                plugins['after_photo'] = [p for p in plugins.get('after_photo', []) if p.get('plugin') != 'img2pdf']
+            else:
+                # 添加 img2pdf 插件配置
+                plugins.setdefault('after_photo', []).append(copy.deepcopy(PDF_PLUGIN))
+            self._changed()
+        return True
 
-def save_jmcomic_options(options):
-    """保存 JMComic 的配置文件"""
-    option_path = os.path.join(os.path.dirname(__file__), '../resources/jmcomic/option.yml')
-    with open(option_path, 'w', encoding='utf-8') as f:
-        yaml.safe_dump(options, f, allow_unicode=True)
+    @property
+    def base_dir(self):
+        with self._lock:
+            return self._load().get('dir_rule', {}).get('base_dir', '')
+
+    def set_base_dir(self, base_dir):
+        with self._lock:
+            data = self._load()
+            if base_dir == data.get('dir_rule', {}).get('base_dir', ''):
+                return False
+            data.setdefault('dir_rule', {})['base_dir'] = base_dir
+            self._changed()
+        return True
+
+    def pdf_settings(self):
+        """img2pdf 插件的 kwargs（未开启 PDF 时为 None），供 pdf_stage 使用"""
+        with self._lock:
+            for plugin in self._load().get('plugins', {}).get('after_photo', []):
+                if plugin.get('plugin') == 'img2pdf':
+                    return dict(plugin.get('kwargs') or {})
+        return None
+
+    def option(self):
+        """当前配置对应的 jmcomic option（配置未变时复用）"""
+        with self._lock:
+            if self._option is None or self._option_version != self._version:
+                # 使用 jmcomic 模块实现下载逻辑，首次下载时才导入，避免拖慢程序启动
+                import jmcomic
+                data = copy.deepcopy(self._load())
+                data.setdefault('filepath', os.path.abspath(self.path))
+                # 不在下载线程中内联执行 img2pdf，由 pdf_stage 在进程池中生成
+                plugins = data.get('plugins') or {}
+                if 'after_photo' in plugins:
+                    plugins['after_photo'] = [p for p in plugins['after_photo'] if p.get('plugin') != 'img2pdf']
+                self._option = jmcomic.JmOption.construct(data)
+                self._option_version = self._version
+            return self._option
+
+
+jmcomic_options = JMComicOptions()
+
+
+def get_option():
+    """下载队列使用的 option 工厂"""
+    return jmcomic_options.option()
 
 class JMComicWidget(QDialog):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, log_sink=None, download_queue=None):
         super().__init__(parent)
+        self.log_sink = log_sink  # 主窗口日志管道
+        # 下载队列由主窗口持有，关闭对话框后继续下载
+        self.download_queue = download_queue or JMComicDownloadQueue(get_option)
         self.setWindowTitle("JMComic 图形化下载")
         layout = QVBoxLayout()
 
         self.id_edit = QLineEdit()
-        self.id_edit.setPlaceholderText("输入本子ID")
+        self.id_edit.setPlaceholderText("输入本子ID，多个用空格或逗号分隔")
         self.format_combo = QComboBox()
         self.format_combo.addItems(["webp", "both"])
-        self.download_btn = QPushButton("下载")
+        self.format_combo.setCurrentText(jmcomic_options.download_format)
+        self.parallel_spin = QSpinBox()
+        self.parallel_spin.setRange(1, 8)
+        self.parallel_spin.setValue(self.download_queue.max_parallel)
+        self.download_btn = QPushButton("加入下载队列")
+        self.pause_btn = QPushButton("暂停")
+        self.pause_btn.setCheckable(True)
+        self.pause_btn.setChecked(self.download_queue.paused)
+        self.cancel_btn = QPushButton("取消全部")
         self.change_path_btn = QPushButton("修改保存路径")
         self.log_area = QTextEdit()
         self.log_area.setReadOnly(True)
@@ -39,7 +165,15 @@ class JMComicWidget(QDialog):
         layout.addWidget(self.id_edit)
         layout.addWidget(QLabel("选择下载格式:"))
         layout.addWidget(self.format_combo)
+        parallel_layout = QHBoxLayout()
+        parallel_layout.addWidget(QLabel("同时下载:"))
+        parallel_layout.addWidget(self.parallel_spin)
+        layout.addLayout(parallel_layout)
         layout.addWidget(self.download_btn)
+        queue_layout = QHBoxLayout()
+        queue_layout.addWidget(self.pause_btn)
+        queue_layout.addWidget(self.cancel_btn)
+        layout.addLayout(queue_layout)
         layout.addWidget(self.change_path_btn)
         layout.addWidget(QLabel("日志:"))
         layout.addWidget(self.log_area)
@@ -48,51 +182,51 @@ class JMComicWidget(QDialog):
         self.download_btn.clicked.connect(self.download)
         self.change_path_btn.clicked.connect(self.change_save_path)
         self.format_combo.currentIndexChanged.connect(self.update_download_format)
+        self.parallel_spin.valueChanged.connect(self.download_queue.set_max_parallel)
+        self.pause_btn.toggled.connect(self.toggle_pause)
+        self.cancel_btn.clicked.connect(lambda: self.download_queue.cancel())
+        # 队列日志由主窗口转发到日志管道，这里只显示在对话框中，关闭时断开
+        self.download_queue.log_message.connect(self.log_area.append)
+        self.download_queue.paused_changed.connect(self.pause_btn.setChecked)
+        self.finished.connect(self._disconnect_queue)
+
+    def _disconnect_queue(self):
+        self.download_queue.log_message.disconnect(self.log_area.append)
+        self.download_queue.paused_changed.disconnect(self.pause_btn.setChecked)
+
+    def toggle_pause(self, paused):
+        self.pause_btn.setText("继续" if paused else "暂停")
+        if paused:
+            self.download_queue.pause()
+        else:
+            self.download_queue.resume()
+
+    def _log(self, msg):
+        """输出到对话框日志，并转发到主窗口日志管道"""
+        self.log_area.append(msg)
+        if self.log_sink:
+            self.log_sink(msg)
 
     def update_download_format(self):
-        """根据选择更新 option.yml 文件"""
+        """根据选择更新下载格式（下一个开始下载的本子生效）"""
         selected_format = self.format_combo.currentText()
-        options = load_jmcomic_options()
-
-        if selected_format == "webp":
-            # 移除 img2pdf 插件配置
-            options['plugins']['after_photo'] = [
-                plugin for plugin in options['plugins'].get('after_photo', [])
-                if plugin.get('plugin') != 'img2pdf'
-            ]
-        elif selected_format == "both":
-            # 添加 img2pdf 插件配置
-            if not any(plugin.get('plugin') == 'img2pdf' for plugin in options['plugins'].get('after_photo', [])):
-                options['plugins'].setdefault('after_photo', []).append({
-                    'plugin': 'img2pdf',
-                    'kwargs': {
-                        'pdf_dir': '${APP_DIR}/resources/downloads/pdf',
-                        'filename_rule': 'Pid'
-                    }
-                })
-
-        save_jmcomic_options(options)
-        self.log_area.append(f"下载格式已更新为: {selected_format}")
+        if jmcomic_options.set_download_format(selected_format):
+            self._log(f"下载格式已更新为: {selected_format}")
 
     def download(self):
-        album_id = self.id_edit.text().strip()
-        if not album_id:
-            self.log_area.append("请输入本子ID！")
+        """把输入的本子ID加入后台下载队列"""
+        album_ids = [i for i in re.split(r"[\s,，]+", self.id_edit.text()) if i]
+        if not album_ids:
+            self._log("请输入本子ID！")
             return
-
-        try:
-            self.log_area.append(f"开始下载本子 {album_id} ...")
-            jmcomic.download_album(album_id, option)
-            self.log_area.append(f"本子 {album_id} 下载完成！")
-        except Exception as e:
-            self.log_area.append(f"下载失败: {e}")
+        if not self.download_queue.enqueue(album_ids):
+            self._log("这些本子已在队列中或正在下载。")
+            return
+        self.id_edit.clear()
 
     def change_save_path(self):
         """修改保存路径"""
-        options = load_jmcomic_options()
-        current_path = options.get('dir_rule', {}).get('base_dir', '')
+        current_path = jmcomic_options.base_dir
         new_path = QFileDialog.getExistingDirectory(self, "选择保存路径", current_path)
-        if new_path:
-            options['dir_rule']['base_dir'] = new_path
-            save_jmcomic_options(options)
-            self.log_area.append(f"保存路径已修改为: {new_path}")
\ No newline at end of file
+        if new_path and jmcomic_options.set_base_dir(new_path):
+            self._log(f"保存路径已修改为: {new_path}")
\ No newline at end of file
@@ -0,0 +1,349 @@
+"""
+JMComic 下载队列 - 在后台线程中排队下载本子
+
+功能：
+- 一次提交多个本子 ID，按提交顺序排队
+- 可配置同时下载的本子数（运行中调整立即生效）
+- 通过信号把进度输出到界面日志（工作线程不直接操作控件）
+- 暂停/继续/取消：在 jmcomic 下载器的章节和图片钩子处检查，
+  暂停时下载线程停在下一张图片之前，取消时尽快结束当前本子
+- 队列由主窗口持有，关闭下载对话框后继续下载
+- 配合下载清单（download_manifest）：已完成的本子直接跳过，中断的本子只下载缺少的章节和图片
+- 章节完成后提交到 PDF 生成阶段（pdf_stage），下载线程不等待 PDF 生成
+"""
+from PyQt5.QtCore import QObject, pyqtSignal
+from collections import deque
+from dataclasses import dataclass
+from types import SimpleNamespace
+import os
+import threading
+import time
+
+
+class DownloadCancelled(Exception):
+    """下载被取消（在下载器钩子中抛出以中断当前本子）"""
+
+
+@dataclass
+class DownloadTask:
+    """一个本子的下载任务"""
+    album_id: str
+    status: str = "queued"  # queued / downloading / done / failed / cancelled
+    photos_total: int = 0
+    photos_done: int = 0
+    photos_incomplete: int = 0  # 有图片未下载成功的章节（不记入清单，下次继续）
+    images_done: int = 0
+    error: str = ""
+    started_at: float = 0.0
+    finished_at: float = 0.0
+    cancelled: bool = False
+
+
+class JMComicDownloadQueue(QObject):
+    """JMComic 下载队列（在 GUI 线程创建，下载在工作线程中进行）"""
+
+    log_message = pyqtSignal(str)
+    task_changed = pyqtSignal(object)  # DownloadTask
+    paused_changed = pyqtSignal(bool)
+
+    PROGRESS_INTERVAL = 3.0  # 秒，同一本子图片进度日志的最小间隔
+
+    def __init__(self, option_factory, max_parallel=2, manifest=None, pdf_stage=None):
+        super().__init__()
+        self.option_factory = option_factory  # 返回 jmcomic option，首次下载时才调用
+        self.max_parallel = max(1, max_parallel)
+        self.manifest = manifest  # DownloadManifest，为 None 时不跳过已下载内容
+        self.pdf_stage = pdf_stage  # PdfStage，为 None 时不生成 PDF
+        self.tasks = {}  # album_id -> DownloadTask（保留已完成的任务用于查询）
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._running = threading.Event()  # 未暂停
+        self._running.set()
+        self._workers = 0
+        self._active = 0
+        self._last_progress = {}
+        self._progress_lock = threading.Lock()  # 图片钩子在 jmcomic 的多个线程中调用
+
+    # ---------- 队列操作（GUI 线程调用） ----------
+
+    def enqueue(self, album_ids, force=False):
+        """加入下载队列，返回实际加入的 ID（正在排队或下载中的会跳过）
+
+        清单中已完整下载的本子直接标记完成；force 时作废清单记录重新下载。
+        """
+        added = []
+        with self._cond:
+            for album_id in album_ids:
+                album_id = str(album_id).strip()
+                task = self.tasks.get(album_id)
+                if not album_id or (task and task.status in ("queued", "downloading")):
+                    continue
+                if self.manifest is not None:
+                    if force:
+                        self.manifest.forget_album(album_id)
+                    elif self.manifest.album_complete(album_id):
+                        self._skip_downloaded(album_id)
+                        continue
+                task = DownloadTask(album_id)
+                self.tasks[album_id] = task
+                self._pending.append(task)
+                added.append(album_id)
+            self._spawn_workers()
+            self._cond.notify_all()
+        for album_id in added:
+            self.task_changed.emit(self.tasks[album_id])
+        if added:
+            self.log_message.emit(f"📥 已加入下载队列: {', '.join(added)}（排队 {len(self._pending)} 个）")
+        return added
+
+    def _skip_downloaded(self, album_id):
+        info = self.manifest.album_summary(album_id)
+        task = DownloadTask(album_id, status="done", photos_total=info["photo_count"],
+                            photos_done=info["photos_done"], images_done=info["images"])
+        self.tasks[album_id] = task
+        self.task_changed.emit(task)
+        self.log_message.emit(
+            f"✅ 本子 {album_id}《{info['name']}》已下载过：{info['photos_done']} 章，{info['images']} 张图，"
+            f"{info['pdfs']} 个 PDF（来自下载清单）"
+        )
+        if self.pdf_stage is not None and self.pdf_stage.settings():
+            # 排队满时提交会等待，不在 GUI 线程中进行
+            threading.Thread(target=self._submit_missing_pdfs, args=(album_id,), daemon=True).start()
+
+    def _submit_missing_pdfs(self, album_id):
+        """为清单中已完成但缺少 PDF 的章节补生成 PDF"""
+        if self.manifest is None or self.pdf_stage is None:
+            return
+        missing = self.manifest.photos_without_pdf(album_id)
+        submitted = sum(
+            1 for photo_id, title, image_dir in missing
+            if self.pdf_stage.submit(album_id, SimpleNamespace(photo_id=photo_id, album_id=album_id, name=title),
+                                     image_dir)
+        )
+        if submitted:
+            self.log_message.emit(f"📄 本子 {album_id}: {submitted} 章缺少 PDF，已加入生成队列")
+
+    def set_max_parallel(self, count):
+        """调整同时下载的本子数，多出的线程在当前本子完成后退出"""
+        with self._cond:
+            self.max_parallel = max(1, int(count))
+            self._spawn_workers()
+            self._cond.notify_all()
+
+    def pause(self):
+        """暂停：下载中的本子停在下一张图片之前，排队的本子暂不开始"""
+        if self._running.is_set():
+            self._running.clear()
+            self.paused_changed.emit(True)
+            self.log_message.emit("⏸ 下载已暂停")
+
+    def resume(self):
+        if not self._running.is_set():
+            with self._cond:
+                self._running.set()
+                self._cond.notify_all()
+            self.paused_changed.emit(False)
+            self.log_message.emit("▶ 下载已继续")
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    def cancel(self, album_id=None):
+        """取消指定本子（None 表示全部）：排队的直接移除，下载中的尽快中断"""
+        cancelled, interrupted = [], 0
+        with self._cond:
+            for task in self.tasks.values():
+                if album_id is not None and task.album_id != album_id:
+                    continue
+                if task.status == "queued":
+                    task.status = "cancelled"
+                    cancelled.append(task)
+                elif task.status == "downloading" and not task.cancelled:
+                    task.cancelled = True
+                    interrupted += 1
+            self._pending = deque(t for t in self._pending if t.status == "queued")
+            self._cond.notify_all()
+        for task in cancelled:
+            self.task_changed.emit(task)
+        if cancelled or interrupted:
+            self.log_message.emit(f"⏹ 已取消 {len(cancelled)} 个排队的本子，正在中断 {interrupted} 个下载中的本子")
+
+    def summary(self):
+        counts = {}
+        for task in self.tasks.values():
+            counts[task.status] = counts.get(task.status, 0) + 1
+        return counts
+
+    # ---------- 工作线程 ----------
+
+    def _spawn_workers(self):
+        """（持有锁时调用）按需启动工作线程"""
+        while self._workers < min(self.max_parallel, self._active + len(self._pending)):
+            self._workers += 1
+            threading.Thread(target=self._worker, name=f"jmcomic-download-{self._workers}", daemon=True).start()
+
+    def _next_task(self):
+        with self._cond:
+            while True:
+                if self._workers > self.max_parallel or not self._pending:
+                    self._workers -= 1
+                    return None
+                if self._running.is_set():
+                    task = self._pending.popleft()
+                    task.status = "downloading"
+                    self._active += 1
+                    return task
+                self._cond.wait()
+
+    def _worker(self):
+        while True:
+            task = self._next_task()
+            if task is None:
+                return
+            try:
+                self._download(task)
+            finally:
+                with self._cond:
+                    self._active -= 1
+
+    def _download(self, task):
+        task.started_at = time.time()
+        self.task_changed.emit(task)
+        self.log_message.emit(f"⬇️ 开始下载本子 {task.album_id}")
+        try:
+            import jmcomic
+            jmcomic.download_album(task.album_id, self.option_factory(),
+                                   downloader=self._downloader_class(task))
+            if task.cancelled:
+                raise DownloadCancelled()
+            if task.photos_incomplete:
+                raise RuntimeError(f"{task.photos_incomplete} 章有图片未下载成功，重新加入队列可继续下载")
+            if self.manifest is not None:
+                self.manifest.finish_album(task.album_id)
+                self._submit_missing_pdfs(task.album_id)  # 之前中断时未生成的 PDF
+            task.status = "done"
+            self.log_message.emit(
+                f"✅ 本子 {task.album_id} 下载完成：{task.photos_done} 章，{task.images_done} 张图，"
+                f"用时 {time.time() - task.started_at:.0f} 秒"
+            )
+        except Exception as e:
+            if task.cancelled:
+                task.status = "cancelled"
+                self.log_message.emit(f"⏹ 本子 {task.album_id} 已取消（已完成 {task.photos_done} 章）")
+            else:
+                task.status = "failed"
+                task.error = str(e)
+                self.log_message.emit(f"❌ 本子 {task.album_id} 下载失败: {e}")
+        task.finished_at = time.time()
+        self._last_progress.pop(task.album_id, None)
+        self.task_changed.emit(task)
+
+    def _checkpoint(self, task):
+        """下载器钩子中调用：暂停时等待，取消时中断"""
+        while not self._running.wait(0.2):
+            if task.cancelled:
+                break
+        if task.cancelled:
+            raise DownloadCancelled()
+
+    def _image_done(self, task):
+        with self._progress_lock:
+            task.images_done += 1
+            now = time.monotonic()
+            if now - self._last_progress.get(task.album_id, 0) < self.PROGRESS_INTERVAL:
+                return
+            self._last_progress[task.album_id] = now
+        self.task_changed.emit(task)
+        self.log_message.emit(
+            f"⏳ 本子 {task.album_id}: 第 {task.photos_done + 1}/{task.photos_total} 章，已下载 {task.images_done} 张图"
+        )
+
+    def _downloader_class(self, task):
+        """为任务创建下载器子类，在章节/图片钩子处汇报进度并响应暂停和取消"""
+        from jmcomic import JmDownloader
+        queue = self
+        manifest = self.manifest
+        pdf_stage = self.pdf_stage
+        pdf_settings = pdf_stage.settings() if pdf_stage is not None else None  # 本子开始时的配置
+        image_dirs = {}  # photo_id -> 图片目录（after_image 中记录）
+        saved_images = {}  # photo_id -> 本次写入磁盘的图片数（没有清单时用于判断章节是否完整）
+
+        class TaskDownloader(JmDownloader):
+            def do_filter(self, detail):
+                """按清单过滤：跳过已完成的章节，以及章节中已下载的图片"""
+                detail = super().do_filter(detail)
+                if manifest is None:
+                    return detail
+                if detail.is_album():
+                    return [photo for photo in detail if not manifest.photo_complete(photo.photo_id)]
+                if detail.is_photo():
+                    done = manifest.done_images(detail.photo_id)
+                    if done:
+                        return [image for image in detail if image.filename not in done]
+                return detail
+
+            def before_album(self, album):
+                task.photos_total = len(album)
+                queue.log_message.emit(f"📚 本子 {task.album_id}《{album.name}》共 {task.photos_total} 章")
+                if manifest is not None:
+                    manifest.start_album(task.album_id, album.name, task.photos_total)
+                    task.photos_done = sum(1 for photo in album if manifest.photo_complete(photo.photo_id))
+                    if task.photos_done:
+                        queue.log_message.emit(f"⏭ 本子 {task.album_id}: 跳过已完成的 {task.photos_done} 章")
+                super().before_album(album)
+
+            def before_photo(self, photo):
+                queue._checkpoint(task)
+                super().before_photo(photo)
+
+            def after_photo(self, photo):
+                super().after_photo(photo)
+                image_dir = image_dirs.pop(photo.photo_id, None)
+                saved = saved_images.pop(photo.photo_id, 0)
+                # 图片下载失败或被取消时 jmcomic 仍会调用 after_photo，只有图片齐全才算完成
+                if task.cancelled:
+                    return
+                if manifest is not None:
+                    done = manifest.done_images(photo.photo_id)
+                    missing = sum(1 for image in photo if image.filename not in done)
+                else:
+                    missing = len(photo) - saved
+                if missing > 0:
+                    task.photos_incomplete += 1
+                    queue.log_message.emit(
+                        f"⚠️ 本子 {task.album_id}: 章节 {photo.name} 缺少 {missing} 张图，未记为完成"
+                    )
+                    return
+                if manifest is not None:
+                    manifest.finish_photo(task.album_id, photo.photo_id, getattr(photo, "album_index", 0),
+                                          photo.name, len(photo))
+                if pdf_settings:
+                    pdf_stage.submit(task.album_id, photo, image_dir or self.option.decide_image_save_dir(photo),
+                                     pdf_settings)
+                task.photos_done += 1
+                queue.log_message.emit(
+                    f"📖 本子 {task.album_id}: 第 {task.photos_done}/{task.photos_total} 章完成"
+                    f"（已下载 {task.images_done} 张图）"
+                )
+                queue.task_changed.emit(task)
+
+            def before_image(self, image, img_save_path):
+                queue._checkpoint(task)
+                super().before_image(image, img_save_path)
+
+            def after_image(self, image, img_save_path):
+                super().after_image(image, img_save_path)
+                photo_id = image.from_photo.photo_id
+                image_dirs.setdefault(photo_id, os.path.dirname(img_save_path))
+                if os.path.exists(img_save_path):
+                    with queue._progress_lock:
+                        saved_images[photo_id] = saved_images.get(photo_id, 0) + 1
+                if manifest is not None:
+                    try:
+                        manifest.record_image(task.album_id, photo_id, image.filename, img_save_path)
+                    except OSError:
+                        pass  # 文件未写入（下载失败），下次继续下载
+                queue._image_done(task)
+
+        return TaskDownloader
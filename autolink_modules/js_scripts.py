@@ -1,4 +1,9 @@
 """JavaScript 代码模块 - 用于网页操作和状态检查"""
+from pathlib import Path
+import json
+
+# 页面通过 console 主动推送数据时使用的前缀（由 DomBridge 解析）
+PUSH_PREFIX = "__autolink_push__"
 
 
 def get_check_login_status_js():
@@ -144,95 +149,356 @@ def get_search_course_js(course_name=None, teacher_name=None, course_id=None):
     """
 
 
-def get_select_course_js(course_id=None, course_name=None, teacher_name=None):
-    """选课的 JavaScript 代码（核心功能）"""
+# 选课脚本的选择器，可由 selector_engine 生成的 scripts/course_selectors.json 覆盖；
+# 配置的选择器优先，未命中时仍回退到脚本内置的选择器。
+DEFAULT_COURSE_SELECTORS = {
+    "course_row": ".course-row, tbody tr",
+    "select_button": "",
+    "confirm_button": "",
+}
+_selectors_cache = {"mtime": None, "value": dict(DEFAULT_COURSE_SELECTORS)}
+
+
+def get_course_selectors(path=None):
+    """读取选择器配置（按修改时间缓存）"""
+    path = Path(path) if path else Path.cwd() / "scripts" / "course_selectors.json"
+    try:
+        mtime = path.stat().st_mtime
+    except OSError:
+        return dict(DEFAULT_COURSE_SELECTORS)
+    if _selectors_cache["mtime"] != mtime:
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            value = {k: data.get(k) or v for k, v in DEFAULT_COURSE_SELECTORS.items()}
+        except (OSError, ValueError):
+            value = dict(DEFAULT_COURSE_SELECTORS)
+        _selectors_cache.update(mtime=mtime, value=value)
+    return dict(_selectors_cache["value"])
+
+
+# 课程行选择器：优先使用 course_selectors.json 中的 course_row，配置的选择器无效或
+# 在当前页面匹配不到任何行时回退到内置选择器（一次错误的识别不会让选课脚本全部失效）。
+COURSE_ROW_SELECTOR_JS = """
+    window.__courseRowSelector = function() {
+        var configured = window.__courseSelectors && window.__courseSelectors.course_row;
+        if (configured && configured !== %(builtin)s) {
+            try {
+                if (document.querySelector(configured)) return configured;
+            } catch (e) {}
+        }
+        return %(builtin)s;
+    };
+""" % {"builtin": json.dumps(DEFAULT_COURSE_SELECTORS["course_row"])}
+
+
+# 课程索引：整张课程表只扫描一次，按课程ID和“规范化课程名|教师名”建立 Map，
+# 由 MutationObserver 在表格结构或文本变化时失效，之后按需重建。
+COURSE_INDEX_JS = COURSE_ROW_SELECTOR_JS + """
+    if (!window.__courseIndex) {
+        window.__courseIndex = (function() {
+            var byId = null, byKey = null, entries = null, observer = null;
+            var builds = 0;
+
+            function norm(text) {
+                return (text || '').replace(/\\s+/g, '').toLowerCase();
+            }
+
+            function invalidate() {
+                byId = null;
+                if (observer) {
+                    observer.disconnect();
+                    observer = null;
+                }
+            }
+
+            function build() {
+                byId = new Map();
+                byKey = new Map();
+                entries = [];
+                var containers = new Set();
+                var rows = document.querySelectorAll(window.__courseRowSelector());
+                for (var i = 0; i < rows.length; i++) {
+                    var row = rows[i];
+                    var nameCell = row.querySelector('.course-name') || row.cells && row.cells[1];
+                    if (!nameCell) continue;
+                    var teacherCell = row.querySelector('.teacher-name') || row.cells && row.cells[2];
+                    var idHolder = row.hasAttribute('data-course-id') ? row : row.querySelector('[data-course-id]');
+                    var entry = {
+                        row: row,
+                        id: idHolder ? idHolder.getAttribute('data-course-id') : '',
+                        name: norm(nameCell.textContent),
+                        teacher: teacherCell ? norm(teacherCell.textContent) : ''
+                    };
+                    entries.push(entry);
+                    if (entry.id && !byId.has(entry.id)) byId.set(entry.id, entry);
+                    var key = entry.name + '|' + entry.teacher;
+                    if (!byKey.has(key)) byKey.set(key, entry);
+                    if (!byKey.has(entry.name + '|')) byKey.set(entry.name + '|', entry);
+                    containers.add(row.closest('table') || row.parentNode);
+                }
+                builds++;
+                if (!entries.length) {
+                    // 表格尚未出现，不缓存，下次调用重新扫描
+                    byId = null;
+                    return;
+                }
+                // 只观察课程表本身，按钮状态等属性变化不影响索引
+                observer = new MutationObserver(invalidate);
+                containers.forEach(function(node) {
+                    observer.observe(node, {childList: true, subtree: true, characterData: true});
+                });
+            }
+
+            function find(course) {
+                // 整张表被替换（AJAX 搜索、翻页）时旧表已脱离文档，观察器不会再触发，按需重建
+                if (byId && !entries[0].row.isConnected) invalidate();
+                var hit = lookup(course);
+                if (hit && !hit.row.isConnected) {
+                    invalidate();
+                    hit = lookup(course);
+                }
+                return hit;
+            }
+
+            function lookup(course) {
+                if (!byId) build();
+                if (!byId) return null;
+                if (course.course_id && byId.has(String(course.course_id))) {
+                    return byId.get(String(course.course_id));
+                }
+                var name = norm(course.course_name);
+                if (!name) return null;
+                var teacher = norm(course.teacher_name);
+                var hit = byKey.get(name + '|' + teacher);
+                if (hit) return hit;
+                // 精确键未命中时退回包含匹配（与旧逻辑一致）
+                for (var i = 0; i < entries.length; i++) {
+                    var e = entries[i];
+                    if (e.name.indexOf(name) !== -1 && (!teacher || e.teacher.indexOf(teacher) !== -1)) {
+                        return e;
+                    }
+                }
+                return null;
+            }
+
+            return {
+                find: find,
+                invalidate: invalidate,
+                stats: function() { return {builds: builds, size: entries ? entries.length : 0}; }
+            };
+        })();
+    }
+"""
+
+
+# 选课响应拦截：包装页面的 fetch 和 XMLHttpRequest，路径匹配选课接口的请求领取 token，
+# 响应到达后把状态码和响应文本通过 console 推送回来，不再在提交后轮询 DOM 中的提示文字。
+# 点击处理函数中同步发出的请求归属当前点击的课程；异步发出的按点击顺序领取。
+# token 超过有效期或被 discard 后不再领取，一次没有发出请求的点击不会让后续响应错位。
+# 确认弹窗是全局查找的，课程之间无法区分，所以带 token 的点击由调用方串行执行
+# （见 CourseGrabber._submit_via_page），token 已被领取时也不再点击确认。
+SELECT_WATCH_JS = """
+    if (!window.__selectWatch) {
+        window.__selectWatch = (function() {
+            var tokens = [];  // [{token, expires}]，按点击顺序
+            var watch = {
+                pattern: null,
+                active: null,  // 正在执行点击处理函数的课程 token
+                expect: function(token, ttl) {
+                    tokens.push({token: token, expires: Date.now() + (ttl || 10000)});
+                },
+                discard: function(token) {
+                    tokens = tokens.filter(function(t) { return t.token !== token; });
+                },
+                pending: function(token) {
+                    var now = Date.now();
+                    return tokens.some(function(t) { return t.token === token && t.expires > now; });
+                }
+            };
+
+            function take(url) {
+                if (!tokens.length || !watch.pattern) return null;
+                var path;
+                try { path = new URL(String(url), location.href).pathname; } catch (e) { path = String(url); }
+                if (!watch.pattern.test(path)) return null;
+                var now = Date.now();
+                tokens = tokens.filter(function(t) { return t.expires > now; });
+                var i = 0;
+                if (watch.active) {
+                    // 当前点击的 token 已被领取时不再占用其他课程的 token
+                    for (i = 0; i < tokens.length && tokens[i].token !== watch.active; i++) {}
+                }
+                return i < tokens.length ? tokens.splice(i, 1)[0].token : null;
+            }
+
+            function report(token, status, text) {
+                console.log('%(prefix)s' + JSON.stringify({token: token, status: status, text: text}));
+            }
+
+            var origFetch = window.fetch;
+            if (origFetch) {
+                window.fetch = function(input, init) {
+                    var promise = origFetch.apply(this, arguments);
+                    var token = take(input && input.url ? input.url : input);
+                    if (token) {
+                        promise.then(function(response) {
+                            response.clone().text().then(function(text) {
+                                report(token, response.status, text);
+                            }, function() { report(token, response.status, ''); });
+                        }, function(err) { report(token, 0, String(err)); });
+                    }
+                    return promise;
+                };
+            }
+
+            var origOpen = XMLHttpRequest.prototype.open;
+            var origSend = XMLHttpRequest.prototype.send;
+            XMLHttpRequest.prototype.open = function(method, url) {
+                this.__selectUrl = url;
+                return origOpen.apply(this, arguments);
+            };
+            XMLHttpRequest.prototype.send = function() {
+                var token = take(this.__selectUrl);
+                if (token) {
+                    var xhr = this;
+                    xhr.addEventListener('loadend', function() {
+                        var text = '';
+                        try { text = xhr.responseText; } catch (e) {}
+                        report(token, xhr.status, text);
+                    });
+                }
+                return origSend.apply(this, arguments);
+            };
+            return watch;
+        })();
+    }
+""" % {"prefix": PUSH_PREFIX}
+
+
+def get_select_courses_js(courses):
+    """一次调用选多门课程（courses 为含 course_id/course_name/teacher_name 的字典列表）
+
+    返回 JSON 字符串：{课程ID或课程名: 状态}，状态与 get_select_course_js 相同。
+    多门课程依次点击，每次点击后等待 100ms 处理确认弹窗再点下一门。
+    """
+    targets = [
+        {
+            "course_id": c.get("course_id") or "",
+            "course_name": c.get("course_name") or "",
+            "teacher_name": c.get("teacher_name") or "",
+        }
+        for c in courses
+    ]
+    return f"{_select_courses_iife(targets)};"
+
+
+def _select_courses_iife(targets, submit_pattern="", token_ttl=10.0):
+    """生成立即执行的选课函数表达式（不带分号），返回值为 JSON 字符串
+
+    submit_pattern 非空时安装响应拦截（按 URL 路径匹配），带 token 的课程点击后
+    其选课响应会被推送回来；token_ttl 秒内没有匹配的请求时 token 作废。
+    """
+    watch = ""
+    if submit_pattern:
+        watch = f"""{SELECT_WATCH_JS}
+        window.__selectWatch.pattern = new RegExp({json.dumps(submit_pattern)});"""
+    selectors = get_course_selectors()
     return f"""
     (function() {{
-        // TODO: 根据实际页面调整选择器
-        // 方法1: 通过课程ID查找
-        var courseRow = document.querySelector('[data-course-id="{course_id}"]');
-        
-        // 方法2: 通过课程名称和教师名称查找
-        if (!courseRow && "{course_name}") {{
-            var allRows = document.querySelectorAll('.course-row, tr');
-            for (var i = 0; i < allRows.length; i++) {{
-                var row = allRows[i];
-                var nameCell = row.querySelector('.course-name') || row.cells[1];
-                var teacherCell = row.querySelector('.teacher-name') || row.cells[2];
-                
-                if (nameCell && nameCell.textContent.includes("{course_name}")) {{
-                    if (!"{teacher_name}" || (teacherCell && teacherCell.textContent.includes("{teacher_name}"))) {{
-                        courseRow = row;
-                        break;
-                    }}
+        var SEL = window.__courseSelectors = {json.dumps(selectors, ensure_ascii=False)};
+        {COURSE_INDEX_JS}
+        {watch}
+        var targets = {json.dumps(targets, ensure_ascii=False)};
+        var results = {{}};
+        var buttons = [];
+
+        targets.forEach(function(course) {{
+            var key = course.course_id || course.course_name;
+            var entry = window.__courseIndex.find(course);
+            if (!entry) {{
+                results[key] = 'course_not_found';
+                return;
+            }}
+            // 查找选课按钮
+            var selectBtn = (SEL.select_button && entry.row.querySelector(SEL.select_button)) ||
+                           entry.row.querySelector('.select-btn') ||
+                           entry.row.querySelector('[class*="select"]') ||
+                           entry.row.querySelector('button');
+            if (!selectBtn) {{
+                results[key] = 'button_not_found';
+            }} else if (selectBtn.disabled || selectBtn.classList.contains('disabled')) {{
+                results[key] = 'course_full';
+            }} else {{
+                results[key] = 'select_clicked';
+                buttons.push({{button: selectBtn, token: course.token || null}});
+                if (course.token && window.__selectWatch) {{
+                    window.__selectWatch.expect(course.token, {int(token_ttl * 1000)});
                 }}
             }}
-        }}
-        
-        if (!courseRow) {{
-            return 'course_not_found';
-        }}
-        
-        // 查找选课按钮
-        var selectBtn = courseRow.querySelector('.select-btn') || 
-                       courseRow.querySelector('[class*="select"]') ||
-                       courseRow.querySelector('button');
-        
-        if (!selectBtn) {{
-            return 'button_not_found';
-        }}
-        
-        // 检查按钮状态
-        if (selectBtn.disabled || selectBtn.classList.contains('disabled')) {{
-            return 'course_full';
-        }}
-        
-        // 点击选课按钮
-        selectBtn.click();
-        
-        // 等待确认弹窗
-        setTimeout(function() {{
-            var confirmBtn = document.querySelector('.confirm-select') || 
+        }});
+
+        function confirmDialog() {{
+            var confirmBtn = (SEL.confirm_button && document.querySelector(SEL.confirm_button)) ||
+                           document.querySelector('.confirm-select') ||
                            document.querySelector('[class*="confirm"]') ||
                            document.querySelector('.swal2-confirm');
             if (confirmBtn) {{
                 confirmBtn.click();
             }}
-        }}, 100);
-        
-        return 'select_clicked';
-    }})();
-    """
+        }}
 
+        // 点击期间发出的选课请求领取该课程的 token
+        function withToken(token, fn) {{
+            if (window.__selectWatch) window.__selectWatch.active = token;
+            try {{
+                fn();
+            }} finally {{
+                if (window.__selectWatch) window.__selectWatch.active = null;
+            }}
+        }}
 
-def get_check_select_result_js():
-    """检查选课结果"""
-    return """
-    (function() {
-        // TODO: 根据实际页面调整选择器
-        // 检查成功提示
-        var successMsg = document.querySelector('.success-message') || 
-                        document.querySelector('[class*="success"]');
-        if (successMsg && successMsg.textContent.includes('成功')) {
-            return 'success';
-        }
-        
-        // 检查失败提示
-        var errorMsg = document.querySelector('.error-message') || 
-                      document.querySelector('[class*="error"]');
-        if (errorMsg) {
-            return 'failed: ' + errorMsg.textContent.trim();
-        }
-        
-        // 检查课程是否已满
-        if (document.body.textContent.includes('已满') || 
-            document.body.textContent.includes('人数已满')) {
-            return 'course_full';
-        }
-        
-        return 'unknown';
-    })();
+        // 点击选课按钮，等待确认弹窗后继续下一门
+        function clickNext(i) {{
+            if (i >= buttons.length) return;
+            var item = buttons[i];
+            withToken(item.token, function() {{ item.button.click(); }});
+            setTimeout(function() {{
+                // 点击已发出选课请求（或 token 已作废）时不再确认，以免点到之后课程的弹窗
+                var watch = window.__selectWatch;
+                if (!item.token || !watch || watch.pending(item.token)) {{
+                    withToken(item.token, confirmDialog);
+                }}
+                clickNext(i + 1);
+            }}, 100);
+        }}
+        clickNext(0);
+
+        return JSON.stringify(results);
+    }})()"""
+
+
+def get_select_course_js(course_id=None, course_name=None, teacher_name=None,
+                         token=None, submit_pattern="", token_ttl=10.0):
+    """选课的 JavaScript 代码（核心功能），返回单门课程的状态字符串
+
+    指定 token 和 submit_pattern（选课接口 URL 路径正则）时，点击后发出的选课请求
+    的响应会以 {token, status, text} 推送，可用 DomBridge.expect(token) 等待；
+    放弃等待时用 get_discard_select_token_js 作废页面中的 token。
     """
+    target = {
+        "course_id": course_id or "",
+        "course_name": course_name or "",
+        "teacher_name": teacher_name or "",
+    }
+    if token and submit_pattern:
+        target["token"] = token
+    key = json.dumps(course_id or course_name or "", ensure_ascii=False)
+    return f"JSON.parse({_select_courses_iife([target], submit_pattern, token_ttl)})[{key}];"
+
+
+def get_discard_select_token_js(token):
+    """作废页面中尚未领取的选课 token（Python 端等待超时后调用）"""
+    return f"window.__selectWatch && window.__selectWatch.discard({json.dumps(token)});"
 
 
 def get_course_list_js():
@@ -262,3 +528,122 @@ def get_course_list_js():
         return JSON.stringify(courses);
     })();
     """
+
+
+def get_course_delta_js(reset=False):
+    """增量获取课程列表：只返回上次调用以来变化的课程
+
+    页面内用 MutationObserver 记录发生变化的课程行，每次只重新读取这些行；
+    表格结构变化（增删行）时才整表重扫。返回 JSON：
+    {u: 新增或变化的课程, r: 已移除的课程键, reset: 页面端状态是否为新建, n: 课程总数}
+    课程行选择器与选课脚本相同（见 COURSE_ROW_SELECTOR_JS）。
+    """
+    selectors = get_course_selectors()
+    return f"""
+    (function() {{
+        window.__courseSelectors = {json.dumps(selectors, ensure_ascii=False)};
+        {COURSE_ROW_SELECTOR_JS}
+        if (!window.__courseMonitor) {{
+            window.__courseMonitor = (function() {{
+                var rowSelector = window.__courseRowSelector();
+                var known = new Map();  // 课程键 -> 上次发送的 JSON
+                var rowKeys = new WeakMap();  // 课程行 -> 课程键
+                var dirtyRows = new Set();
+                var fullScan = true, fresh = true, observer = null;
+                var observed = [];  // 正在观察的课程表节点
+
+                function describe(row) {{
+                    var nameCell = row.querySelector('.course-name') || row.cells && row.cells[1];
+                    if (!nameCell) return null;
+                    var teacherCell = row.querySelector('.teacher-name') || row.cells && row.cells[2];
+                    var statusCell = row.querySelector('.course-status') || row.cells && row.cells[3];
+                    var selectBtn = row.querySelector('.select-btn') || row.querySelector('button');
+                    var idHolder = row.hasAttribute('data-course-id') ? row : row.querySelector('[data-course-id]');
+                    var info = {{
+                        id: idHolder ? idHolder.getAttribute('data-course-id') : '',
+                        name: nameCell.textContent.trim(),
+                        teacher: teacherCell ? teacherCell.textContent.trim() : '',
+                        status: statusCell ? statusCell.textContent.trim() : '',
+                        available: selectBtn ? !(selectBtn.disabled || selectBtn.classList.contains('disabled')) : false
+                    }};
+                    info.key = info.id || (info.name + '|' + info.teacher);
+                    return info;
+                }}
+
+                function onMutations(records) {{
+                    for (var i = 0; i < records.length; i++) {{
+                        var node = records[i].target;
+                        var el = node.nodeType === 1 ? node : node.parentNode;
+                        var row = el && el.closest(rowSelector);
+                        if (row) {{
+                            dirtyRows.add(row);
+                        }} else {{
+                            fullScan = true;  // 表格结构变化
+                        }}
+                    }}
+                }}
+
+                function update(row, upserts, removed, seen) {{
+                    var info = describe(row);
+                    var oldKey = rowKeys.get(row);
+                    if (!info) return;
+                    if (oldKey && oldKey !== info.key && known.delete(oldKey)) removed.push(oldKey);
+                    rowKeys.set(row, info.key);
+                    if (seen) seen.add(info.key);
+                    var text = JSON.stringify(info);
+                    if (known.get(info.key) !== text) {{
+                        known.set(info.key, text);
+                        upserts.push(info);
+                    }}
+                }}
+
+                function poll(reset) {{
+                    var upserts = [], removed = [], wasFresh = fresh || reset;
+                    if (reset) {{
+                        known.clear();
+                        fullScan = true;
+                    }}
+                    // 整张表被替换（AJAX 搜索、翻页）时旧表已脱离文档，观察器不会再触发，改为整表重扫
+                    if (observed.some(function(node) {{ return !node.isConnected; }})) fullScan = true;
+                    if (fullScan) {{
+                        var seen = new Set(), containers = new Set();
+                        rowSelector = window.__courseRowSelector();
+                        var rows = document.querySelectorAll(rowSelector);
+                        for (var i = 0; i < rows.length; i++) {{
+                            update(rows[i], upserts, removed, seen);
+                            containers.add(rows[i].closest('table') || rows[i].parentNode);
+                        }}
+                        known.forEach(function(_, key) {{
+                            if (!seen.has(key)) removed.push(key);
+                        }});
+                        removed.forEach(function(key) {{ known.delete(key); }});
+                        if (observer) observer.disconnect();
+                        observer = null;
+                        observed = Array.from(containers);
+                        if (containers.size) {{
+                            observer = new MutationObserver(onMutations);
+                            containers.forEach(function(node) {{
+                                observer.observe(node, {{
+                                    childList: true, subtree: true, characterData: true,
+                                    attributes: true, attributeFilter: ['disabled', 'class']
+                                }});
+                            }});
+                            fullScan = false;
+                        }}
+                    }} else {{
+                        dirtyRows.forEach(function(row) {{
+                            if (row.isConnected) update(row, upserts, removed, null);
+                            else fullScan = true;
+                        }});
+                    }}
+                    dirtyRows.clear();
+                    fresh = false;
+                    return JSON.stringify({{u: upserts, r: removed, reset: wasFresh, n: known.size}});
+                }}
+
+                return {{poll: poll}};
+            }})();
+        }}
+        return window.__courseMonitor.poll({'true' if reset else 'false'});
+    }})();
+    """
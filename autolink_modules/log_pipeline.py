@@ -0,0 +1,116 @@
+"""
+日志管道 - 高吞吐量日志子系统
+
+功能：
+- 任意线程写入环形缓冲区（有界内存）
+- 定时器批量刷新到界面日志控件（限制块数）
+- 后台写线程输出结构化（JSON Lines）滚动日志文件
+"""
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+
+
+class _JsonLineFormatter(logging.Formatter):
+    """把日志记录格式化为一行 JSON"""
+
+    def format(self, record):
+        return json.dumps({
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "source": getattr(record, "source", "app"),
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }, ensure_ascii=False)
+
+
+class LogPipeline(QObject):
+    """日志管道 - 环形缓冲 + 批量刷新界面 + 后台滚动文件"""
+
+    # 每次批量刷新后发出最后一条消息，用于状态栏
+    flushed = pyqtSignal(str)
+
+    def __init__(self, widget=None, log_dir=None, buffer_size=5000,
+                 max_blocks=2000, flush_interval=200, max_bytes=2 * 1024 * 1024,
+                 backup_count=5):
+        super().__init__()
+        self.widget = widget
+        self._buffer = deque(maxlen=buffer_size)  # deque.append 本身线程安全
+        self._dropped = 0
+        self._lock = threading.Lock()
+
+        if self.widget is not None:
+            # QPlainTextEdit 超过块数时自动丢弃最早的行
+            self.widget.setMaximumBlockCount(max_blocks)
+
+        # 后台写线程：QueueHandler 只做入队，QueueListener 在独立线程写文件
+        self.log_dir = Path(log_dir) if log_dir else Path.cwd() / "logs"
+        self._file_queue = queue.SimpleQueue()
+        self._logger = logging.getLogger(f"autolink.pipeline.{id(self)}")
+        self._logger.setLevel(logging.DEBUG)
+        self._logger.propagate = False
+        self._listener = None
+        try:
+            self.log_dir.mkdir(parents=True, exist_ok=True)
+            file_handler = logging.handlers.RotatingFileHandler(
+                self.log_dir / "autolink.log", maxBytes=max_bytes,
+                backupCount=backup_count, encoding="utf-8"
+            )
+            file_handler.setFormatter(_JsonLineFormatter())
+            self._logger.addHandler(logging.handlers.QueueHandler(self._file_queue))
+            self._listener = logging.handlers.QueueListener(self._file_queue, file_handler)
+            self._listener.start()
+        except Exception as e:
+            print(f"初始化日志文件失败: {e}")
+
+        self.flush_timer = QTimer(self)
+        self.flush_timer.timeout.connect(self.flush)
+        self.flush_timer.start(flush_interval)
+
+    def log(self, msg, source="app", level=logging.INFO):
+        """写入一条日志（可在任意线程调用）"""
+        msg = str(msg)
+        if len(self._buffer) == self._buffer.maxlen:
+            with self._lock:
+                self._dropped += 1
+        self._buffer.append(msg)
+        self._logger.log(level, msg, extra={"source": source})
+
+    def sink(self, source):
+        """返回绑定了来源的日志函数，便于连接到各模块的 log_message 信号"""
+        return lambda msg: self.log(msg, source)
+
+    def flush(self):
+        """把缓冲区中的日志批量写入界面（仅在 GUI 线程调用）"""
+        if not self._buffer:
+            return
+
+        batch = []
+        while self._buffer:
+            try:
+                batch.append(self._buffer.popleft())
+            except IndexError:
+                break
+
+        with self._lock:
+            dropped, self._dropped = self._dropped, 0
+        if dropped:
+            batch.insert(0, f"⚠️ 日志过多，已丢弃 {dropped} 条（完整记录见日志文件）")
+
+        if self.widget is not None:
+            self.widget.appendPlainText("\n".join(batch))
+        self.flushed.emit(batch[-1])
+
+    def close(self):
+        """停止刷新并等待后台写线程写完"""
+        self.flush_timer.stop()
+        self.flush()
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
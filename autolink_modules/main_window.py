@@ -2,14 +2,15 @@
 import sys, os
 from pathlib import Path
 import json
+import threading
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QLineEdit, QPushButton, QLabel,
-    QComboBox, QTextEdit, QHBoxLayout, QFileDialog, QSizePolicy
+    QComboBox, QPlainTextEdit, QHBoxLayout, QFileDialog, QSizePolicy, QMessageBox
 )
 from PyQt5.QtWebEngineWidgets import QWebEngineView, QWebEnginePage
-from PyQt5.QtCore import QUrl, QTimer
+from PyQt5.QtCore import QUrl, QTimer, pyqtSignal
 from PyQt5.QtGui import QTextOption
-from autolink_modules.config_manager import load_config
+from autolink_modules.config_manager import app_config_service
 from autolink_modules.js_scripts import (
     get_check_login_status_js,
     get_check_login_message_js,
@@ -18,15 +19,24 @@ from autolink_modules.js_scripts import (
     get_check_captcha_js,
     get_captcha_url_js
 )
-from autolink_modules.captcha_handler import CaptchaHandler
-from autolink_modules.jmcomic_logic import JMComicWidget
+from autolink_modules.html_recorder import HTMLRecorder
+from autolink_modules.log_pipeline import LogPipeline
+from autolink_modules.network_capture import NetworkCapture
+from autolink_modules.persistence import default_writer
 
 class CustomWebEnginePage(QWebEnginePage):
     """自定义页面类，禁止创建新窗口"""
+
+    console_message = pyqtSignal(str)  # 页面控制台输出（注入脚本借此主动推送数据）
+
     def createWindow(self, _type):
         """禁止创建新窗口，所有链接都在当前页面打开"""
         return None
 
+    def javaScriptConsoleMessage(self, level, message, line, source):
+        self.console_message.emit(message)
+        super().javaScriptConsoleMessage(level, message, line, source)
+
 
 class AutoLoginWindow(QWidget):
     def __init__(self):
@@ -108,10 +118,13 @@ class AutoLoginWindow(QWidget):
         self.start_record_btn = QPushButton("🎬 开始录制操作")
         self.stop_record_btn = QPushButton("⏹ 停止录制")
         self.stop_record_btn.setEnabled(False)
+        self.network_btn = QPushButton("🌐 网络抓包")
+        self.network_btn.setCheckable(True)
         
         right_layout.addWidget(self.save_html_btn)
         right_layout.addWidget(self.start_record_btn)
         right_layout.addWidget(self.stop_record_btn)
+        right_layout.addWidget(self.network_btn)
         
         # JMComic爬虫按钮
         self.jmcomic_btn = QPushButton("JMComic爬虫")
@@ -123,7 +136,7 @@ class AutoLoginWindow(QWidget):
 
         # 日志区域
         right_layout.addWidget(QLabel("日志:"))
-        self.log_area = QTextEdit()
+        self.log_area = QPlainTextEdit()
         self.log_area.setReadOnly(True)
         self.log_area.setMinimumWidth(300)
         self.log_area.setWordWrapMode(QTextOption.WrapAtWordBoundaryOrAnywhere)
@@ -134,15 +147,22 @@ class AutoLoginWindow(QWidget):
 
         self.setLayout(main_layout)
 
+        # 日志管道：批量刷新到日志区域，同时写滚动日志文件
+        self.log_pipeline = LogPipeline(self.log_area)
+        self.log_pipeline.flushed.connect(self.status_label.setText)
+
         # --- State and Timers ---
         self._auto_active = False
         self._manual_login_active = False
         self._is_ongoing_login = False
         self._auto_index = 0
         self._url_index = 0
-        self._retry_limit = 6
+        self._retry_limit = 6  # None 表示无限重试（配置 max_retries 为 0）
         self._login_phase = 'vpn'
         self._local_auth_url = 'http://192.168.200.100/'
+        # 配置服务：缓存解析结果，scripts/config.json 变化时通知 _on_config_changed
+        self.config_service = app_config_service()
+        self._config = None
 
         self.status_check_timer = QTimer(self)
         self.status_check_timer.timeout.connect(self.check_login_status)
@@ -153,12 +173,22 @@ class AutoLoginWindow(QWidget):
         self._captcha_poll_attempts = 0
         self._captcha_poll_max_attempts = 10
 
-        # 验证码处理器
-        self.captcha_handler = CaptchaHandler()
+        # 验证码处理器（ONNX 模型较重，窗口显示后在后台加载）
+        self._captcha_handler = None
+        self._captcha_lock = threading.Lock()
+        # 抢课管理器（首次使用时创建）
+        self._course_grabber_manager = None
+        # JMComic 下载队列和 PDF 生成阶段（首次打开下载对话框时创建）
+        self._jmcomic_queue = None
+        self._pdf_stage = None
         
         # HTML 录制器
-        # self.html_recorder = HTMLRecorder(self.webview)
-        # self.html_recorder.log_message.connect(self._log)
+        self.html_recorder = HTMLRecorder(self.webview)
+        self.html_recorder.log_message.connect(self.log_pipeline.sink("recorder"))
+        self.html_recorder.selectors_suggested.connect(self._confirm_course_selectors)
+        # 网络抓包（按钮切换，关闭时导出 HAR）
+        self.network_capture = NetworkCapture(self.webview, self.html_recorder.output_dir / "har")
+        self.network_capture.log_message.connect(self.log_pipeline.sink("network"))
         
         # --- Connections ---
         self._load_config()
@@ -170,21 +200,50 @@ class AutoLoginWindow(QWidget):
         self.save_html_btn.clicked.connect(self.on_save_html)
         self.start_record_btn.clicked.connect(self.on_start_recording)
         self.stop_record_btn.clicked.connect(self.on_stop_recording)
+        self.network_btn.toggled.connect(self.network_capture.set_enabled)
         self.webview.loadFinished.connect(self.on_load_finished)
-        self.log_area.textChanged.connect(self.debug_log_area_size)
-        
-        # 检查 resources/jmcomic/option.yml 是否存在
-        jmcomic_option_path = os.path.join(os.path.dirname(__file__), '../resources/jmcomic/option.yml')
-        jmcomic_enabled = os.path.exists(jmcomic_option_path)
 
-        # 如果 option.yml 不存在，不显示 JMComic 按钮
-        if not jmcomic_enabled:
-            self.jmcomic_btn.hide()
-        else:
-            self.jmcomic_btn.clicked.connect(self.show_jmcomic_window)
+        # 事件循环开始后（窗口已显示）再在后台预加载验证码模型
+        QTimer.singleShot(0, self._preload_captcha_handler)
+
+    def _preload_captcha_handler(self):
+        """后台线程预加载验证码模型"""
+        threading.Thread(target=lambda: self.captcha_handler, daemon=True).start()
+
+    @property
+    def captcha_handler(self):
+        """验证码处理器，首次访问时创建（后台预加载未完成时会等待）"""
+        with self._captcha_lock:
+            if self._captcha_handler is None:
+                from autolink_modules.captcha_handler import CaptchaHandler
+                self._captcha_handler = CaptchaHandler()
+            return self._captcha_handler
+
+    @property
+    def course_grabber_manager(self):
+        """抢课管理器，首次使用时才导入并创建"""
+        if self._course_grabber_manager is None:
+            from autolink_modules.course_grabber import CourseGrabberManager
+            self._course_grabber_manager = CourseGrabberManager(
+                self.webview, log_sink=self.log_pipeline.sink("grabber")
+            )
+            self._course_grabber_manager.load_config()
+        return self._course_grabber_manager
 
     def show_jmcomic_window(self):
-        dialog = JMComicWidget(self)
+        from autolink_modules.jmcomic_logic import JMComicWidget, get_option, jmcomic_options
+        if self._jmcomic_queue is None:
+            # 下载队列随主窗口存在，关闭对话框后继续下载
+            from autolink_modules.download_manifest import DownloadManifest
+            from autolink_modules.jmcomic_queue import JMComicDownloadQueue
+            from autolink_modules.pdf_stage import PdfStage
+            manifest = DownloadManifest()
+            # PDF 在独立进程池中生成，不占用下载线程
+            self._pdf_stage = PdfStage(jmcomic_options.pdf_settings, max_workers=2, manifest=manifest)
+            self._pdf_stage.log_message.connect(self.log_pipeline.sink("jmcomic"))
+            self._jmcomic_queue = JMComicDownloadQueue(get_option, manifest=manifest, pdf_stage=self._pdf_stage)
+            self._jmcomic_queue.log_message.connect(self.log_pipeline.sink("jmcomic"))
+        dialog = JMComicWidget(self, log_sink=self.log_pipeline.sink("jmcomic"), download_queue=self._jmcomic_queue)
         dialog.exec_()
 
     def on_load_finished(self, ok):
@@ -315,21 +374,49 @@ class AutoLoginWindow(QWidget):
         self.webview.setUrl(QUrl(self._local_auth_url))
 
     def _load_config(self):
-        """加载配置文件"""
-        try:
-            cfg = load_config(Path.cwd())
+        """加载配置文件，之后文件变化时自动应用（无需重启）"""
+        cfg = self.config_service.value
+        if cfg is None:
+            self.status_label.setText(f"加载配置失败：{self.config_service.error}")
+        else:
             self.username_edit.setText(cfg.username)
-
-            self.vpn_password_edit.setText(getattr(cfg, 'vpn_password', ''))
-            self.local_password_edit.setText(getattr(cfg, 'local_password', ''))
-
-            self.url_combo.clear()
-            for u in cfg.server_url:
-                self.url_combo.addItem(u)
+            self.vpn_password_edit.setText(cfg.vpn_password)
+            self.local_password_edit.setText(cfg.local_password)
+            self._apply_config(cfg)
             if cfg.server_url:
                 self.webview.setUrl(QUrl(cfg.server_url[0]))
-        except Exception as e:
-            self.status_label.setText(f"加载配置失败：{e}")
+        self._config = cfg
+        self.config_service.subscribe(self._on_config_changed, call_now=False)
+        self.config_service.load_failed.connect(
+            lambda error: self._log(f"⚠️ 配置文件有误，继续使用之前的配置：{error}")
+        )
+
+    def _apply_config(self, cfg):
+        """应用登录地址列表和重试上限（自动重试每一步都重新读取，运行中修改也会生效）"""
+        current = self.url_combo.currentText()
+        self.url_combo.clear()
+        self.url_combo.addItems(cfg.server_url)
+        if current in cfg.server_url:
+            self.url_combo.setCurrentText(current)
+        # 0 表示无限重试，热更新改回 0 时也要生效
+        self._retry_limit = cfg.max_retries if cfg.max_retries > 0 else None
+
+    def _retry_limit_text(self):
+        return "不限" if self._retry_limit is None else f"{self._retry_limit} 次"
+
+    def _on_config_changed(self, cfg):
+        """配置文件被修改：界面上没有手动改过的账号密码一并更新"""
+        old = self._config
+        for edit, old_value, new_value in (
+            (self.username_edit, old.username if old else "", cfg.username),
+            (self.vpn_password_edit, old.vpn_password if old else "", cfg.vpn_password),
+            (self.local_password_edit, old.local_password if old else "", cfg.local_password),
+        ):
+            if edit.text() == old_value:
+                edit.setText(new_value)
+        self._apply_config(cfg)
+        self._config = cfg
+        self._log(f"🔄 配置文件已更新：{len(cfg.server_url)} 个登录地址，重试上限 {self._retry_limit_text()}")
 
     def login_once(self):
         """手动触发单次登录"""
@@ -411,7 +498,7 @@ class AutoLoginWindow(QWidget):
         """开始自动重试"""
         if self._auto_active:
             return
-        self._log(f"开始智能自动重试 (上限 {self._retry_limit} 次)...")
+        self._log(f"开始智能自动重试 (上限 {self._retry_limit_text()})...")
         self._is_ongoing_login = True
         self._auto_active = True
         self.auto_btn.setEnabled(False)
@@ -426,7 +513,7 @@ class AutoLoginWindow(QWidget):
         if not self._auto_active:
             return
 
-        if self._auto_index >= self._retry_limit:
+        if self._retry_limit is not None and self._auto_index >= self._retry_limit:
             self._log(f"已达到最大重试次数 ({self._retry_limit})，停止重试。")
             self.stop_auto_retry()
             return
@@ -442,7 +529,7 @@ class AutoLoginWindow(QWidget):
             
             self._url_index = self._auto_index % len(vpn_urls)
             current_url = vpn_urls[self._url_index]
-            self._log(f"VPN阶段 - 第 {self._auto_index + 1}/{self._retry_limit} 次尝试: 目标 {current_url}")
+            self._log(f"VPN阶段 - 第 {self._auto_index + 1}/{self._retry_limit or '∞'} 次尝试: 目标 {current_url}")
             self.webview.setUrl(QUrl(current_url))
             self._auto_index += 1
         else:
@@ -461,9 +548,15 @@ class AutoLoginWindow(QWidget):
         self._log("已停止所有登录活动。")
 
     def _log(self, msg: str):
-        """记录日志"""
-        self.status_label.setText(msg)
-        self.log_area.append(msg)
+        """记录日志（经日志管道批量刷新到界面和日志文件）"""
+        self.log_pipeline.log(msg, "main")
+
+    def closeEvent(self, event):
+        """关闭窗口时停止 PDF 进程池，刷新剩余日志并停止后台写线程"""
+        if self._pdf_stage is not None:
+            self._pdf_stage.shutdown()
+        self.log_pipeline.close()
+        super().closeEvent(event)
 
     def save_credentials(self):
         """保存凭证到文件"""
@@ -476,8 +569,7 @@ class AutoLoginWindow(QWidget):
             return
         try:
             # 直接保存到 scripts/config.json，不弹窗
-            cfg_path = Path.cwd() / "scripts" / "config.json"
-            cfg_path.parent.mkdir(parents=True, exist_ok=True)
+            cfg_path = self.config_service.path
             
             urls = [self.url_combo.itemText(i) for i in range(self.url_combo.count())]
             # 移除保存逻辑中的 password 字段，仅保留 vpn_password 和 local_password
@@ -486,11 +578,15 @@ class AutoLoginWindow(QWidget):
                 "vpn_password": vpn_password,
                 "local_password": local_password,
                 "server_url": urls,
-                "retry_interval_secs": 5,
-                "max_retries": 0
+                "retry_interval_secs": self._config.retry_interval_secs if self._config else 5,
+                "max_retries": self._config.max_retries if self._config else 0
             }
-            with open(cfg_path, "w", encoding="utf-8") as f:
-                json.dump(config_data, f, ensure_ascii=False, indent=4)
+            writer = default_writer()
+            writer.save(cfg_path, config_data)
+            # 后台写线程写入后才报告结果，写入失败时 flush 抛出异常
+            if not writer.flush(cfg_path):
+                self._log(f"保存超时，账号密码尚未写入 {cfg_path}")
+                return
             self._log(f"账号密码已保存到 {cfg_path}")
         except Exception as e:
             self._log(f"保存失败：{e}")
@@ -524,25 +620,41 @@ class AutoLoginWindow(QWidget):
         """已禁用的调整大小回调"""
         pass
 
-    def debug_log_area_size(self):
-        pass
-    
     # === 抢课辅助功能 ===
     
     def on_save_html(self):
         """保存当前页面 HTML"""
-        self.log("开始保存当前页面 HTML...")
+        self._log("开始保存当前页面 HTML...")
         self.html_recorder.save_current_html()
     
     def on_start_recording(self):
-        """开始录制操作"""
+        """开始录制操作（同时录制页面 DOM 变更）"""
         self.html_recorder.start_recording_actions()
+        self.html_recorder.dom_recorder.start()
         self.start_record_btn.setEnabled(False)
         self.stop_record_btn.setEnabled(True)
     
+    def _confirm_course_selectors(self, selectors):
+        """录制识别出选课脚本选择器后，由用户确认是否写入 scripts/course_selectors.json"""
+        from autolink_modules.selector_engine import write_course_selectors
+        text = "\n".join(f"{role}: {selector}" for role, selector in selectors.items())
+        answer = QMessageBox.question(
+            self, "更新选课选择器",
+            f"录制中识别出以下选择器，是否写入 course_selectors.json 供选课脚本使用？\n\n{text}"
+        )
+        if answer != QMessageBox.Yes:
+            self._log("已忽略识别出的选课选择器")
+            return
+        try:
+            path = write_course_selectors(selectors)
+            self._log(f"🧩 选课脚本选择器已更新: {path}")
+        except (OSError, ValueError) as e:
+            self._log(f"❌ 写入选课选择器失败: {e}")
+
     def on_stop_recording(self):
         """停止录制操作"""
         self.html_recorder.stop_recording_and_save()
+        self.html_recorder.dom_recorder.stop()
         self.start_record_btn.setEnabled(True)
         self.stop_record_btn.setEnabled(False)
 
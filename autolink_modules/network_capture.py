@@ -0,0 +1,303 @@
+"""
+网络抓包 - 记录浏览器每个请求的类型、大小和耗时，导出 HAR
+
+功能：
+- 在浏览器 profile 上安装请求拦截器，记录请求方法、URL 和资源类型
+- 页面加载完成后（以及之后定时）从 Resource Timing 取回各请求的耗时分段和大小
+- 请求和页面记录都有上限，长时间开启也不会无限占用内存
+- 可随时开启/关闭，关闭时自动导出 HAR 到 recorded_sessions/har/
+- 每次页面加载后输出最慢、最大的资源，便于决定自动流程屏蔽或预取哪些资源
+
+说明：QtWebEngine 5.15 的 Resource Timing 不提供响应状态码，HAR 中的 status 为 0；
+跨域资源未返回 Timing-Allow-Origin 时只有总耗时，没有分段和大小。
+"""
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from PyQt5.QtWebEngineCore import QWebEngineUrlRequestInterceptor
+from PyQt5.QtWebEngineWidgets import QWebEngineScript
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+import json
+import time
+
+# QWebEngineUrlRequestInfo.ResourceType
+RESOURCE_TYPES = {
+    0: "document", 1: "subframe", 2: "stylesheet", 3: "script", 4: "image", 5: "font",
+    6: "other", 7: "object", 8: "media", 9: "worker", 10: "sharedworker", 11: "prefetch",
+    12: "favicon", 13: "xhr", 14: "ping", 15: "serviceworker", 16: "csp_report", 17: "plugin",
+    19: "document", 20: "subframe",
+}
+
+# 文档创建时注入：放大 Resource Timing 缓冲（默认只有 250 条）
+_BUFFER_JS = """
+if (window.performance && performance.setResourceTimingBufferSize) {
+    performance.setResourceTimingBufferSize(%d);
+}
+"""
+
+# 取回尚未取过的计时记录，取完清空缓冲
+_COLLECT_JS = """
+(function() {
+    var fields = ['name', 'initiatorType', 'startTime', 'duration', 'redirectStart', 'redirectEnd',
+                  'domainLookupStart', 'domainLookupEnd', 'connectStart', 'connectEnd',
+                  'secureConnectionStart', 'requestStart', 'responseStart', 'responseEnd',
+                  'transferSize', 'encodedBodySize', 'decodedBodySize', 'responseStatus', 'nextHopProtocol',
+                  'domContentLoadedEventEnd', 'loadEventEnd'];
+    function pick(e) {
+        var out = {};
+        fields.forEach(function(f) { if (e[f] !== undefined) out[f] = e[f]; });
+        return out;
+    }
+    var nav = null;
+    if (!window.__netCaptureNavTaken) {
+        var navs = performance.getEntriesByType('navigation');
+        if (navs.length && navs[0].loadEventEnd > 0) {
+            nav = pick(navs[0]);
+            window.__netCaptureNavTaken = true;
+        }
+    }
+    var resources = performance.getEntriesByType('resource').map(pick);
+    performance.clearResourceTimings();
+    return JSON.stringify({
+        url: location.href, title: document.title, origin: performance.timeOrigin,
+        nav: nav, resources: resources
+    });
+})();
+"""
+
+
+class _RequestInterceptor(QWebEngineUrlRequestInterceptor):
+    """在网络线程中记录请求（只追加到有界队列，不做其他处理）"""
+
+    def __init__(self, requests):
+        super().__init__()
+        self.requests = requests
+
+    def interceptRequest(self, info):
+        self.requests.append((
+            time.monotonic(),
+            info.requestUrl().toString(),
+            bytes(info.requestMethod()).decode("ascii", "replace"),
+            RESOURCE_TYPES.get(int(info.resourceType()), "other"),
+        ))
+
+
+def _ms(value):
+    return round(max(value, 0.0), 3)
+
+
+def _elapsed(r):
+    """请求耗时；导航记录的 duration 包含到 load 事件为止的页面处理，这里只算到响应结束"""
+    if r.get("responseEnd"):
+        return _ms(r["responseEnd"] - r.get("startTime", 0.0))
+    return _ms(r.get("duration", 0.0))
+
+
+def _har_timings(r):
+    """Resource Timing → HAR timings（无分段数据时全部计入 wait）"""
+    duration = _elapsed(r)
+    if not r.get("requestStart"):
+        return {"blocked": -1, "dns": -1, "connect": -1, "ssl": -1, "send": 0, "wait": duration, "receive": 0}
+    dns = _ms(r.get("domainLookupEnd", 0) - r.get("domainLookupStart", 0))
+    connect = _ms(r.get("connectEnd", 0) - r.get("connectStart", 0))
+    ssl = _ms(r.get("connectEnd", 0) - r["secureConnectionStart"]) if r.get("secureConnectionStart") else -1
+    wait = _ms(r.get("responseStart", 0) - r["requestStart"])
+    receive = _ms(r.get("responseEnd", 0) - r.get("responseStart", 0))
+    blocked = _ms(duration - dns - connect - wait - receive)
+    return {"blocked": blocked, "dns": dns, "connect": connect, "ssl": ssl,
+            "send": 0, "wait": wait, "receive": receive}
+
+
+def _iso(ms_timestamp):
+    return datetime.fromtimestamp(ms_timestamp / 1000, timezone.utc).isoformat(timespec="milliseconds")
+
+
+class NetworkCapture(QObject):
+    """网络抓包（在 GUI 线程使用）"""
+
+    log_message = pyqtSignal(str)
+    page_summary = pyqtSignal(dict)
+
+    PENDING_TIMEOUT = 30  # 秒，拦截到的请求超过该时间仍无计时记录则不再等待
+
+    def __init__(self, webview, output_dir=None, max_entries=5000, max_pages=100,
+                 collect_interval=3000, top_n=5):
+        super().__init__()
+        self.webview = webview
+        self.profile = webview.page().profile()
+        self.output_dir = Path(output_dir) if output_dir else Path.cwd() / "recorded_sessions" / "har"
+        self.top_n = top_n
+        self.enabled = False
+        self.entries = deque(maxlen=max_entries)  # HAR entries
+        self.pages = deque(maxlen=max_pages)  # HAR pages
+        self._requests = deque(maxlen=max_entries)  # 拦截器记录 (时间, url, method, type)，网络线程写入
+        self._interceptor = _RequestInterceptor(self._requests)
+        self._page_id = None
+        self._timer = QTimer(self)
+        self._timer.setInterval(collect_interval)
+        self._timer.timeout.connect(self.collect)
+
+        self._script = QWebEngineScript()
+        self._script.setName("autolink_network_capture")
+        self._script.setSourceCode(_BUFFER_JS % max_entries)
+        self._script.setInjectionPoint(QWebEngineScript.DocumentCreation)
+        self._script.setWorldId(QWebEngineScript.MainWorld)
+        self._script.setRunsOnSubFrames(False)
+
+    def set_enabled(self, enabled):
+        """开启或关闭抓包；关闭时导出 HAR"""
+        if enabled == self.enabled:
+            return
+        self.enabled = enabled
+        if enabled:
+            self.entries.clear()
+            self.pages.clear()
+            self._requests.clear()
+            self._page_id = None
+            self.profile.scripts().insert(self._script)
+            self.profile.setUrlRequestInterceptor(self._interceptor)
+            self.webview.loadFinished.connect(self._on_load_finished)
+            self._timer.start()
+            self.log_message.emit("🌐 已开启网络抓包（从下一次页面加载开始记录完整计时）")
+            return
+
+        self._timer.stop()
+        self.webview.loadFinished.disconnect(self._on_load_finished)
+        self.profile.setUrlRequestInterceptor(None)
+        self.profile.scripts().remove(self._script)
+        self.collect()
+        # 取回是异步的，稍后再导出
+        QTimer.singleShot(300, self._export_on_stop)
+
+    def _export_on_stop(self):
+        try:
+            path = self.export_har()
+            self.log_message.emit(f"🌐 网络抓包已关闭，共 {len(self.entries)} 个请求，HAR: {path}")
+        except OSError as e:
+            self.log_message.emit(f"❌ 导出 HAR 失败: {e}")
+
+    def _on_load_finished(self, ok):
+        # 等待 load 事件之后的零星请求
+        if ok:
+            QTimer.singleShot(500, self.collect)
+
+    def collect(self):
+        self.webview.page().runJavaScript(_COLLECT_JS, self._on_collected)
+
+    def _take_requests(self):
+        """取出拦截器记录，按 URL 分组：{url: deque([(时间, method, type)])}"""
+        by_url = {}
+        while True:
+            try:
+                at, url, method, kind = self._requests.popleft()
+            except IndexError:
+                break
+            by_url.setdefault(url, deque()).append((at, method, kind))
+        return by_url
+
+    def _on_collected(self, data):
+        if not data:
+            return
+        try:
+            batch = json.loads(data)
+        except ValueError:
+            return
+        requests = self._take_requests()
+        new_entries = []
+        nav = batch.get("nav")
+        if nav or self._page_id is None:
+            self._page_id = f"page_{len(self.pages) + 1}_{int(batch['origin'])}"
+            timings = {"onContentLoad": _ms(nav.get("domContentLoadedEventEnd", 0)) if nav else -1,
+                       "onLoad": _ms(nav.get("loadEventEnd", 0)) if nav else -1}
+            self.pages.append({
+                "startedDateTime": _iso(batch["origin"]), "id": self._page_id,
+                "title": batch.get("title") or batch.get("url", ""), "pageTimings": timings,
+            })
+        if nav:
+            new_entries.append(self._entry(batch["origin"], nav, requests, "document"))
+        for resource in batch.get("resources", []):
+            new_entries.append(self._entry(batch["origin"], resource, requests))
+        # 没有对应计时记录的请求：可能仍在进行中，放回队列；超时的（被取消、跨进程子框架等）只记录请求
+        now = time.monotonic()
+        for url, items in requests.items():
+            for at, method, kind in items:
+                if now - at < self.PENDING_TIMEOUT:
+                    self._requests.append((at, url, method, kind))
+                else:
+                    pending = {url: deque([(at, method, kind)])}
+                    new_entries.append(self._entry(time.time() * 1000, {"name": url}, pending))
+        self.entries.extend(new_entries)
+
+        if nav and new_entries:
+            self._summarize(batch, nav, new_entries)
+
+    def _entry(self, origin, r, requests, kind=None):
+        url = r.get("name", "")
+        method, req_kind = "GET", r.get("initiatorType") or "other"
+        pending = requests.get(url)
+        if pending:
+            _, method, req_kind = pending.popleft()
+            if not pending:
+                del requests[url]
+        size = int(r.get("transferSize") or 0)
+        body = int(r.get("encodedBodySize") or 0)
+        return {
+            "pageref": self._page_id,
+            "startedDateTime": _iso(origin + r.get("startTime", 0.0)),
+            "time": _elapsed(r),
+            "request": {
+                "method": method, "url": url, "httpVersion": r.get("nextHopProtocol") or "",
+                "cookies": [], "headers": [], "queryString": [], "headersSize": -1, "bodySize": -1,
+            },
+            "response": {
+                "status": int(r.get("responseStatus") or 0), "statusText": "",
+                "httpVersion": r.get("nextHopProtocol") or "", "cookies": [], "headers": [],
+                "content": {"size": int(r.get("decodedBodySize") or 0), "mimeType": ""},
+                "redirectURL": "", "headersSize": -1, "bodySize": body or -1,
+            },
+            "cache": {},
+            "timings": _har_timings(r),
+            "_resourceType": kind or req_kind,
+            "_transferSize": size,
+        }
+
+    def _summarize(self, batch, nav, entries):
+        """输出本次页面加载的请求数、总大小、最慢和最大的资源"""
+        total = sum(e["_transferSize"] for e in entries)
+        slowest = sorted(entries, key=lambda e: e["time"], reverse=True)[:self.top_n]
+        largest = sorted(entries, key=lambda e: e["_transferSize"], reverse=True)[:self.top_n]
+        largest = [e for e in largest if e["_transferSize"]]
+        summary = {
+            "url": batch.get("url", ""), "requests": len(entries), "bytes": total,
+            "on_load_ms": _ms(nav.get("loadEventEnd", 0)),
+            "slowest": [(e["request"]["url"], e["_resourceType"], e["time"]) for e in slowest],
+            "largest": [(e["request"]["url"], e["_resourceType"], e["_transferSize"]) for e in largest],
+        }
+        self.page_summary.emit(summary)
+
+        short = lambda url: url.split("?", 1)[0].rsplit("/", 1)[-1][:40] or url[:40]
+        self.log_message.emit(
+            f"🌐 {summary['url'][:60]}: {len(entries)} 个请求，{total / 1024:.0f} KB，"
+            f"load {summary['on_load_ms']:.0f} ms"
+        )
+        self.log_message.emit("   最慢: " + "，".join(
+            f"{short(url)}({kind}) {ms:.0f} ms" for url, kind, ms in summary["slowest"]))
+        if summary["largest"]:
+            self.log_message.emit("   最大: " + "，".join(
+                f"{short(url)}({kind}) {size / 1024:.0f} KB" for url, kind, size in summary["largest"]))
+
+    def to_har(self):
+        return {"log": {
+            "version": "1.2",
+            "creator": {"name": "autolink", "version": "1.0"},
+            "pages": list(self.pages),
+            "entries": sorted(self.entries, key=lambda e: e["startedDateTime"]),
+        }}
+
+    def export_har(self, path=None):
+        """导出 HAR，默认写入 recorded_sessions/har/network_<时间>.har"""
+        if path is None:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            path = self.output_dir / f"network_{time.strftime('%Y%m%d_%H%M%S')}.har"
+        Path(path).write_text(json.dumps(self.to_har(), ensure_ascii=False), encoding="utf-8")
+        return Path(path)
@@ -0,0 +1,128 @@
+"""
+PDF 生成阶段 - 章节下载完成后在独立进程池中生成 PDF
+
+功能：
+- 下载线程只把章节提交到队列，PDF 在子进程中生成，图片解码和写文件不再与下载线程争用 GIL
+- 独立的并发上限（同时生成的 PDF 数），与下载的线程数互不影响
+- 排队数量有上限，超过时提交方等待（背压），避免 PDF 远远落后于下载
+- 生成完成后记录到下载清单，并通过信号输出日志
+- PDF 的输出位置沿用 option.yml 中 img2pdf 插件的 pdf_dir 和 filename_rule
+
+生成逻辑见 pdf_writer（逐页写入，内存中只保留一页）。
+"""
+from PyQt5.QtCore import QObject, pyqtSignal
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+import multiprocessing
+import os
+import threading
+import time
+
+from autolink_modules.pdf_writer import build_pdf
+
+# img2pdf 插件 filename_rule 对应的章节属性
+_PDF_NAME_RULES = {"Pid": "photo_id", "Aid": "album_id", "Ptitle": "name"}
+
+
+def pdf_target(settings, photo):
+    """按插件配置（kwargs）计算章节 PDF 的路径"""
+    attr = _PDF_NAME_RULES.get(settings.get("filename_rule", "Pid"), "photo_id")
+    return Path(os.path.expandvars(settings.get("pdf_dir", ""))) / f"{getattr(photo, attr, '')}.pdf"
+
+
+class PdfStage(QObject):
+    """PDF 生成队列（任意线程可提交，进程池在首次提交时创建）"""
+
+    log_message = pyqtSignal(str)
+    pdf_done = pyqtSignal(str, str)  # photo_id, PDF 路径
+
+    def __init__(self, settings_factory, max_workers=2, max_pending=32, manifest=None):
+        super().__init__()
+        self.settings_factory = settings_factory  # 返回 img2pdf 插件 kwargs，未开启 PDF 时返回 None
+        self.max_workers = max(1, max_workers)
+        self.manifest = manifest
+        self._slots = threading.BoundedSemaphore(max(1, max_pending))
+        self._executor = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self._inflight = set()  # 排队或生成中的章节 ID
+
+    def _pool(self):
+        """进程池（已关闭时返回 None，关闭后不再重新创建）"""
+        with self._lock:
+            if self._closed:
+                return None
+            if self._executor is None:
+                # spawn：子进程不继承下载线程和 Qt 对象的状态；子进程会重新导入主模块，
+                # app.py 只在 __main__ 中导入界面，并调用 freeze_support 以支持打包后的 exe
+                self._executor = ProcessPoolExecutor(
+                    self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def settings(self):
+        """当前的 PDF 配置（None 表示只下载图片）"""
+        return self.settings_factory()
+
+    def submit(self, album_id, photo, image_dir, settings=None):
+        """提交一个章节，返回 PDF 路径；未开启 PDF、已在队列中或已关闭时返回 None
+
+        排队已满时阻塞到有空位为止，不要在 GUI 线程中调用。
+        """
+        settings = settings if settings is not None else self.settings()
+        photo_id = str(photo.photo_id)
+        with self._lock:
+            if not settings or self._closed or photo_id in self._inflight:
+                return None
+            self._inflight.add(photo_id)
+        pdf_path = pdf_target(settings, photo)
+        self._slots.acquire()
+        try:
+            pool = self._pool()
+            if pool is None:
+                raise RuntimeError("PDF 进程池已关闭")
+            future = pool.submit(build_pdf, str(image_dir), str(pdf_path))
+        except RuntimeError:  # 进程池已关闭（可能在等待空位时被关闭）
+            self._slots.release()
+            with self._lock:
+                self._inflight.discard(photo_id)
+            return None
+        future.add_done_callback(partial(self._finished, str(album_id), photo_id, pdf_path, time.monotonic()))
+        return pdf_path
+
+    @property
+    def pending(self):
+        """排队或生成中的章节数"""
+        return len(self._inflight)
+
+    def _finished(self, album_id, photo_id, pdf_path, started, future):
+        self._slots.release()
+        try:
+            self._report(album_id, photo_id, pdf_path, started, future)
+        finally:
+            with self._lock:
+                self._inflight.discard(photo_id)
+
+    def _report(self, album_id, photo_id, pdf_path, started, future):
+        if future.cancelled():
+            return
+        try:
+            result = future.result()
+        except Exception as e:
+            self.log_message.emit(f"❌ 本子 {album_id} 章节 {photo_id} 生成 PDF 失败: {e}")
+            return
+        if self.manifest is not None:
+            self.manifest.record_pdf(photo_id, pdf_path)
+        self.pdf_done.emit(photo_id, str(pdf_path))
+        self.log_message.emit(
+            f"📄 PDF 已生成: {pdf_path.name}（{result['pages']} 页，{result['bytes'] / 1048576:.1f} MB，"
+            f"用时 {time.monotonic() - started:.1f} 秒）"
+        )
+
+    def shutdown(self, wait=False):
+        """关闭进程池，未开始的任务直接丢弃（下次下载同一本子时补生成）"""
+        with self._lock:
+            self._closed = True
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,146 @@
+"""
+流式 PDF 写入 - 把一个目录中的图片逐页写成 PDF
+
+功能：
+- 每页写完即落盘，内存中只保留当前一页（不会把整章图片读入内存）
+- JPEG 原样嵌入（DCTDecode），不解码、不重新压缩
+- 其他格式（webp、png 等）用 Pillow 解码后以 JPEG 写入
+- 先写临时文件，完成后改名，中断时不会留下半个 PDF
+- 页面尺寸与 img2pdf 默认一致（按 96 DPI 换算）
+
+本模块不依赖 Qt，供 pdf_stage 的进程池在子进程中调用。
+"""
+from io import BytesIO
+from pathlib import Path
+import os
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp", ".tif", ".tiff"}
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+_COLOR_SPACES = {1: "/DeviceGray", 3: "/DeviceRGB"}
+_POINTS_PER_PIXEL = 72 / 96
+
+
+def jpeg_info(data):
+    """从 JPEG 帧头读取 (宽, 高, 颜色分量数)，不是有效 JPEG 时返回 None"""
+    if data[:2] != b"\xff\xd8":
+        return None
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker in _SOF_MARKERS:
+            height = int.from_bytes(data[i + 5:i + 7], "big")
+            width = int.from_bytes(data[i + 7:i + 9], "big")
+            return width, height, data[i + 9]
+        i += 2 + int.from_bytes(data[i + 2:i + 4], "big")
+    return None
+
+
+class StreamingPdfWriter:
+    """逐页写入的 PDF（对象编号 1 为 Catalog，2 为 Pages，页面对象在最后汇总）"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp = self.path.with_name(f".{self.path.name}.tmp")
+        self._file = open(self._tmp, "wb")
+        self._offsets = {}
+        self._pages = []
+        self._next_id = 3
+        self._file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    @property
+    def page_count(self):
+        return len(self._pages)
+
+    def _object(self, obj_id, body, stream=None):
+        self._offsets[obj_id] = self._file.tell()
+        self._file.write(f"{obj_id} 0 obj\n".encode("ascii") + body)
+        if stream is not None:
+            self._file.write(b"\nstream\n" + stream + b"\nendstream")
+        self._file.write(b"\nendobj\n")
+
+    def _new_ids(self, count):
+        first = self._next_id
+        self._next_id += count
+        return range(first, first + count)
+
+    def add_jpeg(self, data, width, height, components=3):
+        """添加一页 JPEG 图片（数据原样写入）"""
+        image_id, content_id, page_id = self._new_ids(3)
+        page_w = round(width * _POINTS_PER_PIXEL, 2)
+        page_h = round(height * _POINTS_PER_PIXEL, 2)
+        self._object(image_id, (
+            f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+            f"/ColorSpace {_COLOR_SPACES[components]} /BitsPerComponent 8 /Filter /DCTDecode "
+            f"/Length {len(data)} >>"
+        ).encode("ascii"), data)
+        content = f"q {page_w} 0 0 {page_h} 0 0 cm /Im0 Do Q".encode("ascii")
+        self._object(content_id, f"<< /Length {len(content)} >>".encode("ascii"), content)
+        self._object(page_id, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {page_w} {page_h}] "
+            f"/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode("ascii"))
+        self._pages.append(page_id)
+
+    def add_image_file(self, path, quality=90):
+        """添加一页图片文件：JPEG 直接嵌入，其他格式解码后转为 JPEG"""
+        data = Path(path).read_bytes()
+        info = jpeg_info(data)
+        if info and info[2] in _COLOR_SPACES:
+            self.add_jpeg(data, *info)
+            return
+        from PIL import Image
+
+        with Image.open(BytesIO(data)) as image:
+            image = image.convert("L" if image.mode in ("1", "L") else "RGB")
+            buffer = BytesIO()
+            image.save(buffer, "JPEG", quality=quality)
+            self.add_jpeg(buffer.getvalue(), image.width, image.height, 1 if image.mode == "L" else 3)
+
+    def close(self):
+        kids = " ".join(f"{page_id} 0 R" for page_id in self._pages)
+        self._object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._pages)} >>".encode("ascii"))
+        self._object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        xref_at = self._file.tell()
+        self._file.write(f"xref\n0 {self._next_id}\n0000000000 65535 f \n".encode("ascii"))
+        for obj_id in range(1, self._next_id):
+            self._file.write(f"{self._offsets[obj_id]:010d} 00000 n \n".encode("ascii"))
+        self._file.write(
+            f"trailer\n<< /Size {self._next_id} /Root 1 0 R >>\nstartxref\n{xref_at}\n%%EOF\n".encode("ascii")
+        )
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._tmp, self.path)
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.unlink(self._tmp)
+        except OSError:
+            pass
+
+
+def build_pdf(image_dir, pdf_path, quality=90):
+    """把目录中的图片按文件名顺序写成 PDF，返回 {"pages": 页数, "bytes": 文件大小}"""
+    images = sorted(p for p in Path(image_dir).iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+    if not images:
+        raise FileNotFoundError(f"{image_dir} 中没有图片")
+    with StreamingPdfWriter(pdf_path) as writer:
+        for image in images:
+            writer.add_image_file(image, quality)
+    return {"pages": len(images), "bytes": Path(pdf_path).stat().st_size}
@@ -0,0 +1,176 @@
+"""
+持久化 - 原子写入和防抖合并的后台写线程
+
+功能：
+- atomic_write：先写同目录下的临时文件并 fsync，再 os.replace 覆盖目标文件，
+  进程在任何时刻崩溃，目标文件要么是旧内容，要么是完整的新内容
+- DebouncedWriter：同一文件在防抖窗口内的多次保存只写最后一次，写入在后台线程完成
+- 保存时即序列化为文本（调用方之后修改数据不影响已提交的内容）
+- read_text 优先返回尚未落盘的内容，先改后读不会读到旧文件
+- 进程退出时写完所有挂起的保存
+
+用法：
+    from autolink_modules.persistence import default_writer
+    default_writer().save(path, data)  # .json / .yml / .yaml 按后缀选择格式
+"""
+from pathlib import Path
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+def atomic_write(path, text, encoding="utf-8"):
+    """原子地把文本写入 path"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "w", encoding=encoding, newline="") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    if hasattr(os, "O_DIRECTORY"):
+        # 让改名本身也落盘（Windows 上没有目录 fsync）
+        dir_fd = os.open(path.parent, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        except OSError:
+            pass
+        finally:
+            os.close(dir_fd)
+
+
+def serialize(path, data):
+    """按文件后缀把数据序列化为文本（.yml/.yaml 为 YAML，其余为 JSON）"""
+    if Path(path).suffix.lower() in (".yml", ".yaml"):
+        import yaml
+        return yaml.safe_dump(data, allow_unicode=True)
+    return json.dumps(data, ensure_ascii=False, indent=4)
+
+
+class DebouncedWriter:
+    """防抖合并的后台写线程"""
+
+    def __init__(self, delay=0.5, on_error=None):
+        self.delay = delay
+        self.on_error = on_error  # on_error(path, exception)，默认打印
+        self._pending = {}  # 路径 -> (文本, 最晚写入时间)
+        self._writing = set()
+        self._errors = {}  # 路径 -> 最近一次写入失败的异常（写入成功后清除）
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="persistence-writer", daemon=True)
+        self._thread.start()
+
+    def save(self, path, data):
+        """提交保存（按后缀序列化），在防抖窗口结束后写入"""
+        self.save_text(path, serialize(path, data))
+
+    def save_text(self, path, text):
+        path = Path(path).resolve()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("写线程已关闭")
+            # 窗口从第一次提交算起，连续修改也不会无限推迟写入
+            due = self._pending[path][1] if path in self._pending else time.monotonic() + self.delay
+            self._pending[path] = (text, due)
+            self._cond.notify()
+
+    def read_text(self, path, encoding="utf-8"):
+        """读取文件内容，有尚未写入的保存时返回其内容"""
+        path = Path(path).resolve()
+        with self._cond:
+            if path in self._pending:
+                return self._pending[path][0]
+        return path.read_text(encoding=encoding)
+
+    def flush(self, path=None, timeout=10):
+        """立即写入挂起的保存（path 为 None 时写入全部），等待完成
+
+        超时返回 False；指定 path 且该文件写入失败时抛出写入时的异常。
+        """
+        target = Path(path).resolve() if path is not None else None
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if target is not None:
+                self._errors.pop(target, None)
+            for key in list(self._pending):
+                if target is None or key == target:
+                    text, _ = self._pending[key]
+                    self._pending[key] = (text, 0)
+            self._cond.notify_all()
+            while any(target is None or key == target for key in (*self._pending, *self._writing)):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            if target is not None and target in self._errors:
+                raise self._errors.pop(target)
+        return True
+
+    def close(self, timeout=10):
+        """写完所有挂起的保存并停止写线程"""
+        self.flush(timeout=timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed and not self._pending:
+                        return
+                    now = time.monotonic()
+                    ready = [p for p, (_, due) in self._pending.items() if due <= now]
+                    if ready:
+                        break
+                    next_due = min((due for _, due in self._pending.values()), default=None)
+                    self._cond.wait(None if next_due is None else next_due - now)
+                batch = [(p, self._pending.pop(p)[0]) for p in ready]
+                self._writing.update(p for p, _ in batch)
+
+            errors = {}
+            for path, text in batch:
+                try:
+                    atomic_write(path, text)
+                except Exception as e:
+                    errors[path] = e
+                    if self.on_error:
+                        self.on_error(path, e)
+                    else:
+                        print(f"保存 {path} 失败: {e}")
+
+            with self._cond:
+                for path, _ in batch:
+                    if path in errors:
+                        self._errors[path] = errors[path]
+                    else:
+                        self._errors.pop(path, None)
+                self._writing.difference_update(p for p, _ in batch)
+                self._cond.notify_all()
+
+
+_default_writer = None
+_default_lock = threading.Lock()
+
+
+def default_writer():
+    """进程共享的写线程（退出时自动写完挂起的保存）"""
+    global _default_writer
+    with _default_lock:
+        if _default_writer is None:
+            _default_writer = DebouncedWriter()
+            atexit.register(_default_writer.close)
+        return _default_writer
@@ -0,0 +1,508 @@
+"""
+选择器排名引擎 - 在保存的页面快照上为录制的元素挑选最优选择器
+
+功能：
+- 用 html.parser 把快照解析为轻量元素树，并建立 id / class / 标签索引
+- 按录制的 XPath（或原选择器）在每个快照中定位目标元素
+- 为目标生成候选选择器：ID、属性、单/双 class、nth-child、以带 ID 的祖先为锚点的短链
+- 按唯一性、跨快照稳定性和匹配开销（浏览器从右向左匹配时需检查的元素数）打分
+- 输出 JSON；指定角色的元素写入 scripts/course_selectors.json，供 js_scripts 的选课脚本直接使用
+
+命令行：
+    python -m autolink_modules.selector_engine recorded_sessions/actions_xxx.jsonl
+        [--snapshot 快照ID ...] [--role select_button=3 --role confirm_button=4] [-o 结果.json]
+"""
+from dataclasses import asdict, dataclass, field
+from html.parser import HTMLParser
+from pathlib import Path
+import argparse
+import json
+import math
+import re
+
+from autolink_modules.persistence import atomic_write
+
+# 选课脚本使用的选择器角色（见 js_scripts.get_course_selectors）
+COURSE_SELECTOR_ROLES = ("course_row", "select_button", "confirm_button")
+# 课程行内选课按钮的文字（去掉空白后完全相同才算）
+SELECT_BUTTON_TEXTS = ("选课", "选择", "选中", "选定")
+# 在课程行内部使用的角色：候选选择器在所在行内评估唯一性
+ROW_SCOPED_ROLES = ("select_button",)
+# 匹配一组元素的角色：选择器应恰好匹配目标及其同类兄弟（如所有课程行）
+COLLECTION_ROLES = ("course_row",)
+
+_VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta",
+    "param", "source", "track", "wbr",
+}
+_STABLE_ATTRS = ("name", "type", "role", "aria-label", "title", "value", "for", "placeholder")
+_IDENT = re.compile(r"^[A-Za-z_][\w-]*$")
+_VOLATILE = re.compile(r"\d{3,}|[0-9a-f]{8,}", re.I)  # 看起来是自动生成的 id/class
+
+
+class Element:
+    __slots__ = ("tag", "attrs", "parent", "children", "position", "type_position", "classes")
+
+    def __init__(self, tag, attrs, parent):
+        self.tag = tag
+        self.attrs = attrs
+        self.parent = parent
+        self.children = []
+        self.classes = attrs.get("class", "").split()
+        if parent is not None:
+            parent.children.append(self)
+            self.position = len(parent.children)
+            self.type_position = sum(1 for c in parent.children if c.tag == tag)
+        else:
+            self.position = self.type_position = 1
+
+    def ancestors(self):
+        node = self.parent
+        while node is not None:
+            yield node
+            node = node.parent
+
+
+class Document(HTMLParser):
+    """快照解析结果：元素树和索引"""
+
+    def __init__(self, html):
+        super().__init__(convert_charrefs=True)
+        self.root = Element("#document", {}, None)
+        self.elements = []
+        self.by_id, self.by_class, self.by_tag = {}, {}, {}
+        self._stack = [self.root]
+        self.feed(html)
+        self.close()
+
+    def handle_starttag(self, tag, attrs):
+        el = Element(tag, {k: v or "" for k, v in attrs}, self._stack[-1])
+        self.elements.append(el)
+        self.by_tag.setdefault(tag, []).append(el)
+        if el.attrs.get("id"):
+            self.by_id.setdefault(el.attrs["id"], []).append(el)
+        for cls in el.classes:
+            self.by_class.setdefault(cls, []).append(el)
+        if tag not in _VOID_TAGS:
+            self._stack.append(el)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in _VOID_TAGS:
+            self._stack.pop()
+
+    def handle_endtag(self, tag):
+        for i in range(len(self._stack) - 1, 0, -1):
+            if self._stack[i].tag == tag:
+                del self._stack[i:]
+                return
+
+    # ---------- 定位 ----------
+
+    def resolve_xpath(self, xpath):
+        """解析录制脚本生成的 XPath（//*[@id="x"]/tag[n]/... 或 /html/body/...）"""
+        if not xpath:
+            return None
+        match = re.match(r'^//\*\[@id="([^"]*)"\]', xpath)
+        if match:
+            found = self.by_id.get(match.group(1))
+            node, rest = (found[0] if found else None), xpath[match.end():]
+        elif xpath.startswith("/html/body"):
+            bodies = self.by_tag.get("body")
+            node, rest = (bodies[0] if bodies else None), xpath[len("/html/body"):]
+        else:
+            node, rest = self.root, xpath
+        for step in filter(None, rest.split("/")):
+            if node is None:
+                return None
+            match = re.match(r"^([\w-]+)(?:\[(\d+)\])?$", step)
+            if not match:
+                return None
+            tag, nth = match.group(1).lower(), int(match.group(2) or 1)
+            same = [c for c in node.children if c.tag == tag]
+            node = same[nth - 1] if len(same) >= nth else None
+        return node if node is not self.root else None
+
+
+# ---------- 选择器匹配（只支持本模块生成的语法和录制脚本的 class 链） ----------
+
+_SIMPLE = re.compile(
+    r'#(?P<id>[\w-]+)|\.(?P<cls>[\w-]+)|\[(?P<attr>[\w-]+)="(?P<val>(?:[^"\\]|\\.)*)"\]'
+    r'|:nth-child\((?P<nth>\d+)\)|:nth-of-type\((?P<nty>\d+)\)'
+)
+
+
+def _parse_compound(text):
+    match = re.match(r"^([a-zA-Z][\w-]*|\*)?", text)
+    compound = {"tag": (match.group(1) or "*").lower(), "id": None, "classes": [], "attrs": [],
+                "nth": None, "nty": None}
+    pos = match.end()
+    while pos < len(text):
+        m = _SIMPLE.match(text, pos)
+        if not m:
+            raise ValueError(f"不支持的选择器: {text}")
+        if m.group("id"):
+            compound["id"] = m.group("id")
+        elif m.group("cls"):
+            compound["classes"].append(m.group("cls"))
+        elif m.group("attr"):
+            compound["attrs"].append((m.group("attr"), re.sub(r"\\(.)", r"\1", m.group("val"))))
+        elif m.group("nth"):
+            compound["nth"] = int(m.group("nth"))
+        else:
+            compound["nty"] = int(m.group("nty"))
+        pos = m.end()
+    return compound
+
+
+def parse_selector(selector):
+    """返回 [(组合符, 复合选择器)]，从左到右；组合符为 ' ' 或 '>'"""
+    tokens = re.split(r"\s*(>)\s*|\s+", selector.strip())
+    parts, combinator = [], " "
+    for token in tokens:
+        if token is None or token == "":
+            continue
+        if token == ">":
+            combinator = ">"
+            continue
+        parts.append((combinator, _parse_compound(token)))
+        combinator = " "
+    return parts
+
+
+def _matches_compound(el, c):
+    if c["tag"] != "*" and el.tag != c["tag"]:
+        return False
+    if c["id"] is not None and el.attrs.get("id") != c["id"]:
+        return False
+    if any(cls not in el.classes for cls in c["classes"]):
+        return False
+    if any(el.attrs.get(k) != v for k, v in c["attrs"]):
+        return False
+    if c["nth"] is not None and el.position != c["nth"]:
+        return False
+    return c["nty"] is None or el.type_position == c["nty"]
+
+
+def _matches(el, parts, i, scope):
+    combinator, compound = parts[i]
+    if not _matches_compound(el, compound):
+        return False
+    if i == 0:
+        return scope is None or any(a is scope for a in el.ancestors())
+    if combinator == ">":
+        parent = el.parent
+        return parent is not None and parent is not scope and _matches(parent, parts, i - 1, scope)
+    for ancestor in el.ancestors():
+        if ancestor is scope:
+            return False
+        if _matches(ancestor, parts, i - 1, scope):
+            return True
+    return False
+
+
+def _key_candidates(doc, compound):
+    """按最有选择性的简单选择器取候选元素（模拟浏览器的右侧键索引）"""
+    if compound["id"] is not None:
+        return doc.by_id.get(compound["id"], [])
+    if compound["classes"]:
+        return min((doc.by_class.get(c, []) for c in compound["classes"]), key=len)
+    if compound["tag"] != "*":
+        return doc.by_tag.get(compound["tag"], [])
+    return doc.elements
+
+
+def select_all(doc, selector, scope=None):
+    """返回匹配的元素列表和匹配开销（检查过的元素数估计）"""
+    parts = parse_selector(selector)
+    keyed = _key_candidates(doc, parts[-1][1])
+    if scope is not None:
+        keyed = [el for el in keyed if any(a is scope for a in el.ancestors())]
+    found = [el for el in keyed if _matches(el, parts, len(parts) - 1, scope)]
+    cost = len(keyed) * len(parts)
+    return found, cost
+
+
+# ---------- 候选生成和评分 ----------
+
+def _ident(value):
+    return bool(_IDENT.match(value))
+
+
+def _attr(name, value):
+    return '[%s="%s"]' % (name, value.replace("\\", "\\\\").replace('"', '\\"'))
+
+
+def _compound_candidates(el):
+    """目标元素自身的复合选择器候选"""
+    tag = el.tag
+    out = []
+    el_id = el.attrs.get("id")
+    if el_id:
+        out.append(f"#{el_id}" if _ident(el_id) else f"{tag}{_attr('id', el_id)}")
+    for name in _STABLE_ATTRS:
+        value = el.attrs.get(name)
+        if value and len(value) <= 40:
+            out.append(f"{tag}{_attr(name, value)}")
+    for name, value in el.attrs.items():
+        if name.startswith("data-") and value and len(value) <= 40:
+            out.append(f"{tag}{_attr(name, value)}")
+    classes = [c for c in el.classes if _ident(c)]
+    out.extend(f"{tag}.{c}" for c in classes)
+    out.extend(f"{tag}.{a}.{b}" for i, a in enumerate(classes) for b in classes[i + 1:i + 3])
+    return out
+
+
+def generate_candidates(el, scope=None, max_depth=3):
+    """为元素生成候选选择器（scope 为行等局部容器时只生成容器内的相对选择器）"""
+    own = _compound_candidates(el)
+    candidates = list(own) + [el.tag]
+    positional = f"{el.tag}:nth-of-type({el.type_position})"
+    candidates.append(positional)
+
+    # 向上找锚点（带 ID/属性/class 的祖先），组成 "锚点 > 位置链" 或 "锚点 后代" 的短链
+    path = [el]
+    for depth, ancestor in enumerate(el.ancestors()):
+        if depth >= max_depth or ancestor is scope or ancestor.tag == "#document":
+            break
+        chain = " > ".join(f"{n.tag}:nth-child({n.position})" for n in reversed(path))
+        for anchor in _compound_candidates(ancestor)[:3]:
+            candidates.append(f"{anchor} > {chain}")
+            for simple in own[:3]:
+                candidates.append(f"{anchor} {simple}")
+        path.append(ancestor)
+
+    seen, result = set(), []
+    for cand in candidates:
+        if cand not in seen:
+            seen.add(cand)
+            result.append(cand)
+    return result
+
+
+@dataclass
+class Candidate:
+    selector: str
+    unique_rate: float = 0.0  # 只匹配目标（集合角色为只匹配同类元素）的快照比例
+    stability: float = 0.0  # 恰好匹配目标（集合角色为全部同类元素）的快照比例
+    cost: float = 0.0  # 平均检查元素数
+    volatile: bool = False  # 含疑似自动生成的 id/class
+    score: float = 0.0
+
+
+@dataclass
+class RankedElement:
+    action_index: int
+    type: str
+    text: str
+    recorded_selector: str
+    role: str = ""
+    found_in: int = 0  # 能定位到目标的快照数
+    best: str = ""
+    candidates: list = field(default_factory=list)
+
+
+def _scope_of(el, role):
+    if role in ROW_SCOPED_ROLES:
+        return next((a for a in el.ancestors() if a.tag == "tr"), None)
+    return None
+
+
+def locate(doc, action):
+    """在快照中定位录制的元素：优先 XPath，其次原选择器（要求标签一致）"""
+    tag = (action.get("tagName") or "").lower()
+    el = doc.resolve_xpath(action.get("xpath"))
+    if el is not None and (not tag or el.tag == tag):
+        return el
+    selector = action.get("selector") or ""
+    if selector and not selector.startswith("#"):
+        try:
+            found, _ = select_all(doc, selector)
+        except ValueError:
+            found = []
+        if found and (not tag or found[0].tag == tag):
+            return found[0]
+    elif selector:
+        return (doc.by_id.get(selector[1:]) or [None])[0]
+    return None
+
+
+def _peers(el):
+    """与目标同一父元素、同标签同 class 的兄弟（含自身）"""
+    return [c for c in el.parent.children if c.tag == el.tag and c.classes == el.classes]
+
+
+def score_candidate(cand):
+    """稳定性最重要，其次唯一性，再按匹配开销和长度区分"""
+    cost_score = 1 / (1 + math.log2(1 + cand.cost))
+    score = 60 * cand.stability + 25 * cand.unique_rate + 15 * cost_score
+    if cand.volatile:
+        score -= 20
+    # 位置选择器和裸标签在页面结构变化时容易失效
+    score -= 0.5 * cand.selector.count(":nth-")
+    if re.fullmatch(r"[\w-]+", cand.selector):
+        score -= 0.5
+    return round(score - 0.01 * len(cand.selector), 3)
+
+
+def rank_element(docs, action, index, role=""):
+    """在多个快照上评估某个录制元素的候选选择器"""
+    result = RankedElement(index, action.get("type", ""), (action.get("innerText") or "")[:30],
+                           action.get("selector", ""), role)
+    targets = [(doc, locate(doc, action)) for doc in docs]
+    targets = [(doc, el) for doc, el in targets if el is not None]
+    result.found_in = len(targets)
+    if not targets:
+        return result
+
+    pool = []
+    for doc, el in targets:
+        for cand in generate_candidates(el, _scope_of(el, role)):
+            if cand not in pool:
+                pool.append(cand)
+
+    for selector in pool:
+        cand = Candidate(selector, volatile=bool(_VOLATILE.search(selector)))
+        unique = stable = cost = 0
+        for doc, el in targets:
+            found, c = select_all(doc, selector, _scope_of(el, role))
+            cost += c
+            if role in COLLECTION_ROLES:
+                expected = _peers(el)
+                only_peers = bool(found) and all(any(f is p for p in expected) for f in found)
+                unique += only_peers
+                stable += only_peers and len(found) == len(expected)
+            else:
+                unique += len(found) == 1
+                stable += len(found) == 1 and found[0] is el
+        cand.unique_rate = round(unique / len(targets), 3)
+        cand.stability = round(stable / len(targets), 3)
+        cand.cost = round(cost / len(targets), 1)
+        cand.score = score_candidate(cand)
+        result.candidates.append(cand)
+
+    result.candidates.sort(key=lambda c: c.score, reverse=True)
+    result.candidates = result.candidates[:10]
+    if result.candidates and result.candidates[0].stability > 0:
+        result.best = result.candidates[0].selector
+    return result
+
+
+def guess_role(action):
+    """按按钮文字猜测选课脚本中的角色
+
+    选课按钮只认表格行内文字恰好为选课字样的元素，导航链接、菜单项（如“网上选课”）不算。
+    """
+    text = "".join((action.get("innerText") or "").split())
+    if action.get("type") != "click":
+        return ""
+    if text in ("确定", "确认", "确认选课", "OK"):
+        return "confirm_button"
+    if text in SELECT_BUTTON_TEXTS and "/tr[" in (action.get("xpath") or ""):
+        return "select_button"
+    return ""
+
+
+def rank_actions(actions, htmls, roles=None):
+    """对录制的操作逐个排名，roles 为 {操作序号(从1开始): 角色}，未指定时按文字猜测"""
+    docs = [Document(html) for html in htmls]
+    results = []
+    for index, action in enumerate(actions, 1):
+        role = (roles or {}).get(index) or guess_role(action)
+        results.append(rank_element(docs, action, index, role))
+        if role == "select_button" and not (roles and "course_row" in roles.values()):
+            # 选课按钮所在的行也给出行选择器
+            row_action = _row_action(docs, action)
+            if row_action:
+                results.append(rank_element(docs, row_action, index, "course_row"))
+    return results
+
+
+def _row_action(docs, action):
+    """构造选课按钮所在课程行的伪操作（XPath 截到 tr）"""
+    xpath = action.get("xpath") or ""
+    cut = xpath.rfind("/tr[")
+    if cut == -1:
+        return None
+    end = xpath.find("/", cut + 1)
+    return {"type": "row", "tagName": "TR", "xpath": xpath if end == -1 else xpath[:end], "selector": ""}
+
+
+def selectors_by_role(results):
+    """取每个角色得分最高的选择器"""
+    best = {}
+    for r in results:
+        if r.role in COURSE_SELECTOR_ROLES and r.best:
+            score = r.candidates[0].score
+            if r.role not in best or score > best[r.role][1]:
+                best[r.role] = (r.best, score)
+    return {role: selector for role, (selector, _) in best.items()}
+
+
+def write_course_selectors(selectors, path=None):
+    """合并写入 scripts/course_selectors.json（js_scripts 读取），原子替换
+
+    现有文件无法解析时抛出 ValueError，不覆盖（避免丢掉手工配置的选择器）。
+    """
+    path = Path(path) if path else Path.cwd() / "scripts" / "course_selectors.json"
+    data = {}
+    if path.exists():
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except ValueError as e:
+            raise ValueError(f"{path} 不是有效的 JSON，未写入: {e}") from e
+        if not isinstance(data, dict):
+            raise ValueError(f"{path} 的内容不是对象，未写入")
+    data.update(selectors)
+    atomic_write(path, json.dumps(data, ensure_ascii=False, indent=4))
+    return path
+
+
+def main():
+    from autolink_modules.session_replay import load_actions
+    from autolink_modules.snapshot_store import SnapshotStore, read_snapshot
+
+    parser = argparse.ArgumentParser(description="在保存的快照上为录制的元素排名选择器")
+    parser.add_argument("actions", help="actions_*.jsonl 或旧版 actions_*.json")
+    parser.add_argument("--snapshot", action="append", default=[],
+                        help="快照 ID 或 HTML 文件，可重复；默认使用最近 5 个快照")
+    parser.add_argument("--role", action="append", default=[], metavar="ROLE=序号",
+                        help=f"指定操作对应的角色（{', '.join(COURSE_SELECTOR_ROLES)}）")
+    parser.add_argument("-o", "--output", help="排名结果 JSON")
+    parser.add_argument("--write-config", action="store_true", help="写入 scripts/course_selectors.json")
+    args = parser.parse_args()
+
+    roles = {}
+    for item in args.role:
+        role, _, index = item.partition("=")
+        roles[int(index)] = role
+
+    if args.snapshot:
+        htmls = [read_snapshot(ref) for ref in args.snapshot]
+    else:
+        store = SnapshotStore()
+        htmls = [store.read(e) for e in store.entries()[-5:]]
+    if not htmls:
+        print("❌ 没有可用的快照")
+        return
+
+    results = rank_actions(load_actions(args.actions), htmls, roles)
+    for r in results:
+        top = r.candidates[0] if r.candidates else None
+        print(f"[{r.action_index}] {r.type:<5} {r.role or '-':<15} {r.text[:16]:<16} → {r.best or '（无稳定选择器）'}"
+              + (f"  稳定 {top.stability:.0%} 唯一 {top.unique_rate:.0%} 开销 {top.cost:.0f}" if top else ""))
+
+    by_role = selectors_by_role(results)
+    output = {"snapshots": len(htmls), "selectors": by_role, "elements": [asdict(r) for r in results]}
+    if args.output:
+        Path(args.output).write_text(json.dumps(output, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"已写入 {args.output}")
+    if args.write_config and by_role:
+        try:
+            print(f"已更新 {write_course_selectors(by_role)}: {by_role}")
+        except (OSError, ValueError) as e:
+            raise SystemExit(f"写入选课选择器失败: {e}")
+
+
+if __name__ == "__main__":
+    main()
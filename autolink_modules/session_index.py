@@ -0,0 +1,398 @@
+"""
+录制会话索引 - 在 SQLite FTS5 中检索保存的页面和操作记录
+
+功能：
+- 收录快照库（recorded_sessions/snapshots）、旧版 page_*.html 和 actions_*.jsonl/json
+- 页面按内容哈希只解析一次；课程行、按钮、输入框、链接、带 id 的元素逐个建索引，
+  行/表单等容器同时带上其内部元素的属性（可查"哪一行有 .select-btn"）
+- 文本和属性使用 trigram 全文索引，支持中文子串检索
+- 按文件修改时间和 manifest 增量更新
+
+命令行：
+    python -m autolink_modules.session_index update
+    python -m autolink_modules.session_index search --text 高等数学 --attr select-btn [--tag tr]
+    python -m autolink_modules.session_index actions 确定
+"""
+from html.parser import HTMLParser
+from pathlib import Path
+import argparse
+import hashlib
+import sqlite3
+import threading
+import time
+
+from autolink_modules.snapshot_store import SnapshotStore
+
+# 单独建索引的元素
+_INDEXED_TAGS = {"tr", "li", "form", "a", "button", "input", "select", "textarea", "label", "option"}
+# 容器元素：属性中包含内部元素的属性
+_CONTAINER_TAGS = {"tr", "li", "form"}
+_VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta",
+    "param", "source", "track", "wbr",
+}
+_ATTR_NAMES = ("id", "class", "name", "type", "value", "href", "onclick", "title", "placeholder")
+_MAX_TEXT = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    sha256 TEXT PRIMARY KEY,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    id TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    url TEXT NOT NULL DEFAULT '',
+    title TEXT NOT NULL DEFAULT '',
+    saved_at TEXT NOT NULL DEFAULT '',
+    source TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_snapshots_sha ON snapshots(sha256);
+CREATE TABLE IF NOT EXISTS elements (
+    id INTEGER PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    path TEXT NOT NULL,
+    text TEXT NOT NULL,
+    attrs TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_elements_sha ON elements(sha256);
+CREATE VIRTUAL TABLE IF NOT EXISTS element_fts USING fts5(
+    text, attrs, content='elements', content_rowid='id', tokenize='trigram'
+);
+CREATE TABLE IF NOT EXISTS actions (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    timestamp TEXT NOT NULL DEFAULT '',
+    url TEXT NOT NULL DEFAULT '',
+    selector TEXT NOT NULL DEFAULT '',
+    xpath TEXT NOT NULL DEFAULT '',
+    text TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_actions_source ON actions(source);
+CREATE VIRTUAL TABLE IF NOT EXISTS action_fts USING fts5(
+    selector, text, url, content='actions', content_rowid='id', tokenize='trigram'
+);
+"""
+
+_update_lock = threading.Lock()  # 同一进程内串行更新
+
+
+class _ElementExtractor(HTMLParser):
+    """提取需要建索引的元素：(标签, 路径, 文本, 属性串)"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.items = []
+        self._stack = []  # [标签, 路径, 文本片段, 属性片段, id]
+        self._counts = [{}]
+
+    @staticmethod
+    def _attr_tokens(tag, attrs):
+        tokens = [tag]
+        for name, value in attrs:
+            value = value or ""
+            if name == "id" and value:
+                tokens.append(f"#{value}")
+            elif name == "class":
+                tokens.extend(f".{c}" for c in value.split())
+            elif name in _ATTR_NAMES or name.startswith("data-"):
+                tokens.append(f"[{name}={value[:80]}]")
+        return tokens
+
+    def handle_starttag(self, tag, attrs):
+        counts = self._counts[-1]
+        counts[tag] = counts.get(tag, 0) + 1
+        parent_path = self._stack[-1][1] if self._stack else ""
+        path = f"{parent_path}/{tag}[{counts[tag]}]"
+        tokens = self._attr_tokens(tag, attrs)
+        # 属性向上汇总到最近的容器元素（不带属性的元素只有标签名，不汇总）
+        for frame in reversed(self._stack if len(tokens) > 1 else ()):
+            if frame[0] in _CONTAINER_TAGS:
+                frame[3].extend(tokens)
+                break
+        frame = [tag, path, [], list(tokens), dict(attrs).get("id")]
+        if tag in _VOID_TAGS:
+            self._emit(frame)
+            return
+        self._stack.append(frame)
+        self._counts.append({})
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in _VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        for i in range(len(self._stack) - 1, -1, -1):
+            if self._stack[i][0] == tag:
+                while len(self._stack) > i:
+                    frame = self._stack.pop()
+                    self._counts.pop()
+                    text = " ".join("".join(frame[2]).split())[:_MAX_TEXT]
+                    if self._stack:
+                        self._stack[-1][2].append(" " + text)
+                    frame[2] = [text]
+                    self._emit(frame)
+                return
+
+    def handle_data(self, data):
+        if self._stack:
+            self._stack[-1][2].append(data)
+
+    def _emit(self, frame):
+        tag, path, text, tokens, element_id = frame
+        if tag in _INDEXED_TAGS or element_id:
+            self.items.append((tag, path, "".join(text), " ".join(tokens)))
+
+    def close(self):
+        super().close()
+        while self._stack:
+            self.handle_endtag(self._stack[-1][0])
+
+
+def extract_elements(html):
+    parser = _ElementExtractor()
+    parser.feed(html)
+    parser.close()
+    return parser.items
+
+
+def _fts_query(term):
+    """把检索词转为 FTS5 短语（trigram 至少需要 3 个字符）"""
+    return '"' + term.replace('"', '""') + '"'
+
+
+class SessionIndex:
+    """录制会话索引"""
+
+    def __init__(self, sessions_dir=None, db_path=None):
+        self.sessions_dir = Path(sessions_dir) if sessions_dir else Path.cwd() / "recorded_sessions"
+        self.db_path = Path(db_path) if db_path else self.sessions_dir / "index.db"
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    # ---------- 增量更新 ----------
+
+    def _changed(self, path):
+        stat = path.stat()
+        row = self.conn.execute("SELECT mtime, size FROM sources WHERE path = ?", (str(path),)).fetchone()
+        return row is None or row[0] != stat.st_mtime or row[1] != stat.st_size
+
+    def _mark(self, path):
+        stat = path.stat()
+        self.conn.execute("INSERT OR REPLACE INTO sources (path, mtime, size) VALUES (?, ?, ?)",
+                          (str(path), stat.st_mtime, stat.st_size))
+
+    def _index_page(self, sha256, html):
+        """解析并收录页面内容（同一内容只收录一次）"""
+        if self.conn.execute("SELECT 1 FROM pages WHERE sha256 = ?", (sha256,)).fetchone():
+            return 0
+        items = extract_elements(html)
+        self.conn.execute("INSERT INTO pages (sha256, size) VALUES (?, ?)", (sha256, len(html)))
+        for tag, path, text, attrs in items:
+            cursor = self.conn.execute(
+                "INSERT INTO elements (sha256, tag, path, text, attrs) VALUES (?, ?, ?, ?, ?)",
+                (sha256, tag, path, text, attrs)
+            )
+            self.conn.execute("INSERT INTO element_fts (rowid, text, attrs) VALUES (?, ?, ?)",
+                              (cursor.lastrowid, text, attrs))
+        return len(items)
+
+    def _update_snapshot_store(self):
+        store = SnapshotStore(self.sessions_dir / "snapshots")
+        if not store.manifest_path.exists() or not self._changed(store.manifest_path):
+            return 0
+        known = {row[0] for row in self.conn.execute(
+            "SELECT id FROM snapshots WHERE source = ?", (str(store.manifest_path),))}
+        added = 0
+        for entry in store.entries():
+            if entry.id in known:
+                continue
+            try:
+                self._index_page(entry.sha256, store.read(entry))
+            except (OSError, RuntimeError) as e:
+                print(f"收录快照 {entry.id} 失败: {e}")
+                continue
+            self.conn.execute(
+                "INSERT OR REPLACE INTO snapshots (id, sha256, url, title, saved_at, source) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (entry.id, entry.sha256, entry.url, entry.title, entry.saved_at, str(store.manifest_path))
+            )
+            added += 1
+        self._mark(store.manifest_path)
+        return added
+
+    def _update_html_files(self):
+        """旧版 page_*.html（跳过 _annotated 副本）"""
+        added = 0
+        for path in sorted(self.sessions_dir.glob("page_*.html")):
+            if path.stem.endswith("_annotated") or not self._changed(path):
+                continue
+            html = path.read_text(encoding="utf-8", errors="replace")
+            sha256 = hashlib.sha256(html.encode("utf-8")).hexdigest()
+            self._index_page(sha256, html)
+            saved_at = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(path.stat().st_mtime))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO snapshots (id, sha256, url, title, saved_at, source) "
+                "VALUES (?, ?, '', '', ?, ?)", (path.stem, sha256, saved_at, str(path))
+            )
+            self._mark(path)
+            added += 1
+        return added
+
+    def _update_action_files(self):
+        from autolink_modules.session_replay import load_actions
+
+        added = 0
+        files = list(self.sessions_dir.glob("actions_*.jsonl")) + list(self.sessions_dir.glob("actions_*.json"))
+        for path in sorted(files):
+            if not self._changed(path):
+                continue
+            try:
+                actions = load_actions(path)
+            except (OSError, ValueError) as e:
+                print(f"收录操作记录 {path.name} 失败: {e}")
+                continue
+            # 追加写入的文件整体重建该文件的记录
+            old = self.conn.execute(
+                "SELECT id, selector, text, url FROM actions WHERE source = ?", (str(path),)).fetchall()
+            for row in old:
+                self.conn.execute("INSERT INTO action_fts (action_fts, rowid, selector, text, url) "
+                                  "VALUES ('delete', ?, ?, ?, ?)", row)
+            self.conn.execute("DELETE FROM actions WHERE source = ?", (str(path),))
+            for idx, action in enumerate(actions, 1):
+                values = (
+                    str(path), idx, action.get("type", ""), action.get("timestamp", ""),
+                    action.get("url", ""), action.get("selector", ""), action.get("xpath", ""),
+                    action.get("innerText") or action.get("name") or "",
+                )
+                cursor = self.conn.execute(
+                    "INSERT INTO actions (source, idx, type, timestamp, url, selector, xpath, text) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", values
+                )
+                self.conn.execute("INSERT INTO action_fts (rowid, selector, text, url) VALUES (?, ?, ?, ?)",
+                                  (cursor.lastrowid, values[5], values[7], values[4]))
+            self._mark(path)
+            added += 1
+        return added
+
+    def update(self):
+        """收录新增或变化的文件，返回 {类别: 数量}"""
+        with _update_lock, self.conn:
+            return {
+                "snapshots": self._update_snapshot_store() + self._update_html_files(),
+                "action_files": self._update_action_files(),
+            }
+
+    # ---------- 查询 ----------
+
+    @staticmethod
+    def _match(column, term, conditions, params):
+        """trigram 需要至少 3 个字符，较短的词退回到子串扫描"""
+        if len(term) >= 3:
+            conditions.append(f"e.id IN (SELECT rowid FROM element_fts WHERE {column} MATCH ?)")
+            params.append(_fts_query(term))
+        else:
+            conditions.append(f"instr(e.{column}, ?) > 0")
+            params.append(term)
+
+    def search(self, text=None, attr=None, tag=None, limit=50):
+        """检索元素：text 为元素文本子串，attr 为属性子串（如 select-btn、#confirmDialog）
+
+        返回 [{snapshots, url, tag, path, text, attrs}]，snapshots 为包含该元素的快照 ID 列表。
+        """
+        conditions, params = [], []
+        if text:
+            self._match("text", text, conditions, params)
+        if attr:
+            self._match("attrs", attr, conditions, params)
+        if tag:
+            conditions.append("e.tag = ?")
+            params.append(tag.lower())
+        where = " AND ".join(conditions) or "1"
+        rows = self.conn.execute(
+            f"SELECT e.sha256, e.tag, e.path, e.text, e.attrs FROM elements e WHERE {where} LIMIT ?",
+            (*params, limit)
+        ).fetchall()
+        results = []
+        for sha256, el_tag, path, el_text, attrs in rows:
+            snaps = self.conn.execute(
+                "SELECT id, url FROM snapshots WHERE sha256 = ? ORDER BY saved_at", (sha256,)
+            ).fetchall()
+            results.append({
+                "snapshots": [s[0] for s in snaps], "url": snaps[-1][1] if snaps else "",
+                "tag": el_tag, "path": path, "text": el_text[:120], "attrs": attrs[:200],
+            })
+        return results
+
+    def search_actions(self, query, limit=50):
+        """按选择器/文本/URL 子串检索操作记录"""
+        conditions, params = [], []
+        if len(query) >= 3:
+            conditions.append("id IN (SELECT rowid FROM action_fts WHERE action_fts MATCH ?)")
+            params.append(_fts_query(query))
+        else:
+            conditions.append("(instr(selector, ?) > 0 OR instr(text, ?) > 0 OR instr(url, ?) > 0)")
+            params.extend([query] * 3)
+        rows = self.conn.execute(
+            f"SELECT source, idx, type, timestamp, selector, text FROM actions "
+            f"WHERE {' AND '.join(conditions)} ORDER BY source, idx LIMIT ?", (*params, limit)
+        ).fetchall()
+        return [dict(zip(("source", "index", "type", "timestamp", "selector", "text"), row)) for row in rows]
+
+    def stats(self):
+        count = lambda table: self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        return {name: count(name) for name in ("snapshots", "pages", "elements", "actions")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="录制会话索引")
+    parser.add_argument("--dir", help="录制目录（默认 recorded_sessions）")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("update", help="收录新增的快照和操作记录")
+    search = sub.add_parser("search", help="检索页面元素")
+    search.add_argument("--text", help="元素文本（如课程名）")
+    search.add_argument("--attr", help="属性，如 select-btn、#confirmDialog、data-course-id")
+    search.add_argument("--tag", help="标签，如 tr、button")
+    search.add_argument("--limit", type=int, default=20)
+    actions = sub.add_parser("actions", help="检索操作记录")
+    actions.add_argument("query")
+    args = parser.parse_args()
+
+    index = SessionIndex(args.dir)
+    start = time.perf_counter()
+    if args.command == "update":
+        added = index.update()
+        print(f"已收录 {added['snapshots']} 个快照、{added['action_files']} 个操作记录文件，"
+              f"用时 {(time.perf_counter() - start) * 1000:.0f} ms；索引: {index.stats()}")
+        return
+    index.update()
+    start = time.perf_counter()
+    if args.command == "search":
+        results = index.search(args.text, args.attr, args.tag, args.limit)
+        for r in results:
+            print(f"<{r['tag']}> {r['text'][:40]!r}  {r['attrs'][:60]}")
+            print(f"    快照: {', '.join(r['snapshots'][-3:])}{' 等' if len(r['snapshots']) > 3 else ''}  {r['url']}")
+    else:
+        results = index.search_actions(args.query)
+        for r in results:
+            print(f"{Path(r['source']).name} #{r['index']} {r['type']} {r['text'][:30]!r} {r['selector']}")
+    print(f"共 {len(results)} 条，查询用时 {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""
+会话回放 - 在保存的页面上离线、无窗口地重放录制的操作
+
+功能：
+- 读取 HTMLRecorder 录制的操作（actions_*.jsonl 或旧版 actions_*.json）
+- 页面来源：指定的 HTML 文件/快照，DOM 变更录制（按操作时间重建），
+  或按操作所在 URL 和时间从快照库自动匹配
+- 不按录制时的间隔等待，逐步执行；目标元素暂未出现时短暂自动等待
+- 报告每一步的选择器/XPath 是否命中、耗时，以及回放从哪一步开始偏离
+
+用法：
+    python -m autolink_modules.session_replay recorded_sessions/actions_xxx.jsonl
+        [--html 页面.html | --snapshot 快照ID | --dom recorded_sessions/dom/dom_xxx.jsonl]
+        [--wait 500] [--report 报告.json]
+
+存在偏离时以退出码 1 结束，便于在修改 js_scripts.py 的选择器后批量检查。
+"""
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+import argparse
+import json
+import os
+import sys
+import time
+
+from autolink_modules.dom_timeline import DomTimeline
+from autolink_modules.snapshot_store import SnapshotStore, read_snapshot
+
+# 在页面中执行单步：同时用选择器和 XPath 定位，命中后点击或输入
+_STEP_JS = """
+(function(step) {
+    var t0 = performance.now();
+    function byXPath(xpath) {
+        try {
+            return document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null)
+                .singleNodeValue;
+        } catch (e) { return null; }
+    }
+    var matches = 0, bySelector = null;
+    try {
+        var all = step.selector ? document.querySelectorAll(step.selector) : [];
+        matches = all.length;
+        bySelector = all[0] || null;
+    } catch (e) {}
+    var byPath = step.xpath ? byXPath(step.xpath) : null;
+    var el = bySelector || byPath;
+    var res = {
+        found: !!el, selector: !!bySelector, xpath: !!byPath,
+        same: bySelector === byPath, matches: matches, text: ''
+    };
+    if (el) {
+        res.text = (el.innerText || '').substring(0, 50);
+        if (step.type === 'click') {
+            el.click();
+        } else if (step.type === 'input') {
+            el.value = step.value;
+            el.dispatchEvent(new Event('input', {bubbles: true}));
+            el.dispatchEvent(new Event('change', {bubbles: true}));
+        }
+    }
+    res.ms = performance.now() - t0;
+    return JSON.stringify(res);
+})(%s);
+"""
+
+
+@dataclass
+class StepResult:
+    """单步回放结果"""
+    index: int
+    type: str
+    selector: str
+    status: str  # ok / not_found / ambiguous / mismatch / text_changed / no_page
+    selector_resolved: bool = False
+    xpath_resolved: bool = False
+    matches: int = 0
+    step_ms: float = 0.0  # 页面内定位和执行耗时
+    wait_ms: float = 0.0  # 等待目标出现的时间
+    detail: str = ""
+
+
+def load_actions(path):
+    """读取操作记录，支持 JSON Lines 和旧版 JSON 数组"""
+    path = Path(path)
+    text = path.read_text(encoding="utf-8")
+    if path.suffix == ".json":
+        return json.loads(text)
+    actions = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line:
+            try:
+                actions.append(json.loads(line))
+            except ValueError:
+                continue
+    return actions
+
+
+def _action_ms(action):
+    try:
+        return datetime.fromisoformat(action["timestamp"].replace("Z", "+00:00")).timestamp() * 1000
+    except (KeyError, ValueError):
+        return None
+
+
+def _strip_fragment(url):
+    return (url or "").split("#", 1)[0]
+
+
+class PageSource:
+    """为每组操作提供页面 HTML"""
+
+    def __init__(self, html=None, dom_recording=None, store=None):
+        self.html = html
+        self.timeline = DomTimeline(dom_recording) if dom_recording else None
+        self.store = store
+
+    def page_for(self, action):
+        """返回 (HTML, 来源说明)，找不到时返回 (None, 原因)"""
+        if self.html is not None:
+            return self.html, "指定页面"
+        ts = _action_ms(action)
+        if self.timeline is not None:
+            # 重建操作发生前一刻的页面
+            return self.timeline.html_at(ts - 1 if ts else None), f"DOM 录制 @ {action.get('timestamp', '?')}"
+
+        store = self.store or SnapshotStore()
+        url = _strip_fragment(action.get("url"))
+        candidates = [e for e in store.entries() if not url or _strip_fragment(e.url) == url]
+        if not candidates:
+            return None, f"快照库中没有 {url or '任何'} 页面"
+        before = [e for e in candidates
+                  if ts is None or datetime.fromisoformat(e.saved_at).timestamp() * 1000 <= ts]
+        entry = (before or candidates)[-1]
+        return store.read(entry), f"快照 {entry.id}"
+
+
+def group_actions(actions):
+    """按所在页面把连续操作分组（没有 URL 的操作归入上一组）"""
+    groups = []
+    for action in actions:
+        url = _strip_fragment(action.get("url"))
+        if not groups or (url and url != groups[-1][0]):
+            groups.append((url or (groups[-1][0] if groups else ""), []))
+        groups[-1][1].append(action)
+    return groups
+
+
+class SessionReplayer:
+    """无窗口回放器（内部创建 QApplication，需在主线程使用）"""
+
+    def __init__(self, wait_ms=500, poll_ms=10):
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        from PyQt5.QtCore import QEventLoop, QTimer, QUrl
+        from PyQt5.QtWidgets import QApplication
+        from PyQt5.QtWebEngineWidgets import QWebEnginePage
+
+        class ReplayPage(QWebEnginePage):
+            """屏蔽弹窗，加载完成后禁止页面跳转（回放始终停留在快照上）"""
+            allow_navigation = True
+            blocked_navigations = 0
+
+            def javaScriptAlert(self, url, msg):
+                pass
+
+            def javaScriptConfirm(self, url, msg):
+                return True
+
+            def javaScriptPrompt(self, url, msg, default):
+                return True, default
+
+            def javaScriptConsoleMessage(self, level, message, line, source):
+                pass
+
+            def acceptNavigationRequest(self, url, nav_type, is_main_frame):
+                if self.allow_navigation or not is_main_frame:
+                    return True
+                self.blocked_navigations += 1
+                return False
+
+        self._QEventLoop, self._QTimer, self._QUrl = QEventLoop, QTimer, QUrl
+        self.app = QApplication.instance() or QApplication(sys.argv[:1])
+        self.page = ReplayPage()
+        self.wait_ms = wait_ms
+        self.poll_ms = poll_ms
+
+    def _wait(self, start, timeout_ms=10000):
+        """运行事件循环直到 start(done) 调用 done(value)，返回 value"""
+        loop = self._QEventLoop()
+        box = {}
+
+        def done(value=None):
+            box["value"] = value
+            loop.quit()
+
+        self._QTimer.singleShot(timeout_ms, loop.quit)
+        start(done)
+        if "value" not in box:
+            loop.exec_()
+        return box.get("value")
+
+    def load(self, html, base_url):
+        self.page.allow_navigation = True
+        ok = self._wait(lambda done: (
+            self.page.loadFinished.connect(done),
+            self.page.setHtml(html, self._QUrl(base_url or "http://replay.invalid/"))
+        ))
+        self.page.loadFinished.disconnect()
+        self.page.allow_navigation = False
+        return bool(ok)
+
+    def _run_js(self, script):
+        return self._wait(lambda done: self.page.runJavaScript(script, done))
+
+    def _settle(self, ms):
+        self._wait(lambda done: self._QTimer.singleShot(ms, done))
+
+    def run_step(self, index, action):
+        step = {
+            "type": action.get("type"),
+            "selector": action.get("selector") or "",
+            "xpath": action.get("xpath") or "",
+            "value": (action.get("value") or "").removesuffix("..."),
+        }
+        result = StepResult(index, step["type"], step["selector"] or step["xpath"], "not_found")
+        script = _STEP_JS % json.dumps(step, ensure_ascii=False)
+        start = time.perf_counter()
+        while True:
+            data = json.loads(self._run_js(script) or "{}")
+            waited = (time.perf_counter() - start) * 1000
+            if data.get("found") or waited >= self.wait_ms:
+                break
+            self._settle(self.poll_ms)  # 目标尚未出现（如弹窗），稍后重试
+
+        result.wait_ms = round(waited, 2)
+        result.step_ms = round(data.get("ms", 0.0), 3)
+        result.selector_resolved = bool(data.get("selector"))
+        result.xpath_resolved = bool(data.get("xpath"))
+        result.matches = data.get("matches", 0)
+        if not data.get("found"):
+            result.detail = f"{self.wait_ms} ms 内未找到元素"
+        elif not result.selector_resolved or not result.xpath_resolved:
+            result.status = "mismatch"
+            result.detail = "仅 " + ("选择器" if result.selector_resolved else "XPath") + " 命中"
+        elif not data.get("same"):
+            result.status = "mismatch"
+            result.detail = "选择器与 XPath 指向不同元素"
+        elif result.matches > 1:
+            result.status = "ambiguous"
+            result.detail = f"选择器匹配 {result.matches} 个元素"
+        elif step["type"] == "click" and action.get("innerText") and \
+                action["innerText"].strip() != data.get("text", "").strip():
+            result.status = "text_changed"
+            result.detail = f"文本 {action['innerText'][:20]!r} → {data.get('text', '')[:20]!r}"
+        else:
+            result.status = "ok"
+        return result
+
+    def replay(self, actions, source):
+        results = []
+        index = 0
+        for url, group in group_actions(actions):
+            html, origin = source.page_for(group[0])
+            loaded = html is not None and self.load(html, url)
+            for action in group:
+                index += 1
+                if not loaded:
+                    results.append(StepResult(index, action.get("type", ""), action.get("selector", ""),
+                                              "no_page", detail=origin if html is None else "页面加载失败"))
+                    continue
+                results.append(self.run_step(index, action))
+        return results
+
+
+def print_report(results):
+    marks = {"ok": "✅", "ambiguous": "⚠️", "text_changed": "⚠️"}
+    for r in results:
+        print(f"[{r.index}] {marks.get(r.status, '❌')} {r.type:<5} {r.selector[:60]:<60} "
+              f"{r.step_ms:7.2f} ms（等待 {r.wait_ms:.0f} ms） {r.detail}")
+    diverged = next((r for r in results if r.status not in ("ok", "ambiguous")), None)
+    passed = sum(1 for r in results if r.status == "ok")
+    total_ms = sum(r.step_ms + r.wait_ms for r in results)
+    print("=" * 60)
+    print(f"回放 {len(results)} 步，通过 {passed} 步，总耗时 {total_ms:.0f} ms")
+    if diverged:
+        print(f"首次偏离：第 {diverged.index} 步 {diverged.status}（{diverged.detail}）")
+    return diverged
+
+
+def main():
+    parser = argparse.ArgumentParser(description="在保存的页面上离线回放录制的操作")
+    parser.add_argument("actions", help="actions_*.jsonl 或旧版 actions_*.json")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--html", help="HTML 文件")
+    source.add_argument("--snapshot", help="快照 ID、哈希前缀或 latest")
+    source.add_argument("--dom", help="DOM 变更录制文件（按操作时间重建页面）")
+    parser.add_argument("--snapshots-root", help="快照目录（默认 recorded_sessions/snapshots）")
+    parser.add_argument("--wait", type=int, default=500, help="每步等待目标出现的最长时间（毫秒）")
+    parser.add_argument("--report", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    actions = load_actions(args.actions)
+    if not actions:
+        print("❌ 操作记录为空")
+        return 2
+    store = SnapshotStore(args.snapshots_root) if args.snapshots_root else None
+    html = None
+    if args.html or args.snapshot:
+        html = read_snapshot(args.html or args.snapshot, store)
+
+    replayer = SessionReplayer(wait_ms=args.wait)
+    results = replayer.replay(actions, PageSource(html=html, dom_recording=args.dom, store=store))
+    diverged = print_report(results)
+    if args.report:
+        Path(args.report).write_text(json.dumps({
+            "actions": str(args.actions),
+            "diverged_at": diverged.index if diverged else None,
+            "steps": [asdict(r) for r in results],
+        }, ensure_ascii=False, indent=2), encoding="utf-8")
+    return 1 if diverged else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+"""
+页面快照存储 - 按内容寻址、压缩保存 HTMLRecorder 抓取的页面
+
+功能：
+- 以 SHA-256 为键保存页面，内容相同的快照只存一份
+- 压缩保存（安装了 zstandard 时用 zstd，否则用 gzip）
+- manifest.jsonl 记录每次保存的 URL、时间、大小，按需读取
+- 带注释的版本在读取时生成，不再单独保存
+
+命令行：
+    python -m autolink_modules.snapshot_store list
+    python -m autolink_modules.snapshot_store show <快照ID或哈希前缀> [--annotated] [-o 输出文件]
+"""
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+import argparse
+import gzip
+import hashlib
+import json
+import threading
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖
+    zstandard = None
+
+ANNOTATION_HEADER = """
+<!-- ============================================ -->
+<!-- 自动生成的注释 - 帮助识别选课关键元素 -->
+<!-- ============================================ -->
+<!--
+常见选择器模式：
+1. 课程列表容器: table, .course-list, #courseTable
+2. 课程行: tr, .course-row, .course-item
+3. 选课按钮: .btn-select, .select-btn, button[onclick*="select"]
+4. 确认按钮: .confirm, .btn-ok, #confirmBtn
+5. 课程ID: [data-course-id], .course-id
+6. 课程名称: .course-name, .title
+7. 教师名称: .teacher, .teacher-name
+8. 剩余名额: .remain, .quota
+
+请在下面的 HTML 中查找这些元素！
+-->
+<!-- ============================================ -->
+
+"""
+
+
+@dataclass
+class SnapshotEntry:
+    """manifest 中的一条记录"""
+    id: str  # 保存时间（毫秒精度）+ 哈希前缀，同一秒内多次保存不会冲突
+    sha256: str
+    url: str
+    title: str
+    saved_at: str
+    size: int  # 原始大小（字节）
+    stored_size: int  # 压缩后大小，内容重复时为 0
+    codec: str
+
+
+class SnapshotStore:
+    """按内容寻址的页面快照存储（线程安全）"""
+
+    def __init__(self, root=None, level=None):
+        self.root = Path(root) if root else Path.cwd() / "recorded_sessions" / "snapshots"
+        self.objects_dir = self.root / "objects"
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = self.root / "manifest.jsonl"
+        self.codec = "zst" if zstandard else "gz"
+        self.level = level if level is not None else (10 if zstandard else 6)
+        self._lock = threading.Lock()
+
+    # ---------- 对象 ----------
+
+    def _object_path(self, digest, codec=None):
+        return self.objects_dir / digest[:2] / f"{digest}.html.{codec or self.codec}"
+
+    def _find_object(self, digest):
+        for codec in ("zst", "gz"):
+            path = self._object_path(digest, codec)
+            if path.exists():
+                return path, codec
+        return None, None
+
+    def _compress(self, data):
+        if self.codec == "zst":
+            return zstandard.ZstdCompressor(level=self.level).compress(data)
+        return gzip.compress(data, compresslevel=self.level, mtime=0)
+
+    @staticmethod
+    def _decompress(data, codec):
+        if codec == "zst":
+            if zstandard is None:
+                raise RuntimeError("读取 zstd 快照需要安装 zstandard")
+            return zstandard.ZstdDecompressor().decompress(data)
+        return gzip.decompress(data)
+
+    # ---------- 读写 ----------
+
+    def put(self, html, url="", title=""):
+        """保存页面，返回 SnapshotEntry（内容已存在时只追加 manifest 记录）"""
+        data = html.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            path, codec = self._find_object(digest)
+            stored_size = 0
+            if path is None:
+                codec = self.codec
+                path = self._object_path(digest)
+                path.parent.mkdir(exist_ok=True)
+                blob = self._compress(data)
+                tmp = path.with_suffix(path.suffix + ".tmp")
+                tmp.write_bytes(blob)
+                tmp.replace(path)  # 写完整后再改名，中断时不会留下损坏的对象
+                stored_size = len(blob)
+
+            now = datetime.now()
+            entry = SnapshotEntry(
+                id=f"{now.strftime('%Y%m%d_%H%M%S_%f')[:-3]}_{digest[:6]}",
+                sha256=digest, url=url, title=title,
+                saved_at=now.isoformat(timespec="milliseconds"),
+                size=len(data), stored_size=stored_size, codec=codec,
+            )
+            with open(self.manifest_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(asdict(entry), ensure_ascii=False) + "\n")
+        return entry
+
+    def entries(self):
+        """读取 manifest 中的全部记录（按保存顺序）"""
+        if not self.manifest_path.exists():
+            return []
+        entries = []
+        with open(self.manifest_path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        entries.append(SnapshotEntry(**json.loads(line)))
+                    except (ValueError, TypeError):
+                        continue  # 跳过写了一半的行
+        return entries
+
+    def resolve(self, ref):
+        """按快照 ID 或哈希（前缀）查找记录，"latest" 表示最近一次保存"""
+        entries = self.entries()
+        if ref == "latest":
+            return entries[-1] if entries else None
+        for entry in reversed(entries):
+            if entry.id == ref or entry.sha256.startswith(ref):
+                return entry
+        return None
+
+    def read(self, ref):
+        """读取快照 HTML"""
+        entry = ref if isinstance(ref, SnapshotEntry) else self.resolve(ref)
+        if entry is None:
+            raise KeyError(f"没有找到快照: {ref}")
+        path, codec = self._find_object(entry.sha256)
+        if path is None:
+            raise FileNotFoundError(f"快照内容丢失: {entry.sha256}")
+        return self._decompress(path.read_bytes(), codec).decode("utf-8")
+
+    def object_path(self, entry):
+        """快照内容所在的压缩文件（内容丢失时返回 None）"""
+        return self._find_object(entry.sha256)[0]
+
+    def read_annotated(self, ref):
+        """读取带注释标记的版本（读取时生成）"""
+        return ANNOTATION_HEADER + self.read(ref)
+
+    def stats(self):
+        """统计快照数、去重后对象数和磁盘占用"""
+        entries = self.entries()
+        objects = list(self.objects_dir.glob("*/*.html.*"))
+        return {
+            "snapshots": len(entries),
+            "objects": len(objects),
+            "raw_bytes": sum(e.size for e in entries),
+            "stored_bytes": sum(p.stat().st_size for p in objects),
+        }
+
+
+def read_snapshot(ref, store=None):
+    """读取页面：ref 可以是 HTML 文件路径，也可以是快照 ID/哈希前缀/latest"""
+    path = Path(ref)
+    if path.is_file():
+        return path.read_text(encoding="utf-8")
+    return (store or SnapshotStore()).read(ref)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="页面快照存储")
+    parser.add_argument("--root", help="快照目录（默认 recorded_sessions/snapshots）")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="列出快照")
+    show = sub.add_parser("show", help="输出快照 HTML")
+    show.add_argument("ref", help="快照 ID、哈希前缀或 latest")
+    show.add_argument("--annotated", action="store_true", help="带注释版本")
+    show.add_argument("-o", "--output", help="写入文件而不是输出到终端")
+    args = parser.parse_args()
+
+    store = SnapshotStore(args.root)
+    if args.command == "list":
+        for e in store.entries():
+            print(f"{e.id}  {e.sha256[:12]}  {e.size / 1024:8.1f} KB  {e.title or '-'}  {e.url}")
+        s = store.stats()
+        print(f"共 {s['snapshots']} 个快照，{s['objects']} 个对象，"
+              f"原始 {s['raw_bytes'] / 1024:.1f} KB，占用 {s['stored_bytes'] / 1024:.1f} KB")
+        return
+    html = store.read_annotated(args.ref) if args.annotated else store.read(args.ref)
+    if args.output:
+        Path(args.output).write_text(html, encoding="utf-8")
+        print(f"已写入 {args.output}")
+    else:
+        print(html)
+
+
+if __name__ == "__main__":
+    main()
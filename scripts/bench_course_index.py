@@ -0,0 +1,155 @@
+"""
+课程索引基准 - 比较逐行扫描与课程索引的查找耗时
+
+用法：
+    python scripts/bench_course_index.py [课程表HTML或快照ID] [--rows 800] [--targets 12] [--rounds 50]
+
+未指定 HTML 时生成一张 --rows 行的模拟课程表。查找只定位课程行，不点击按钮。
+"""
+import argparse
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PyQt5.QtCore import QUrl
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtWebEngineWidgets import QWebEnginePage
+
+from autolink_modules.js_scripts import COURSE_INDEX_JS
+from autolink_modules.snapshot_store import read_snapshot
+
+# 旧版 get_select_course_js 的查找部分：每门课程都扫描整张表
+_SCAN_FIND_JS = """
+function scanFind(course) {
+    var courseRow = document.querySelector('[data-course-id="' + course.course_id + '"]');
+    if (!courseRow && course.course_name) {
+        var allRows = document.querySelectorAll('.course-row, tr');
+        for (var i = 0; i < allRows.length; i++) {
+            var row = allRows[i];
+            var nameCell = row.querySelector('.course-name') || row.cells[1];
+            var teacherCell = row.querySelector('.teacher-name') || row.cells[2];
+            if (nameCell && nameCell.textContent.includes(course.course_name)) {
+                if (!course.teacher_name || (teacherCell && teacherCell.textContent.includes(course.teacher_name))) {
+                    courseRow = row;
+                    break;
+                }
+            }
+        }
+    }
+    return courseRow;
+}
+"""
+
+
+def generate_table(rows):
+    """生成模拟课程表（课程ID只放在隐藏列，按名称查找时需要扫描）"""
+    body = "".join(
+        f"<tr><td>{i}</td><td class='course-name'>课程{i:04d}</td>"
+        f"<td class='teacher-name'>教师{i % 97}</td><td>{i % 40}/40</td>"
+        f"<td><button class='select-btn'>选课</button></td></tr>"
+        for i in range(rows)
+    )
+    return f"<html><body><table id='courseTable'><tbody>{body}</tbody></table></body></html>"
+
+
+def build_bench_js(targets, rounds):
+    return f"""
+    (function() {{
+        {_SCAN_FIND_JS}
+        {COURSE_INDEX_JS}
+        var targets = {json.dumps(targets, ensure_ascii=False)};
+        var t0 = performance.now();
+        for (var r = 0; r < {rounds}; r++) {{
+            targets.forEach(scanFind);
+        }}
+        var t1 = performance.now();
+        for (var r = 0; r < {rounds}; r++) {{
+            targets.forEach(window.__courseIndex.find);
+        }}
+        var t2 = performance.now();
+        var found = targets.filter(window.__courseIndex.find).length;
+        return JSON.stringify({{
+            scan_ms: (t1 - t0) / {rounds},
+            index_ms: (t2 - t1) / {rounds},
+            found: found,
+            stats: window.__courseIndex.stats()
+        }});
+    }})();
+    """
+
+
+def main():
+    parser = argparse.ArgumentParser(description="课程索引查找基准")
+    parser.add_argument("html", nargs="?", help="课程表 HTML 文件，或 HTMLRecorder 保存的快照 ID（latest 为最近一次）")
+    parser.add_argument("--rows", type=int, default=800, help="模拟课程表行数")
+    parser.add_argument("--targets", type=int, default=12, help="目标课程数")
+    parser.add_argument("--rounds", type=int, default=50, help="重复轮数（模拟抢课尝试次数）")
+    args = parser.parse_args()
+
+    if args.html:
+        html = read_snapshot(args.html)
+        targets = []  # 从页面中取末尾若干课程作为目标，见 pick_targets_js
+    else:
+        html = generate_table(args.rows)
+        step = max(1, args.rows // args.targets)
+        targets = [
+            {"course_id": "", "course_name": f"课程{i:04d}", "teacher_name": f"教师{i % 97}"}
+            for i in range(args.rows - 1, -1, -step)[:args.targets]
+        ]
+
+    app = QApplication(sys.argv)
+    page = QWebEnginePage()
+
+    pick_targets_js = f"""
+    (function() {{
+        {COURSE_INDEX_JS}
+        var rows = Array.from(document.querySelectorAll('.course-row, tbody tr')).slice(-{args.targets});
+        return JSON.stringify(rows.map(function(row) {{
+            var name = row.querySelector('.course-name') || row.cells[1];
+            var teacher = row.querySelector('.teacher-name') || row.cells[2];
+            return {{course_id: '', course_name: name ? name.textContent.trim() : '',
+                     teacher_name: teacher ? teacher.textContent.trim() : ''}};
+        }}));
+    }})();
+    """
+
+    def report(result):
+        data = json.loads(result)
+        print(f"目标课程: {data['found']}/{len(targets)} 已找到，表格 {data['stats']['size']} 行")
+        print(f"逐行扫描: {data['scan_ms']:.3f} ms/次尝试")
+        print(f"课程索引: {data['index_ms']:.3f} ms/次尝试（索引构建 {data['stats']['builds']} 次）")
+        if data["index_ms"] > 0:
+            print(f"加速比: {data['scan_ms'] / data['index_ms']:.1f}x")
+        app.quit()
+
+    def run_bench(picked=None):
+        if picked is not None:
+            targets.extend(json.loads(picked))
+        page.runJavaScript(build_bench_js(targets, args.rounds), report)
+
+    def on_loaded(ok):
+        if not ok:
+            print("加载 HTML 失败")
+            app.quit()
+        elif targets:
+            run_bench()
+        else:
+            page.runJavaScript(pick_targets_js, run_bench)
+
+    page.loadFinished.connect(on_loaded)
+    if len(html.encode("utf-8")) < 1_500_000:
+        page.setHtml(html, QUrl("http://localhost/"))
+    else:
+        # setHtml 有 2MB 限制，大页面写入临时文件后加载
+        tmp = tempfile.NamedTemporaryFile("w", suffix=".html", encoding="utf-8", delete=False)
+        tmp.write(html)
+        tmp.close()
+        page.load(QUrl.fromLocalFile(tmp.name))
+    sys.exit(app.exec_())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+启动性能基准 - 测量主窗口模块导入耗时和窗口可见耗时
+
+用法：
+    python scripts/bench_startup.py [--runs 5]
+
+每次测量在独立子进程中进行，避免模块缓存影响结果。
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+# 在子进程中执行：导入主窗口模块，创建窗口并等待首次显示
+_CHILD_CODE = r"""
+import os, sys, time, json
+t0 = time.perf_counter()
+os.environ['APP_DIR'] = os.getcwd()
+from PyQt5.QtWidgets import QApplication
+t_qt = time.perf_counter()
+from autolink_modules.main_window import AutoLoginWindow
+t_import = time.perf_counter()
+from PyQt5.QtCore import QTimer
+
+app = QApplication(sys.argv)
+win = AutoLoginWindow()
+win.show()
+result = {}
+
+def on_visible():
+    result['visible'] = time.perf_counter()
+    app.quit()
+
+# 零延时定时器在窗口首次显示、事件循环开始后触发
+QTimer.singleShot(0, on_visible)
+app.exec_()
+heavy = [m for m in ('jmcomic', 'onnxruntime', 'cv2', 'requests') if m in sys.modules]
+print(json.dumps({
+    'import_qt_ms': (t_qt - t0) * 1000,
+    'import_main_window_ms': (t_import - t_qt) * 1000,
+    'window_visible_ms': (result['visible'] - t0) * 1000,
+    'heavy_modules_loaded': heavy,
+}))
+"""
+
+
+def run_once():
+    out = subprocess.run(
+        [sys.executable, "-c", _CHILD_CODE], cwd=ROOT_DIR,
+        capture_output=True, text=True, check=True
+    ).stdout
+    # 最后一行是结果，前面可能有模块打印的日志
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测量 GUI 启动耗时")
+    parser.add_argument("--runs", type=int, default=5, help="测量次数")
+    args = parser.parse_args()
+
+    results = [run_once() for _ in range(args.runs)]
+    for key in ("import_qt_ms", "import_main_window_ms", "window_visible_ms"):
+        values = [r[key] for r in results]
+        print(f"{key:>24}: 中位数 {statistics.median(values):8.1f} ms  "
+              f"最小 {min(values):8.1f} ms  最大 {max(values):8.1f} ms")
+    print(f"{'heavy_modules_loaded':>24}: {results[-1]['heavy_modules_loaded']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+抢课压力测试 - 用模拟选课服务器驱动抢课引擎
+
+用法：
+    python scripts/grab_load_test.py [--snapshot 快照ID或HTML文件]
+        [--targets 5] [--capacity 3] [--competitors 50] [--latency 5 30]
+        [--rate-limit 0] [--open-delay 1.0] [--interval 50] [--metrics-out logs/grab_metrics]
+
+输出每秒尝试次数、首次成功耗时、以及在竞争者抢占下的成功情况。完全离线运行。
+指定 --metrics-out 时额外导出 GrabMetrics 的 JSON 和 Prometheus 文本。
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from autolink_modules.course_grabber import CourseConfig
+from autolink_modules.course_sim_server import (
+    CourseSimServer, generate_courses, load_courses_from_snapshot
+)
+from autolink_modules.grab_engine import GrabEngine, build_session
+from autolink_modules.grab_metrics import GrabMetrics
+
+
+def run_competitor(server_url, client_id, course_ids, stop_event, interval):
+    """模拟其他学生：反复请求随机的热门课程"""
+    session = build_session([("sim_client", client_id, "", "/")], pool_size=1)
+    while not stop_event.is_set():
+        try:
+            session.post(server_url + "select", data={"course_id": random.choice(course_ids)}, timeout=5)
+        except Exception:
+            pass
+        stop_event.wait(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="抢课引擎离线压力测试")
+    parser.add_argument("--snapshot", help="HTMLRecorder 保存的快照 ID（或 HTML 文件），不指定则生成课程")
+    parser.add_argument("--courses", type=int, default=200, help="生成的课程数")
+    parser.add_argument("--targets", type=int, default=5, help="要抢的课程数")
+    parser.add_argument("--capacity", type=int, default=3, help="每门课程名额")
+    parser.add_argument("--competitors", type=int, default=50, help="模拟竞争者数量")
+    parser.add_argument("--latency", type=float, nargs=2, default=(5, 30), metavar=("MIN", "MAX"),
+                        help="服务器响应延迟范围（毫秒）")
+    parser.add_argument("--rate-limit", type=float, default=0, help="每客户端每秒请求上限，0 为不限")
+    parser.add_argument("--open-delay", type=float, default=1.0, help="多少秒后开放选课")
+    parser.add_argument("--interval", type=int, default=50, help="引擎尝试间隔（毫秒）")
+    parser.add_argument("--max-attempts", type=int, default=100, help="每门课程最大尝试次数")
+    parser.add_argument("--metrics-out", help="指标导出目录")
+    args = parser.parse_args()
+
+    if args.snapshot:
+        sim_courses = load_courses_from_snapshot(args.snapshot, args.capacity)
+    else:
+        sim_courses = generate_courses(args.courses, args.capacity)
+    if not sim_courses:
+        print("❌ 快照中没有找到课程行")
+        return
+
+    targets = random.sample(sim_courses, min(args.targets, len(sim_courses)))
+    server = CourseSimServer(sim_courses, latency=tuple(args.latency), rate_limit=args.rate_limit,
+                             open_delay=args.open_delay).start()
+    print(f"🖥 模拟服务器: {server.url}（{len(sim_courses)} 门课程，每门 {args.capacity} 个名额）")
+
+    # 竞争者从开放前就开始抢同样的课程
+    stop_event = threading.Event()
+    target_ids = [c.course_id for c in targets]
+    competitors = [
+        threading.Thread(target=run_competitor, daemon=True,
+                         args=(server.url, f"rival{i}", target_ids, stop_event, args.interval / 1000))
+        for i in range(args.competitors)
+    ]
+    for t in competitors:
+        t.start()
+
+    courses = [CourseConfig(course_id=c.course_id, course_name=c.course_name,
+                            teacher_name=c.teacher_name) for c in targets]
+    first_success = {}
+    start = time.perf_counter()
+    metrics = GrabMetrics(args.interval, workers=len(courses))
+    metrics.start()
+
+    def on_attempt(course, outcome, latency):
+        metrics.record(course.course_name, outcome, latency)
+        if outcome == "success" and not first_success:
+            first_success["t"] = time.perf_counter() - start
+
+    engine = GrabEngine(
+        build_session([("sim_client", "me", "", "/")], pool_size=len(courses)),
+        {"submit_url": server.url + "select", "attempt_interval": args.interval,
+         "max_attempts": args.max_attempts, "max_concurrency": len(courses)},
+        on_log=print, on_attempt=on_attempt,
+    )
+    results = engine.run(courses)
+    metrics.finish()
+    stop_event.set()
+    server.stop()
+
+    won = sum(1 for outcome in results.values() if outcome in ("success", "already_selected"))
+    print("=" * 60)
+    print(f"每秒尝试次数: {engine.attempts_per_second:.1f}（共 {engine.total_attempts} 次）")
+    if first_success:
+        print(f"首次成功耗时: {first_success['t'] * 1000:.0f} ms（含 {args.open_delay:.1f}s 开放等待）")
+    else:
+        print("首次成功耗时: 无成功")
+    print(f"抢课成功: {won}/{len(courses)}（竞争者 {args.competitors} 个，服务器共处理 {server.request_count} 个请求）")
+    print(f"指标: {metrics.summary()}")
+    if args.metrics_out:
+        json_path, prom_path = metrics.export(args.metrics_out, time.strftime("loadtest_%Y%m%d_%H%M%S"),
+                                              competitors=args.competitors, capacity=args.capacity)
+        print(f"指标已导出: {json_path}, {prom_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+持久化崩溃测试 - 在写入过程中随机杀死进程，检查文件是否始终完整
+
+用法：
+    python scripts/persistence_crash_test.py [--rounds 50] [--size 200]
+
+每轮启动一个子进程不停地保存配置，随机时刻用 SIGKILL（Windows 上为 TerminateProcess）结束它，
+然后检查目标文件能否解析、内容是否为某个完整版本。同时以直接覆盖写作为对照。
+最后检查防抖写线程：短时间内连续保存只产生少量实际写入，且最终内容为最后一次保存。
+"""
+import argparse
+import json
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from autolink_modules import persistence
+from autolink_modules.persistence import DebouncedWriter
+
+# 子进程：反复写入同样大小的 JSON（只有版本号不同），时间几乎都花在写文件上
+_CHILD = """
+import json, sys
+sys.path.insert(0, {root!r})
+from autolink_modules.persistence import atomic_write
+path, mode, size = sys.argv[1], sys.argv[2], int(sys.argv[3])
+body = json.dumps(["课程%d" % i for i in range(size * 100)], ensure_ascii=False)
+version = 0
+while True:
+    version += 1
+    text = '{{"version": %d, "courses": %s}}' % (version, body)
+    if mode == "atomic":
+        atomic_write(path, text)
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+"""
+
+
+def crash_rounds(mode, rounds, size, workdir):
+    """返回 (损坏次数, 残留临时文件数)"""
+    path = workdir / f"{mode}.json"
+    script = _CHILD.format(root=str(Path(__file__).resolve().parent.parent))
+    corrupt = 0
+    for _ in range(rounds):
+        child = subprocess.Popen([sys.executable, "-c", script, str(path), mode, str(size)])
+        time.sleep(random.uniform(0.2, 0.6))
+        child.kill()
+        child.wait()
+        if not path.exists():
+            continue  # 第一次写入前就被结束
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            if len(data["courses"]) != size * 100:
+                corrupt += 1
+        except (OSError, ValueError, KeyError):
+            corrupt += 1
+    leftovers = list(workdir.glob(f".{path.name}.*.tmp"))
+    for tmp in leftovers:
+        tmp.unlink()
+    return corrupt, len(leftovers)
+
+
+def debounce_check(workdir):
+    writes = []
+    original = persistence.atomic_write
+
+    def counting_write(path, text, encoding="utf-8"):
+        writes.append(path)
+        original(path, text, encoding)
+
+    persistence.atomic_write = counting_write
+    try:
+        writer = DebouncedWriter(delay=0.2)
+        path = workdir / "debounce.yml"
+        for i in range(1000):
+            writer.save(path, {"format": "both" if i % 2 else "webp", "i": i})
+        assert writer.read_text(path).count("i: 999") == 1, "read_text 未返回挂起的内容"
+        writer.close()
+    finally:
+        persistence.atomic_write = original
+    final = path.read_text(encoding="utf-8")
+    return len(writes), "i: 999" in final
+
+
+def main():
+    parser = argparse.ArgumentParser(description="持久化崩溃测试")
+    parser.add_argument("--rounds", type=int, default=30, help="每种写法的崩溃次数")
+    parser.add_argument("--size", type=int, default=200, help="写入内容大小（约 KB）")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        failed = False
+        for mode in ("atomic", "direct"):
+            corrupt, leftovers = crash_rounds(mode, args.rounds, args.size, workdir)
+            print(f"{mode:<6}: {args.rounds} 次崩溃，文件损坏 {corrupt} 次，残留临时文件 {leftovers} 个")
+            if mode == "atomic" and corrupt:
+                failed = True
+
+        writes, ok = debounce_check(workdir)
+        print(f"防抖: 1000 次保存实际写入 {writes} 次，最终内容{'正确' if ok else '错误'}")
+        failed = failed or not ok or writes > 5
+
+    print("❌ 失败" if failed else "✅ 通过")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())